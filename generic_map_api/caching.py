@@ -2,11 +2,38 @@ from __future__ import annotations
 
 import hashlib
 import json
-from base64 import b64encode
-from typing import TYPE_CHECKING, Union
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Any, Optional, Union
+from uuid import uuid4
 
 from django.core.cache import DEFAULT_CACHE_ALIAS, caches
-
+from django.core.cache.backends.dummy import DummyCache
+from django.db import connections
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover
+    xxhash = None
+
+from .columnar import COLUMNAR
+from .geometry_serializers import to_shapely
+from .renderers import encode_body, render_json
+from .spatial_index import (
+    ALL_CELL,
+    cell_zooms,
+    count_covering_tiles,
+    covering_tiles,
+    tile_cells,
+    viewport_cells,
+)
 from .values import BaseViewPort, TileRedirect
 
 if TYPE_CHECKING:
@@ -14,14 +41,154 @@ if TYPE_CHECKING:
 
 
 KEY_PREFIX = "MAP_API"
+KEY_VERSION = 2  # bump when format of keys or cached values changes
+
+FLOAT_KEY_PRECISION = 9
 
 NO_VALUE = object()
 
 NO_CACHE = object()
 DEFAULT_TTL = 15  # seconds
 
+LOCK_SUFFIX = "LOCK"
+GENERATION_SUFFIX = "GENERATION"
+INVALIDATION_KINDS = ("ITEMS", "ITEM", "BOUNDS", "TILE")
+
+SPATIAL_INDEX_SUFFIX = "SPATIAL"
+SPATIAL_INDEX_MAX_KEYS = 1000  # per cell
+SPATIAL_INDEX_MAX_ZOOM = 30
+COUNTER_SUFFIX = "COUNT"
+SPATIAL_INVALIDATION_MAX_TILES = 10000  # per zoom
+DEFAULT_COALESCING_TIMEOUT = 10  # seconds
+DEFAULT_COALESCING_LOCK_TTL = 60  # seconds
+DEFAULT_COALESCING_POLL_INTERVAL = 0.05  # seconds
+
+REFRESH_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_key_prefix(view_class) -> str:
+    view_name = view_class.cache_view_name
+    if not view_name:
+        view_name = f"{view_class.__module__}.{view_class.__name__}"
+    return f"{KEY_PREFIX}__v{KEY_VERSION}__{view_name}"
+
+
+def _canonicalize(value):  # pylint: disable=too-many-return-statements
+    """Converts value to a JSON-compatible form which is equal for equal inputs"""
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        # rounding also turns -0.0 into 0.0
+        return round(value, FLOAT_KEY_PRECISION) + 0.0
+    if isinstance(value, dict):
+        return {str(key): _canonicalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonicalize(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonicalize(item) for item in value), key=_dump_canonical)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def _dump_canonical(value) -> str:
+    return json.dumps(
+        _canonicalize(value), sort_keys=True, separators=(",", ":"), allow_nan=True
+    )
+
+
+def hash_bytes(data: bytes) -> str:
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_context(context) -> str:
+    return hash_bytes(_dump_canonical(context).encode("utf-8"))
+
+
+def make_etag(value, key: str) -> str:
+    """Returns strong ETag of the value computed for the caching key
+
+    Bytes (rendered bodies and tiles) are hashed as they are. Other values are
+    not serialized just to be hashed, their ETag is made of the key and a token
+    unique to the computation, so every recomputed value gets a new ETag.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        data = bytes(value)
+    elif isinstance(value, dict) and all(
+        isinstance(item, (bytes, str)) for item in value.values()
+    ):
+        # encoded bodies and tiles
+        data = b"\0".join(
+            f"{name}=".encode("utf-8")
+            + (item if isinstance(item, bytes) else item.encode("utf-8"))
+            for name, item in sorted(value.items())
+        )
+    else:
+        data = f"{key}\0{uuid.uuid4().hex}".encode("utf-8")
+    return f'"{hash_bytes(data)}"'
+
+
+def _make_generation_key(view_class, kind) -> str:
+    return f"{get_key_prefix(view_class)}__{kind}__{GENERATION_SUFFIX}"
+
+
+def _make_spatial_index_key(view_class, cell) -> str:
+    if cell == ALL_CELL:
+        cell_str = ALL_CELL
+    else:
+        cell_str = "__".join(str(coord) for coord in cell)
+    return f"{get_key_prefix(view_class)}__{SPATIAL_INDEX_SUFFIX}__{cell_str}"
+
+
+def _make_spatial_index_counter_key(index_key) -> str:
+    return f"{index_key}__{COUNTER_SUFFIX}"
 
-class Cache:
+
+def _make_spatial_index_slot_key(index_key, slot) -> str:
+    return f"{index_key}__{slot}"
+
+
+def _make_spatial_zoom_key(view_class, zoom) -> str:
+    return f"{get_key_prefix(view_class)}__{SPATIAL_INDEX_SUFFIX}__ZOOM__{zoom}"
+
+
+def _new_generation() -> str:
+    return uuid4().hex
+
+
+def _get_cache_backend_for(view):
+    cache_name = view.cache_name or DEFAULT_CACHE_ALIAS
+    return caches[cache_name]
+
+
+@lru_cache(maxsize=None)
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=REFRESH_WORKERS,
+        thread_name_prefix="map-api-cache-refresh",
+    )
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fresh_until: Optional[float] = None
+    etag: Optional[str] = None
+
+    def is_stale(self) -> bool:
+        return self.fresh_until is not None and time.time() >= self.fresh_until
+
+
+class Cache:  # pylint: disable=too-many-public-methods
     def __init__(
         self,
         view: Union[MapApiBaseView, MapFeaturesBaseView, MapTilesBaseView],
@@ -29,157 +196,788 @@ class Cache:
     ) -> None:
         self.view = view
         self.request = request
+        # ETag of the last value read or computed through this object
+        self.etag = None
 
     def _make_caching_key(self, fn_name, request, **context):
         extra = self.view.get_caching_key_extra(fn_name, request, **context)
         if extra is not None:
             context["extra"] = extra
 
-        view_name = self.view.cache_view_name
-        if not view_name:
-            view_name = (
-                f"{self.view.__class__.__module__}.{self.view.__class__.__name__}"
+        if "params" in context:
+            context["params"] = self._canonicalize_params(context["params"])
+
+        if self.view.cache_invalidation or self.view.cache_spatial_index:
+            # spatial index falls back to bumping generations, see invalidate_bbox
+            context["generation"] = self._get_generation(fn_name)
+
+        prefix = get_key_prefix(self.view.__class__)
+        return f"{prefix}__{fn_name}__{hash_context(context)}"
+
+    def _canonicalize_params(self, params):
+        query_params = self.view.get_query_params()
+        canonical_params = {}
+        for name, value in params.items():
+            param = query_params.get(name)
+            if param is not None and param.many and isinstance(value, (list, tuple)):
+                value = sorted(value, key=_dump_canonical)
+            canonical_params[name] = value
+        return canonical_params
+
+    def _get_generation(self, fn_name):
+        # read from the shared backend only, the local cache would hide
+        # invalidations made by other processes until its entries expire
+        key = _make_generation_key(self.view.__class__, fn_name)
+        backend = self._get_cache_backend()
+        generation = backend.get(key)
+        if generation is None:
+            # missing (or evicted) generation must never bring back old entries,
+            # so a fresh one is started instead of a default
+            backend.add(key, _new_generation(), None)
+            generation = backend.get(key)
+        return generation
+
+    @classmethod
+    def invalidate(cls, view_class, kinds=INVALIDATION_KINDS):
+        """Makes all cached entries of given kinds of the view unreachable
+
+        Requires `cache_invalidation` to be enabled on the view. Entries themselves
+        are not deleted, they are left to expire.
+        """
+        if not isinstance(view_class, type):
+            view_class = view_class.__class__
+
+        if not view_class.cache_invalidation:
+            raise ValueError(f"Cache invalidation is not enabled in {view_class}")
+
+        cls._bump_generations(view_class, kinds)
+
+    @staticmethod
+    def _bump_generations(view_class, kinds):
+        backend = _get_cache_backend_for(view_class)
+        for kind in kinds:
+            key = _make_generation_key(view_class, kind)
+            backend.set(key, _new_generation(), None)
+
+    @classmethod
+    def invalidate_bbox(cls, view_class, geometry):
+        """Deletes cached ITEMS and TILE entries of the view intersecting geometry
+
+        Requires `cache_spatial_index` to be enabled on the view. Entries are
+        located by tiles (on every zoom level the view was cached at) intersecting
+        bounds of the geometry. When the geometry covers too many tiles of a zoom,
+        all ITEMS and TILE entries of the view are invalidated instead.
+        Every cell keeps only its last SPATIAL_INDEX_MAX_KEYS entries, so the TTL
+        stays the upper bound of staleness of entries pushed out of the index.
+
+        Returns number of deleted entries.
+        """
+        if not isinstance(view_class, type):
+            view_class = view_class.__class__
+
+        if not view_class.cache_spatial_index:
+            raise ValueError(f"Spatial cache index is not enabled in {view_class}")
+
+        geometry = to_shapely(geometry)
+        backend = _get_cache_backend_for(view_class)
+
+        zoom_keys = {
+            _make_spatial_zoom_key(view_class, zoom): zoom
+            for zoom in range(SPATIAL_INDEX_MAX_ZOOM + 1)
+        }
+        zooms = [zoom_keys[key] for key in backend.get_many(list(zoom_keys))]
+
+        index_keys = [_make_spatial_index_key(view_class, ALL_CELL)]
+        for zoom in sorted(zooms):
+            if count_covering_tiles(geometry, zoom) > SPATIAL_INVALIDATION_MAX_TILES:
+                logger.info(
+                    "Geometry too big to invalidate cache of %s at zoom %s by tiles",
+                    view_class,
+                    zoom,
+                )
+                cls._bump_generations(view_class, ("ITEMS", "TILE"))
+                continue
+
+            index_keys.extend(
+                _make_spatial_index_key(view_class, cell)
+                for cell in covering_tiles(geometry, zoom)
             )
 
-        context_str = json.dumps(context, default=str)
-        hasher = hashlib.sha256(context_str.encode("utf-8"))
-        context_hash = b64encode(hasher.digest()).decode("utf-8")
-
-        key = f"{KEY_PREFIX}__{view_name}__{fn_name}__{context_hash}"
-        return key
+        counter_keys = {
+            _make_spatial_index_counter_key(index_key): index_key
+            for index_key in index_keys
+        }
+        slot_keys = [
+            _make_spatial_index_slot_key(counter_keys[counter_key], slot)
+            for counter_key, count in backend.get_many(list(counter_keys)).items()
+            for slot in range(min(count, SPATIAL_INDEX_MAX_KEYS))
+        ]
+        indexed = backend.get_many(slot_keys)
+        keys = set(indexed.values())
+        backend.delete_many(list(keys) + list(indexed.keys()))
+
+        if view_class.cache_local is not None:
+            for key in keys:
+                view_class.cache_local.delete(key)
+
+        return len(keys)
+
+    def _with_spatial_index(self, key, cells, timeout, stale_ttl, compute):
+        # pylint: disable=too-many-arguments
+        if not self.view.cache_spatial_index:
+            return compute
+
+        def compute_and_index():
+            value = compute()
+            self._add_to_spatial_index(key, cells, timeout, stale_ttl)
+            return value
+
+        return compute_and_index
+
+    def _add_to_spatial_index(self, key, cells, timeout, stale_ttl=None):
+        if timeout is not None:
+            timeout += stale_ttl or 0
+
+        backend = self._get_cache_backend()
+        view_class = self.view.__class__
+
+        # every cell is a ring buffer of slots, a slot is claimed with atomic incr
+        # of the cell counter, so concurrent writers never overwrite each other
+        slots = {}
+        for cell in cells:
+            index_key = _make_spatial_index_key(view_class, cell)
+            counter_key = _make_spatial_index_counter_key(index_key)
+            backend.add(counter_key, 0, None)
+            try:
+                count = backend.incr(counter_key)
+            except ValueError:
+                # counter evicted between add and incr
+                backend.add(counter_key, 1, None)
+                count = 1
+            slot = (count - 1) % SPATIAL_INDEX_MAX_KEYS
+            slots[_make_spatial_index_slot_key(index_key, slot)] = key
+        backend.set_many(slots, timeout)
+
+        for zoom in cell_zooms(cells):
+            backend.add(_make_spatial_zoom_key(view_class, zoom), True, None)
+
+    def _get_cache_backend(self):
+        return _get_cache_backend_for(self.view)
 
     def _read_cache(self, key):
-        cache_name = self.view.cache_name or DEFAULT_CACHE_ALIAS
-        cache = caches[cache_name]
-        return cache.get(key, NO_VALUE)
+        local_cache = self.view.cache_local
+        if local_cache is not None:
+            value = local_cache.get(key, NO_VALUE)
+            if value is not NO_VALUE:
+                return value
+
+        value = self._get_cache_backend().get(key, NO_VALUE)
+        if local_cache is not None and value is not NO_VALUE:
+            local_cache.set(key, value)
+        return value
 
     def _write_cache(self, key, value, timeout):
-        cache_name = self.view.cache_name or DEFAULT_CACHE_ALIAS
-        cache = caches[cache_name]
-        return cache.set(key, value, timeout)
+        local_cache = self.view.cache_local
+        if local_cache is not None:
+            local_cache.set(key, value, timeout)
+        return self._get_cache_backend().set(key, value, timeout)
+
+    def _acquire_lock(self, key):
+        # `add` is atomic in both locmem and shared backends (redis, memcached),
+        # so only one worker can create the lock key
+        return self._get_cache_backend().add(
+            f"{key}__{LOCK_SUFFIX}", True, self.view.cache_coalescing_lock_ttl
+        )
+
+    def _release_lock(self, key):
+        self._get_cache_backend().delete(f"{key}__{LOCK_SUFFIX}")
+
+    def _read_entry(self, key):
+        entry = self._read_cache(key)
+        if not isinstance(entry, CacheEntry):
+            return NO_VALUE
+        return entry
+
+    def _stores_entries(self) -> bool:
+        return self.view.cache_local is not None or not isinstance(
+            self._get_cache_backend(), DummyCache
+        )
+
+    def _make_entry(self, key, value, timeout, stale_ttl=None):
+        """Returns entry with the timeout it should be stored with
+
+        ETag is stored with the entry, so it is made once per computed value.
+        Values which are not stored anywhere (dummy backend) get no ETag, every
+        request computes them anyway.
+        """
+        etag = make_etag(value, key) if self._stores_entries() else None
+        entry = CacheEntry(value, etag=etag)
+
+        if timeout is None or not stale_ttl:
+            return entry, timeout
+
+        entry.fresh_until = time.time() + timeout
+        return entry, timeout + stale_ttl
+
+    def _write_entry(self, key, value, timeout, stale_ttl=None):
+        entry, timeout = self._make_entry(key, value, timeout, stale_ttl)
+        self._write_cache(key, entry, timeout)
+        return entry
+
+    def _read_entries(self, keys):
+        entries = {}
+        local_cache = self.view.cache_local
+
+        if local_cache is not None:
+            for key in keys:
+                entry = local_cache.get(key, NO_VALUE)
+                if isinstance(entry, CacheEntry):
+                    entries[key] = entry
+
+        missing_keys = [key for key in keys if key not in entries]
+        if missing_keys:
+            for key, entry in self._get_cache_backend().get_many(missing_keys).items():
+                if isinstance(entry, CacheEntry):
+                    entries[key] = entry
+                    if local_cache is not None:
+                        local_cache.set(key, entry)
+        return entries
+
+    def _write_entries(self, values, timeout, stale_ttl=None):
+        entries = {}
+        for key, value in values.items():
+            entries[key], entry_timeout = self._make_entry(
+                key, value, timeout, stale_ttl
+            )
+
+        if not entries:
+            return entries
+
+        local_cache = self.view.cache_local
+        if local_cache is not None:
+            for key, entry in entries.items():
+                local_cache.set(key, entry, entry_timeout)
+
+        self._get_cache_backend().set_many(entries, entry_timeout)
+        return entries
+
+    def _get_or_compute_many(self, keyed_computes, timeout, stale_ttl=None):
+        """Batched version of `_get_or_compute`
+
+        `keyed_computes` is a list of (key, function computing its value) pairs.
+        All keys are read with a single `get_many` and all missing values are
+        stored with a single `set_many`. Repeated keys are computed once.
+        Returns a value for every pair, in their order.
+        """
+        computes = dict(keyed_computes)
+        entries = self._read_entries(list(computes.keys()))
+
+        for key, entry in entries.items():
+            if entry.is_stale():
+                self._schedule_refresh(key, timeout, computes[key], stale_ttl)
+
+        computed = {
+            key: compute() for key, compute in computes.items() if key not in entries
+        }
+        entries.update(self._write_entries(computed, timeout, stale_ttl))
+
+        return [entries[key].value for key, _ in keyed_computes]
+
+    def _get_or_compute(  # pylint: disable=too-many-arguments
+        self, key, timeout, compute, coalesce=False, stale_ttl=None
+    ):
+        entry = self._read_entry(key)
+        if entry is not NO_VALUE:
+            if entry.is_stale():
+                self._schedule_refresh(key, timeout, compute, stale_ttl)
+        elif coalesce:
+            entry = self._compute_coalesced(key, timeout, compute, stale_ttl)
+        else:
+            entry = self._write_entry(key, compute(), timeout, stale_ttl)
+
+        self.etag = entry.etag
+        return entry.value
+
+    def _compute_coalesced(self, key, timeout, compute, stale_ttl=None):
+        """Computes a missing value in a single worker at a time
+
+        The worker which acquires the lock computes and stores the value, others
+        poll the cache until it shows up. When it does not show up within
+        `cache_coalescing_timeout`, the waiting worker computes the value itself.
+        """
+        deadline = time.monotonic() + self.view.cache_coalescing_timeout
+
+        while True:
+            if self._acquire_lock(key):
+                try:
+                    # previous holder may have stored the value and released the
+                    # lock between our cache miss and acquiring the lock
+                    entry = self._read_entry(key)
+                    if entry is not NO_VALUE:
+                        return entry
+                    return self._write_entry(key, compute(), timeout, stale_ttl)
+                finally:
+                    self._release_lock(key)
+
+            if time.monotonic() >= deadline:
+                break
+
+            time.sleep(self.view.cache_coalescing_poll_interval)
+
+            entry = self._read_entry(key)
+            if entry is not NO_VALUE:
+                return entry
+
+        # fallback: the lock holder is too slow (or died), don't keep the user waiting
+        return self._write_entry(key, compute(), timeout, stale_ttl)
+
+    def _schedule_refresh(self, key, timeout, compute, stale_ttl):
+        """Recomputes a stale value in the background
+
+        The lock makes sure only one worker refreshes the entry, the others keep
+        serving the stale value until the fresh one is stored.
+        """
+        if not self._acquire_lock(key):
+            return
+
+        def refresh():
+            try:
+                value = compute()
+                self._write_entry(key, value, timeout, stale_ttl)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Background refresh of %s failed", key)
+            finally:
+                self._release_lock(key)
+                connections.close_all()
+
+        try:
+            _get_refresh_executor().submit(refresh)
+        except RuntimeError:
+            # executor is shut down (interpreter exit)
+            self._release_lock(key)
 
     def get_serialized_meta(self):
         timeout = self.view.cache_ttl_meta or self.view.cache_ttl
 
         if timeout is NO_CACHE:
-            value = NO_VALUE
-        else:
-            key = self._make_caching_key(
-                "META",
-                self.request,
-            )
-            value = self._read_cache(key)
+            return self.view.get_serialized_meta()
 
-        if value is NO_VALUE:
-            value = self.view.get_serialized_meta()
-            if timeout is not NO_CACHE:
-                self._write_cache(key, value, timeout)
-        return value
+        key = self._make_caching_key(
+            "META",
+            self.request,
+        )
+        return self._get_or_compute(
+            key,
+            timeout,
+            self.view.get_serialized_meta,
+            stale_ttl=self.view.cache_stale_ttl_meta or self.view.cache_stale_ttl,
+        )
 
     def get_serialized_bounds(self, params):
         timeout = self.view.cache_ttl_bounds or self.view.cache_ttl
 
         if timeout is NO_CACHE:
-            value = NO_VALUE
-        else:
-            key = self._make_caching_key(
-                "BOUNDS",
-                self.request,
-                params=params,
-            )
-            value = self._read_cache(key)
+            return self.view.get_serialized_bounds(params)
 
-        if value is NO_VALUE:
-            value = self.view.get_serialized_bounds(params)
-            if timeout is not NO_CACHE:
-                self._write_cache(key, value, timeout)
-        return value
+        key = self._make_caching_key(
+            "BOUNDS",
+            self.request,
+            params=params,
+        )
+        return self._get_or_compute(
+            key,
+            timeout,
+            lambda: self.view.get_serialized_bounds(params),
+            stale_ttl=self.view.cache_stale_ttl_bounds or self.view.cache_stale_ttl,
+        )
+
+    def _get_viewport_items(  # pylint: disable=too-many-arguments
+        self, viewport: BaseViewPort, params: dict, compute, cached_compute, **context
+    ):
+        """Caches output of viewport items, indexed by cells of the viewport"""
+        timeout = self.view.cache_ttl_items or self.view.cache_ttl
+
+        if timeout is NO_CACHE:
+            return compute()
+
+        key = self._make_caching_key(
+            "ITEMS",
+            self.request,
+            viewport=viewport.to_dict(),
+            params=params,
+            **context,
+        )
+        stale_ttl = self.view.cache_stale_ttl_items or self.view.cache_stale_ttl
+        compute = self._with_spatial_index(
+            key, viewport_cells(viewport), timeout, stale_ttl, cached_compute
+        )
+        return self._get_or_compute(
+            key,
+            timeout,
+            compute,
+            coalesce=self.view.cache_coalescing,
+            stale_ttl=stale_ttl,
+        )
 
     def get_serialized_items(self, viewport: BaseViewPort, params: dict):
+        return self._get_viewport_items(
+            viewport,
+            params,
+            partial(self.view.get_serialized_items, viewport, params),
+            partial(self._compute_serialized_items, viewport, params),
+        )
+
+    def _make_page_context(self, cursor) -> dict:
+        return {"page": (cursor or "", self.view.pagination_page_size)}
+
+    def get_serialized_page(self, viewport: BaseViewPort, params: dict, cursor):
+        """Returns a page of serialized items, every page is cached on its own"""
+        compute = partial(self.view.get_serialized_page, viewport, params, cursor)
+        return self._get_viewport_items(
+            viewport, params, compute, compute, **self._make_page_context(cursor)
+        )
+
+    def get_columnar_page(self, viewport: BaseViewPort, params: dict, cursor):
+        compute = partial(self.view.get_columnar_page, viewport, params, cursor)
+        return self._get_viewport_items(
+            viewport,
+            params,
+            compute,
+            compute,
+            format=COLUMNAR,
+            **self._make_page_context(cursor),
+        )
+
+    def get_binary_page(  # pylint: disable=too-many-arguments
+        self, viewport: BaseViewPort, params: dict, cursor, renderer
+    ):
+        """Returns a page rendered to bytes and the cursor of the next page"""
+        compute = partial(self.view.get_binary_page, viewport, params, cursor, renderer)
+        return self._get_viewport_items(
+            viewport,
+            params,
+            compute,
+            compute,
+            format=renderer.format,
+            **self._make_page_context(cursor),
+        )
+
+    def get_rendered_page(  # pylint: disable=too-many-arguments
+        self, viewport: BaseViewPort, params: dict, cursor, encodings
+    ):
+        """Returns the final JSON body of a page, plain and encoded"""
+        encodings = tuple(encodings)
+
+        def compute():
+            page = self.view.get_serialized_page(viewport, params, cursor)
+            return encode_body(render_json(page), encodings)
+
+        return self._get_viewport_items(
+            viewport,
+            params,
+            compute,
+            compute,
+            rendered=encodings,
+            **self._make_page_context(cursor),
+        )
+
+    def get_columnar_items(self, viewport: BaseViewPort, params: dict):
+        compute = partial(self.view.get_columnar_items, viewport, params)
+        return self._get_viewport_items(
+            viewport, params, compute, compute, format=COLUMNAR
+        )
+
+    def get_binary_items(self, viewport: BaseViewPort, params: dict, renderer):
+        """Returns items rendered to bytes by the binary renderer"""
+        compute = partial(self.view.get_binary_items, viewport, params, renderer)
+        return self._get_viewport_items(
+            viewport, params, compute, compute, format=renderer.format
+        )
+
+    def get_serialized_items_many(self, viewports, params: dict):
+        """Returns serialized items of many viewports using bulk cache operations"""
         timeout = self.view.cache_ttl_items or self.view.cache_ttl
 
         if timeout is NO_CACHE:
-            value = NO_VALUE
-        else:
+            return [
+                list(self.view.get_serialized_items(viewport, params))
+                for viewport in viewports
+            ]
+
+        stale_ttl = self.view.cache_stale_ttl_items or self.view.cache_stale_ttl
+        keyed_computes = []
+        for viewport in viewports:
             key = self._make_caching_key(
                 "ITEMS",
                 self.request,
                 viewport=viewport.to_dict(),
                 params=params,
             )
-            value = self._read_cache(key)
+            compute = self._with_spatial_index(
+                key,
+                viewport_cells(viewport),
+                timeout,
+                stale_ttl,
+                partial(self._compute_serialized_items, viewport, params),
+            )
+            keyed_computes.append((key, compute))
+        return self._get_or_compute_many(keyed_computes, timeout, stale_ttl)
 
-        if value is NO_VALUE:
-            value = self.view.get_serialized_items(viewport, params)
-            if timeout is not NO_CACHE:
-                value = list(value)
-                self._write_cache(key, value, timeout)
-        return value
+    def iter_serialized_items(self, viewport: BaseViewPort, params: dict):
+        """Returns serialized items as an iterator, without materializing them
+
+        On a cache miss the items are yielded as they are produced and stored in
+        cache once the iterator is exhausted.
+        """
+        timeout = self.view.cache_ttl_items or self.view.cache_ttl
+
+        if timeout is NO_CACHE:
+            return iter(self.view.get_serialized_items(viewport, params))
+
+        key = self._make_caching_key(
+            "ITEMS",
+            self.request,
+            viewport=viewport.to_dict(),
+            params=params,
+        )
+        stale_ttl = self.view.cache_stale_ttl_items or self.view.cache_stale_ttl
+        cells = viewport_cells(viewport)
+
+        entry = self._read_entry(key)
+        if entry is NO_VALUE:
+            if self.view.cache_coalescing:
+                return self._iter_coalesced_items(
+                    key, viewport, params, timeout, stale_ttl
+                )
+            return self._iter_and_store_items(key, viewport, params, timeout, stale_ttl)
+
+        if entry.is_stale():
+            compute = self._with_spatial_index(
+                key,
+                cells,
+                timeout,
+                stale_ttl,
+                partial(self._compute_serialized_items, viewport, params),
+            )
+            self._schedule_refresh(key, timeout, compute, stale_ttl)
+
+        self.etag = entry.etag
+        return iter(entry.value)
+
+    def _iter_coalesced_items(
+        self, key, viewport, params, timeout, stale_ttl
+    ):  # pylint: disable=too-many-arguments
+        """Streaming version of `_compute_coalesced`
+
+        The worker which acquires the lock streams the items and stores them,
+        others wait for the stored items and stream those. The lock is taken only
+        once the response starts being consumed.
+        """
+        deadline = time.monotonic() + self.view.cache_coalescing_timeout
+
+        while True:
+            if self._acquire_lock(key):
+                try:
+                    entry = self._read_entry(key)
+                    if entry is not NO_VALUE:
+                        yield from entry.value
+                    else:
+                        yield from self._iter_and_store_items(
+                            key, viewport, params, timeout, stale_ttl
+                        )
+                finally:
+                    self._release_lock(key)
+                return
+
+            if time.monotonic() >= deadline:
+                break
+
+            time.sleep(self.view.cache_coalescing_poll_interval)
+
+            entry = self._read_entry(key)
+            if entry is not NO_VALUE:
+                yield from entry.value
+                return
+
+        # fallback: the lock holder is too slow (or died)
+        yield from self._iter_and_store_items(key, viewport, params, timeout, stale_ttl)
+
+    def _iter_and_store_items(
+        self, key, viewport, params, timeout, stale_ttl
+    ):  # pylint: disable=too-many-arguments
+        items = []
+        for item in self.view.get_serialized_items(viewport, params):
+            items.append(item)
+            yield item
+
+        self._write_entry(key, items, timeout, stale_ttl)
+        if self.view.cache_spatial_index:
+            self._add_to_spatial_index(
+                key, viewport_cells(viewport), timeout, stale_ttl
+            )
+
+    def _compute_serialized_items(self, viewport, params):
+        return list(self.view.get_serialized_items(viewport, params))
+
+    def get_rendered_items(self, viewport: BaseViewPort, params: dict, encodings):
+        """Returns the final JSON body of the items list, plain and encoded
+
+        Output is a dict mapping content encoding to the body bytes, so a cache hit
+        requires no serialization nor rendering at all.
+        """
+        encodings = tuple(encodings)
+
+        def compute():
+            items = list(self.view.get_serialized_items(viewport, params))
+            return encode_body(render_json({"items": items}), encodings)
+
+        return self._get_viewport_items(
+            viewport, params, compute, compute, rendered=encodings
+        )
 
     def get_serialized_item(self, item_id):
         timeout = self.view.cache_ttl_item or self.view.cache_ttl
 
         if timeout is NO_CACHE:
-            value = NO_VALUE
-        else:
-            key = self._make_caching_key(
-                "ITEM",
-                self.request,
-                item_id=item_id,
-            )
-            value = self._read_cache(key)
+            return self.view.get_serialized_item(item_id)
 
-        if value is NO_VALUE:
-            value = self.view.get_serialized_item(item_id)
-            if timeout is not NO_CACHE:
-                self._write_cache(key, value, timeout)
-        return value
+        key = self._make_caching_key(
+            "ITEM",
+            self.request,
+            item_id=item_id,
+        )
+        return self._get_or_compute(
+            key,
+            timeout,
+            lambda: self.view.get_serialized_item(item_id),
+            stale_ttl=self.view.cache_stale_ttl_item or self.view.cache_stale_ttl,
+        )
+
+    def get_binary_item(self, item_id, renderer):
+        timeout = self.view.cache_ttl_item or self.view.cache_ttl
+
+        if timeout is NO_CACHE:
+            return self.view.get_binary_item(item_id, renderer)
+
+        key = self._make_caching_key(
+            "ITEM",
+            self.request,
+            item_id=item_id,
+            format=renderer.format,
+        )
+        return self._get_or_compute(
+            key,
+            timeout,
+            lambda: self.view.get_binary_item(item_id, renderer),
+            stale_ttl=self.view.cache_stale_ttl_item or self.view.cache_stale_ttl,
+        )
 
     def get_tile_bytes(self, z: int, x: int, y: int, params: dict):
         timeout = self.view.cache_ttl_tile or self.view.cache_ttl
 
         if timeout is NO_CACHE:
-            value = NO_VALUE
-        else:
+            return self.view.get_tile_bytes(z, x, y, params)
+
+        key = self._make_caching_key(
+            "TILE",
+            self.request,
+            coords=(x, y, z),
+            params=params,
+        )
+        stale_ttl = self.view.cache_stale_ttl_tile or self.view.cache_stale_ttl
+        compute = self._with_spatial_index(
+            key,
+            tile_cells(z, x, y),
+            timeout,
+            stale_ttl,
+            partial(self._compute_tile, z, x, y, params),
+        )
+        value_from_cache = self._get_or_compute(
+            key,
+            timeout,
+            compute,
+            coalesce=self.view.cache_coalescing,
+            stale_ttl=stale_ttl,
+        )
+        return self._tile_from_cache(value_from_cache)
+
+    def get_tile_bytes_many(self, coords, params: dict):
+        """Returns tiles of many (z, x, y) coords using bulk cache operations"""
+        timeout = self.view.cache_ttl_tile or self.view.cache_ttl
+
+        if timeout is NO_CACHE:
+            return [self.view.get_tile_bytes(z, x, y, params) for z, x, y in coords]
+
+        stale_ttl = self.view.cache_stale_ttl_tile or self.view.cache_stale_ttl
+        keyed_computes = []
+        for z, x, y in coords:
             key = self._make_caching_key(
                 "TILE",
                 self.request,
                 coords=(x, y, z),
                 params=params,
             )
-            value_from_cache = self._read_cache(key)
-            if value_from_cache is not NO_VALUE:
-                if value_from_cache["type"] == "redirect":
-                    value = TileRedirect.from_cache(value_from_cache["data"])
-                else:
-                    value = value_from_cache["data"]
-            else:
-                value = value_from_cache
-
-        if value is NO_VALUE:
-            value = self.view.get_tile_bytes(z, x, y, params)
-
-            if isinstance(value, TileRedirect):
-                value_to_store = {"type": "redirect", "data": value.to_cache()}
-            else:
-                value_to_store = {"type": "bytes", "data": value}
-
-            if timeout is not NO_CACHE:
-                self._write_cache(key, value_to_store, timeout)
-        return value
+            compute = self._with_spatial_index(
+                key,
+                tile_cells(z, x, y),
+                timeout,
+                stale_ttl,
+                partial(self._compute_tile, z, x, y, params),
+            )
+            keyed_computes.append((key, compute))
+        values = self._get_or_compute_many(keyed_computes, timeout, stale_ttl)
+        return [self._tile_from_cache(value) for value in values]
+
+    def _compute_tile(self, z, x, y, params):  # pylint: disable=too-many-arguments
+        return self._tile_to_cache(self.view.get_tile_bytes(z, x, y, params))
+
+    @staticmethod
+    def _tile_to_cache(value):
+        if isinstance(value, TileRedirect):
+            return {"type": "redirect", "data": value.to_cache()}
+        return {"type": "bytes", "data": value}
+
+    @staticmethod
+    def _tile_from_cache(value_from_cache):
+        if value_from_cache["type"] == "redirect":
+            return TileRedirect.from_cache(value_from_cache["data"])
+        return value_from_cache["data"]
 
     def get_browser_caching_salt(self):
         extra = self.view.get_caching_key_extra("ITEMS", self.request)
         if not extra:
             return None
 
-        context_str = json.dumps(extra, default=str)
-        hasher = hashlib.sha256(context_str.encode("utf-8"))
-        salt = b64encode(hasher.digest()).decode("utf-8")[:10]
+        return hash_context(extra)[:10]
+
+    def vary_etag(self, *parts):
+        """Mixes parts of the response added after reading the cache into the ETag"""
+        if self.etag is not None:
+            self.etag = f'"{hash_context([self.etag, parts])}"'
+
+    def get_not_modified_response(self):
+        """Returns 304 response if client already has the last read value"""
+        if self.etag is None:
+            return None
+
+        if_none_match = self.request.META.get("HTTP_IF_NONE_MATCH")
+        if not if_none_match:
+            return None
+
+        etags = [etag.removeprefix("W/") for etag in parse_etags(if_none_match)]
+        if "*" not in etags and self.etag not in etags:
+            return None
+
+        return self.add_etag_header(HttpResponseNotModified())
 
-        return salt
+    def add_etag_header(self, response):
+        if self.etag is not None:
+            response["ETag"] = self.etag
+        return response
 
     def add_browser_cache_headers(self, response):
+        self.add_etag_header(response)
+
         cache_ttl = (
             self.view.cache_ttl_browser
             or self.view.cache_ttl_items
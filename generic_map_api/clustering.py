@@ -10,6 +10,7 @@ from shapely import wkb
 from shapely.geometry import LineString, MultiPoint, MultiPolygon, Point
 from sklearn.cluster import DBSCAN
 
+from .geometry_serializers import to_shapely
 from .values import ClusteringOutput
 
 if TYPE_CHECKING:
@@ -182,10 +183,13 @@ class BasicClustering:
     def get_clustering_config(self, view, viewport):  # pylint: disable=unused-argument
         def default_item_to_point(item):
             try:
-                geom = view.serializer.get_geometry(item)
-                return geom.centroid
-            except (ValueError, AttributeError):
+                geom = to_shapely(view.get_serializer(item).get_source_geometry(item))
+            except ValueError:
                 return None
+            if geom.is_empty:
+                return None
+            centroid = geom.centroid
+            return centroid.x, centroid.y
 
         return {
             "include_orphans": False,
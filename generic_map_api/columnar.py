@@ -0,0 +1,241 @@
+"""Columnar (struct-of-arrays) format of the features list
+
+Instead of a list of items, the response carries parallel arrays::
+
+    {
+        "format": "columnar",
+        "types": [["place", "point"], ...],  # lookup table of item types
+        "type": [0, ...],                     # index to "types" for every item
+        "id": [1, ...],
+        "coords": [lat, lon, lat, lon, ...],  # flat coordinates of all items
+        "item_offsets": [0, 1, ...],          # item -> range in polygon_offsets
+        "polygon_offsets": [0, 1, ...],       # polygon -> range in ring_offsets
+        "ring_offsets": [0, 1, ...],          # ring -> range of coordinate pairs
+        "bbox": [min_lat, min_lon, max_lat, max_lon, ...],
+        "properties": {"category": ["shop", ...], ...},
+    }
+
+Every geometry is stored as polygons of rings, a point is a single ring of
+a single coordinate and a line a single ring. Offset arrays have one more
+element than the number of described elements, like in GeoArrow.
+
+Fields added to the output by serializers overriding ``serialize`` are carried
+as extra columns in "properties", with None for items missing the field.
+
+Geometries serialized in advance are used as they are, unless the serializer
+encodes lines (geometry_encoding), as coordinates of encoded lines are taken
+from the source geometry.
+
+In binary formats coordinates and bboxes are packed little-endian float64
+arrays and offsets are packed little-endian uint32 arrays.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .renderers import FragmentsJSONRenderer, RawJSON
+from .values import ClusteringOutput
+
+if TYPE_CHECKING:
+    from .serializers import BaseFeatureSerializer
+    from .views import MapFeaturesBaseView
+
+COLUMNAR = "columnar"
+COLUMNAR_CONTENT_TYPE = "application/vnd.generic-map-api.columnar+json"
+FORMAT_QUERY_PARAM = "items_format"
+
+# fields of serialized features stored in the dedicated columns
+FEATURE_FIELDS = frozenset(("type", "id", "geom", "bbox"))
+
+
+class ColumnarJSONRenderer(FragmentsJSONRenderer):
+    """Lets the columnar format be negotiated by the media type in Accept header
+
+    The list action renders columnar items itself, other data (e.g. errors) is
+    rendered as plain JSON.
+    """
+
+    media_type = COLUMNAR_CONTENT_TYPE
+    format = COLUMNAR
+    renders_items_only = True
+
+
+def wants_columnar(request) -> bool:
+    """Tells whether the client asked for the columnar format
+
+    It is selected by ?items_format=columnar or by content negotiation.
+    """
+    if request.GET.get(FORMAT_QUERY_PARAM) == COLUMNAR:
+        return True
+    return isinstance(getattr(request, "accepted_renderer", None), ColumnarJSONRenderer)
+
+
+def pack_floats(values) -> bytes:
+    return np.asarray(values, dtype="<f8").tobytes()
+
+
+def pack_offsets(values) -> bytes:
+    return np.asarray(values, dtype="<u4").tobytes()
+
+
+def _loads_raw_json(value):
+    if isinstance(value, RawJSON):
+        return value.loads()
+    return value
+
+
+def _nesting_depth(geometry) -> int:
+    depth = 0
+    while isinstance(geometry, (tuple, list)) and geometry:
+        depth += 1
+        geometry = geometry[0]
+    return depth
+
+
+class ColumnarItemsBuilder:  # pylint: disable=too-many-instance-attributes
+    def __init__(self) -> None:
+        self.type_codes: Dict[tuple, int] = {}
+        self.types: List[int] = []
+        self.ids: list = []
+        self.coords: List[float] = []
+        self.item_offsets: List[int] = [0]
+        self.polygon_offsets: List[int] = [0]
+        self.ring_offsets: List[int] = [0]
+        self.bboxes: List[float] = []
+        self.properties: Dict[str, list] = {}
+
+    def _add_type(self, item_type) -> None:
+        item_type = tuple(item_type)
+        self.types.append(self.type_codes.setdefault(item_type, len(self.type_codes)))
+
+    def _add_ring(self, ring) -> None:
+        for point in ring:
+            self.coords.append(point[0])
+            self.coords.append(point[1])
+        self.ring_offsets.append(len(self.coords) // 2)
+
+    def _add_polygon(self, rings) -> None:
+        for ring in rings:
+            self._add_ring(ring)
+        self.polygon_offsets.append(len(self.ring_offsets) - 1)
+
+    def _add_geometry(self, geometry) -> None:
+        depth = _nesting_depth(geometry)
+        if depth == 1:
+            self._add_polygon([[geometry]])
+        elif depth == 2:
+            self._add_polygon([geometry])
+        elif depth == 3:
+            self._add_polygon(geometry)
+        elif depth == 4:
+            for polygon in geometry:
+                self._add_polygon(polygon)
+        self.item_offsets.append(len(self.polygon_offsets) - 1)
+
+    def _add_bbox(self, bbox) -> None:
+        if not bbox:
+            self.bboxes.extend((None, None, None, None))
+        elif isinstance(bbox[0], (tuple, list)):
+            self.bboxes.extend((bbox[0][0], bbox[0][1], bbox[1][0], bbox[1][1]))
+        else:
+            self.bboxes.extend((bbox[0], bbox[1], bbox[0], bbox[1]))
+
+    def _add_properties(self, properties: dict) -> None:
+        count = len(self.ids)
+        for key, value in properties.items():
+            self.properties.setdefault(key, [None] * (count - 1)).append(value)
+        for column in self.properties.values():
+            if len(column) < count:
+                column.append(None)
+
+    def add_item(  # pylint: disable=too-many-arguments
+        self, item_type, item_id, geometry, bbox, properties: Optional[dict] = None
+    ) -> None:
+        self._add_type(item_type)
+        self.ids.append(item_id)
+        self._add_geometry(geometry)
+        self._add_bbox(bbox)
+        self._add_properties(properties or {})
+
+    def add_feature(self, view: MapFeaturesBaseView, item) -> None:
+        serializer = view.get_serializer(item)
+        serialized_geometry = serializer.lookup_serialized_geometry(item)
+        # encoded lines of geometries serialized in advance have no coordinates
+        if serialized_geometry is not None and not serializer.geometry_encoding:
+            self._add_feature(
+                serializer,
+                item,
+                serializer.get_type(item, with_geometry=False)
+                + (serialized_geometry.geometry_type,),
+                _loads_raw_json(serialized_geometry.geom),
+                _loads_raw_json(serialized_geometry.bbox),
+            )
+            return
+
+        with serializer.geometry_context(item):
+            self._add_feature(
+                serializer,
+                item,
+                serializer.get_type(item),
+                serializer.get_normalized_geometry(item),
+                serializer.get_boundary_box(item),
+            )
+
+    def _add_feature(  # pylint: disable=too-many-arguments
+        self, serializer: BaseFeatureSerializer, item, item_type, geometry, bbox
+    ) -> None:
+        properties = None
+        if not serializer.makes_default_serialization():
+            properties = {
+                key: value
+                for key, value in serializer.serialize(item).items()
+                if key not in FEATURE_FIELDS
+            }
+        self.add_item(item_type, serializer.get_id(item), geometry, bbox, properties)
+
+    def add_cluster(self, view: MapFeaturesBaseView, cluster) -> None:
+        serializer = view.get_serializer(cluster)
+        self.add_item(
+            serializer.get_cluster_type(cluster),
+            None,
+            serializer.get_normalized_cluster_geometry(cluster),
+            serializer.get_cluster_boundary_box(cluster),
+        )
+
+    def add(self, view: MapFeaturesBaseView, item) -> None:
+        if isinstance(item, ClusteringOutput):
+            if item.is_cluster:
+                self.add_cluster(view, item.item)
+            else:
+                self.add_feature(view, item.item)
+        else:
+            self.add_feature(view, item)
+
+    def add_items(self, view: MapFeaturesBaseView, items: Iterable) -> None:
+        for item in items:
+            self.add(view, item)
+
+    def build(self) -> dict:
+        return {
+            "format": COLUMNAR,
+            "types": [list(item_type) for item_type in self.type_codes],
+            "type": self.types,
+            "id": self.ids,
+            "coords": self.coords,
+            "item_offsets": self.item_offsets,
+            "polygon_offsets": self.polygon_offsets,
+            "ring_offsets": self.ring_offsets,
+            "bbox": self.bboxes,
+            "properties": self.properties,
+        }
+
+    def build_packed(self) -> dict:
+        data = self.build()
+        data["coords"] = pack_floats(self.coords)
+        data["bbox"] = pack_floats(self.bboxes)
+        for offsets in ("item_offsets", "polygon_offsets", "ring_offsets"):
+            data[offsets] = pack_offsets(data[offsets])
+        return data
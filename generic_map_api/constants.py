@@ -2,6 +2,10 @@ from enum import Enum
 
 WGS84 = 4326
 
+# at the equator, for 256 px tiles at zoom 0
+METERS_PER_PIXEL_AT_ZOOM_0 = 156543.03392
+METERS_PER_DEGREE = 111319.49
+
 
 class ViewportHandling(Enum):
     TILES = "tiles"
@@ -1,6 +1,7 @@
 from itertools import pairwise
-from typing import Generator, Iterable, Tuple, Union
+from typing import Generator, Iterable, Optional, Tuple, Union
 
+import numpy as np
 from shapely.geometry import MultiPolygon, Polygon, box
 
 
@@ -33,6 +34,38 @@ def normalize_line(
         yield point[0], point[1] + (world_number * 360)
 
 
+def world_offsets(
+    longitudes: np.ndarray, line_index: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Returns longitude shifts (multiples of 360) fixing date line crossings
+
+    Array version of normalize_line, for longitudes of many lines at once.
+    `line_index` (sorted) tells line of every longitude, every line starts
+    in the world number 0.
+    """
+    previous, current = longitudes[:-1], longitudes[1:]
+    crossing = np.abs(previous - current) > 180
+    steps = np.zeros(len(longitudes), dtype=np.int64)
+    # crossing E -> W moves to the next world, W -> E to the previous one
+    steps[1:] = (crossing & (previous > 0) & (current < 0)).astype(np.int64) - (
+        crossing & (previous < 0) & (current > 0)
+    )
+
+    if line_index is not None and len(longitudes):
+        starts = np.flatnonzero(line_index[1:] != line_index[:-1]) + 1
+        steps[starts] = 0
+    else:
+        starts = np.zeros(0, dtype=np.int64)
+
+    world_numbers = np.cumsum(steps)
+    if len(starts):
+        # restart counting at the first point of every line
+        line_starts = np.zeros(len(longitudes), dtype=np.int64)
+        line_starts[starts] = starts
+        world_numbers -= world_numbers[np.maximum.accumulate(line_starts)]
+    return world_numbers * 360.0
+
+
 def normalize_geometry(geometry):
     if not geometry:
         # emoty
@@ -1,19 +1,356 @@
-from typing import Tuple, Union
-
+import math
+from base64 import urlsafe_b64encode
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import shapely
+from django.contrib.gis.geos import GEOSGeometry
 from django.contrib.gis.geos import LineString as GeosLineString
 from django.contrib.gis.geos import MultiPolygon as GeosMultiPolygon
 from django.contrib.gis.geos import Point as GeosPoint
 from django.contrib.gis.geos import Polygon as GeosPolygon
+from shapely import wkb
 from shapely.geometry import LineString as ShapelyLineString
 from shapely.geometry import MultiPolygon as ShapelyMultiPolygon
 from shapely.geometry import Point as ShapelyPoint
 from shapely.geometry import Polygon as ShapelyPolygon
+from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
+
+from .constants import WGS84
+from .date_line_normalization import world_offsets
+
+# number of decimal places of serialized coordinates, None means full precision
+coordinate_precision: ContextVar[Optional[int]] = ContextVar(
+    "coordinate_precision", default=None
+)
+
+
+# id(obj) -> date line normalized frontend style geometry serialized in advance
+# by serialize_many
+prepared_geometries: ContextVar[Optional[Dict[int, tuple]]] = ContextVar(
+    "prepared_geometries", default=None
+)
+
+# id(obj) -> boundary box of raw WKB source geometry computed by prepare_many
+prepared_boundary_boxes: ContextVar[Optional[Dict[int, tuple]]] = ContextVar(
+    "prepared_boundary_boxes", default=None
+)
 
 
 def flip_coords(lon_lat: Tuple[float, float]):
     return lon_lat[1], lon_lat[0]
 
 
+@contextmanager
+def rounded_coordinates(precision: Optional[int]):
+    token = coordinate_precision.set(precision)
+    try:
+        yield
+    finally:
+        coordinate_precision.reset(token)
+
+
+@contextmanager
+def use_prepared_geometries(
+    geometries: Optional[Dict[int, tuple]],
+    boundary_boxes: Optional[Dict[int, tuple]] = None,
+):
+    token = prepared_geometries.set(geometries)
+    boundary_boxes_token = prepared_boundary_boxes.set(boundary_boxes)
+    try:
+        yield
+    finally:
+        prepared_boundary_boxes.reset(boundary_boxes_token)
+        prepared_geometries.reset(token)
+
+
+def get_flip_coords() -> Callable[[Tuple[float, float]], Tuple[float, float]]:
+    """Returns flip_coords, rounding to the current coordinate precision if set"""
+    precision = coordinate_precision.get()
+    if precision is None:
+        return flip_coords
+
+    def flip_and_round_coords(lon_lat: Tuple[float, float]):
+        return round(lon_lat[1], precision), round(lon_lat[0], precision)
+
+    return flip_and_round_coords
+
+
+POLYLINE = "polyline"
+DELTA_VARINT = "delta"
+DEFAULT_ENCODING_PRECISION = 5
+
+
+def _quantized_deltas(points: Iterable[Tuple[float, float]], precision: int):
+    factor = 10**precision
+    previous_lat, previous_lon = 0, 0
+    for lat, lon in points:
+        lat, lon = round(lat * factor), round(lon * factor)
+        yield lat - previous_lat
+        yield lon - previous_lon
+        previous_lat, previous_lon = lat, lon
+
+
+def _zigzag(value: int) -> int:
+    return ~(value << 1) if value < 0 else value << 1
+
+
+def encode_polyline(
+    points: Iterable[Tuple[float, float]], precision: int = DEFAULT_ENCODING_PRECISION
+) -> str:
+    """Encodes (lat, lon) points with Google's encoded polyline algorithm"""
+    output = []
+    for delta in _quantized_deltas(points, precision):
+        value = _zigzag(delta)
+        while value >= 0x20:
+            output.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        output.append(chr(value + 63))
+    return "".join(output)
+
+
+def encode_delta_varint(
+    points: Iterable[Tuple[float, float]], precision: int = DEFAULT_ENCODING_PRECISION
+) -> str:
+    """Encodes (lat, lon) points as zigzag varint deltas in unpadded base64url"""
+    output = bytearray()
+    for delta in _quantized_deltas(points, precision):
+        value = _zigzag(delta)
+        while value >= 0x80:
+            output.append(0x80 | (value & 0x7F))
+            value >>= 7
+        output.append(value)
+    return urlsafe_b64encode(bytes(output)).rstrip(b"=").decode("ascii")
+
+
+LINE_ENCODERS = {
+    POLYLINE: encode_polyline,
+    DELTA_VARINT: encode_delta_varint,
+}
+
+
+def encode_lines(geometry, encoding: str, precision: int = DEFAULT_ENCODING_PRECISION):
+    """Replaces every line or ring of frontend style geometry by encoded string
+
+    Points are left as they are, empty lines or rings are encoded as "".
+    """
+    if not geometry:
+        return geometry
+
+    if len(geometry) == 2 and isinstance(geometry[0], (int, float)):
+        # point
+        return geometry
+
+    if (
+        isinstance(geometry[0], (list, tuple))
+        and geometry[0]
+        and isinstance(geometry[0][0], (int, float))
+    ):
+        # line
+        return LINE_ENCODERS[encoding](geometry, precision)
+
+    return tuple(
+        encode_lines(subgeom, encoding, precision) if subgeom else ""
+        for subgeom in geometry
+    )
+
+
+def to_shapely(geometry) -> BaseGeometry:
+    """Converts any supported geometry to a shapely one in WGS84"""
+    if isinstance(geometry, BaseGeometry):
+        return geometry
+
+    if isinstance(geometry, GEOSGeometry):
+        if geometry.srid and geometry.srid != WGS84:
+            geometry = geometry.transform(WGS84, clone=True)
+        return wkb.loads(bytes(geometry.wkb))
+
+    if isinstance(geometry, dict):
+        return shape(geometry)
+
+    if isinstance(geometry, WKB_TYPES):
+        return shapely.from_wkb(bytes(geometry))
+
+    raise ValueError(f"Cannot convert {geometry.__class__} to shapely geometry")
+
+
+GEOMETRY_TYPE_POINT = 0
+GEOMETRY_TYPE_LINESTRING = 1
+GEOMETRY_TYPE_LINEARRING = 2
+GEOMETRY_TYPE_POLYGON = 3
+GEOMETRY_TYPE_MULTIPOLYGON = 6
+
+# raw WKB and EWKB, as fetched by values_list() or annotated with AsWKB/AsEWKB
+WKB_TYPES = (bytes, bytearray, memoryview)
+
+
+def _flipped_points(
+    geometries: np.ndarray, normalize_date_line: bool = False
+) -> Tuple[List[tuple], np.ndarray]:
+    """Returns flipped (and rounded if requested) points with index of their parts
+
+    With `normalize_date_line` every part is a line moved across the date line
+    like by date_line_normalization.normalize_line.
+    """
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    longitudes = coords[:, 0]
+    lats, lons = coords[:, 1].tolist(), longitudes.tolist()
+
+    precision = coordinate_precision.get()
+    if precision is not None:
+        lats = [round(lat, precision) for lat in lats]
+        lons = [round(lon, precision) for lon in lons]
+        longitudes = np.array(lons, dtype=np.float64)
+
+    if normalize_date_line:
+        offsets = world_offsets(longitudes, index)
+        if offsets.any():
+            lons = (longitudes + offsets).tolist()
+
+    return list(zip(lats, lons)), index
+
+
+def _group(values: list, index: np.ndarray, count: int) -> List[tuple]:
+    """Splits values into `count` tuples, `index` (sorted) tells group of each value"""
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(index, minlength=count), out=offsets[1:])
+    offsets = offsets.tolist()
+    return [tuple(values[offsets[i] : offsets[i + 1]]) for i in range(count)]
+
+
+def _serialize_lines(lines: np.ndarray, normalize_date_line: bool) -> List[tuple]:
+    points, index = _flipped_points(lines, normalize_date_line)
+    return _group(points, index, len(lines))
+
+
+def _serialize_polygons_rings(
+    polygons: np.ndarray, normalize_date_line: bool
+) -> List[tuple]:
+    rings, index = shapely.get_rings(polygons, return_index=True)
+    return _group(_serialize_lines(rings, normalize_date_line), index, len(polygons))
+
+
+def serialize_many(
+    geometries: list, normalize_date_line: bool = False
+) -> List[Optional[tuple]]:
+    """Vectorized `make_frontend_style_geometry` of shapely and GEOS geometries
+
+    See prepare_many.
+    """
+    return prepare_many(geometries, normalize_date_line)[0]
+
+
+def _boundary_boxes(shapes) -> List[Optional[tuple]]:
+    """Same as ShapelySerializer.make_boundary_box of many geometries at once"""
+    is_point = (shapely.get_type_id(shapes) == GEOMETRY_TYPE_POINT).tolist()
+    boundary_boxes: List[Optional[tuple]] = []
+    for (min_x, min_y, max_x, max_y), point in zip(
+        shapely.bounds(shapes).tolist(), is_point
+    ):
+        if math.isnan(min_x):
+            boundary_boxes.append(None)
+        elif point:
+            boundary_boxes.append((min_y, min_x))
+        else:
+            boundary_boxes.append(((min_y, min_x), (max_y, max_x)))
+    return boundary_boxes
+
+
+def prepare_many(  # pylint: disable=too-many-locals
+    geometries: list, normalize_date_line: bool = False
+) -> Tuple[List[Optional[tuple]], List[Optional[tuple]]]:
+    """Vectorized `make_frontend_style_geometry` of shapely and GEOS geometries
+
+    Coordinates of all geometries are read at once with shapely and sliced back
+    into per geometry structures, identical to the per geometry serializers.
+    Raw WKB is decoded in bulk too, without making GEOS objects.
+    Output contains None for geometries which have to be serialized one by one
+    (GeoJSON, empty or unsupported geometries).
+    With `normalize_date_line` output is also date line normalized, with
+    offsets computed over coordinate arrays of all lines and rings at once.
+
+    Returns the output along with boundary boxes of raw WKB geometries, made
+    from the bulk decoded geometries, None for other geometries.
+    """
+    output: List[Optional[tuple]] = [None] * len(geometries)
+    boundary_boxes: List[Optional[tuple]] = [None] * len(geometries)
+
+    positions, shapes = [], []
+    geos_positions, geos_wkbs = [], []
+    wkb_positions, wkbs = [], []
+    for position, geometry in enumerate(geometries):
+        serializer = get_geometry_serializer(geometry)
+        if serializer is ShapelySerializer:
+            positions.append(position)
+            shapes.append(geometry)
+        elif serializer is GeosSerializer:
+            geos_positions.append(position)
+            geos_wkbs.append(bytes(geometry.wkb))
+        elif serializer is WkbSerializer:
+            wkb_positions.append(position)
+            wkbs.append(bytes(geometry))
+
+    if geos_wkbs or wkbs:
+        decoded = shapely.from_wkb(geos_wkbs + wkbs)
+        positions.extend(geos_positions + wkb_positions)
+        shapes.extend(decoded)
+        for position, boundary_box in zip(
+            wkb_positions, _boundary_boxes(decoded[len(geos_wkbs) :])
+        ):
+            boundary_boxes[position] = boundary_box
+
+    if not shapes:
+        return output, boundary_boxes
+
+    shapes = np.array(shapes, dtype=object)
+    positions = np.array(positions, dtype=np.int64)
+    type_ids = np.where(shapely.is_empty(shapes), -1, shapely.get_type_id(shapes))
+
+    def fill(mask, serialized):
+        for position, geometry in zip(positions[mask].tolist(), serialized):
+            output[position] = geometry
+
+    mask = type_ids == GEOMETRY_TYPE_POINT
+    if mask.any():
+        fill(mask, _flipped_points(shapes[mask])[0])
+
+    mask = (type_ids == GEOMETRY_TYPE_LINESTRING) | (
+        type_ids == GEOMETRY_TYPE_LINEARRING
+    )
+    if mask.any():
+        fill(mask, _serialize_lines(shapes[mask], normalize_date_line))
+
+    mask = type_ids == GEOMETRY_TYPE_POLYGON
+    if mask.any():
+        fill(
+            mask,
+            [
+                rings[0] if len(rings) == 1 else rings
+                for rings in _serialize_polygons_rings(
+                    shapes[mask], normalize_date_line
+                )
+            ],
+        )
+
+    mask = type_ids == GEOMETRY_TYPE_MULTIPOLYGON
+    if mask.any():
+        multipolygons = shapes[mask]
+        polygons, index = shapely.get_parts(multipolygons, return_index=True)
+        fill(
+            mask,
+            _group(
+                _serialize_polygons_rings(polygons, normalize_date_line),
+                index,
+                len(multipolygons),
+            ),
+        )
+
+    return output, boundary_boxes
+
+
 class ShapelySerializer:
     supported_shapes = (
         ShapelyPoint,
@@ -21,6 +358,7 @@ class ShapelySerializer:
         ShapelyPolygon,
         ShapelyMultiPolygon,
     )
+    supported_classes: tuple = supported_shapes
 
     @classmethod
     def can_serialize(cls, geometry):
@@ -40,25 +378,27 @@ class ShapelySerializer:
 
     @classmethod
     def serialize(cls, geometry):
+        flip = get_flip_coords()
+
         if isinstance(geometry, ShapelyPoint):
-            return flip_coords(geometry.coords[0])
+            return flip(geometry.coords[0])
 
         if isinstance(geometry, ShapelyLineString):
-            return tuple(flip_coords(point) for point in geometry.coords)
+            return tuple(flip(point) for point in geometry.coords)
 
         if isinstance(geometry, ShapelyPolygon):
             if not geometry.interiors:
-                return tuple(flip_coords(point) for point in geometry.exterior.coords)
+                return tuple(flip(point) for point in geometry.exterior.coords)
 
             return tuple(
-                tuple(flip_coords(point) for point in ring.coords)
+                tuple(flip(point) for point in ring.coords)
                 for ring in (geometry.exterior,) + tuple(geometry.interiors)
             )
 
         if isinstance(geometry, ShapelyMultiPolygon):
             return tuple(
                 tuple(
-                    tuple(flip_coords(point) for point in ring.coords)
+                    tuple(flip(point) for point in ring.coords)
                     for ring in (polygon.exterior,) + tuple(polygon.interiors)
                 )
                 for polygon in geometry.geoms
@@ -81,6 +421,7 @@ class ShapelySerializer:
 
 class GeosSerializer:
     supported_shapes = (GeosPoint, GeosLineString, GeosPolygon, GeosMultiPolygon)
+    supported_classes: tuple = supported_shapes
 
     @classmethod
     def can_serialize(cls, geometry):
@@ -100,26 +441,25 @@ class GeosSerializer:
 
     @classmethod
     def serialize(cls, geometry):
+        flip = get_flip_coords()
+
         if isinstance(geometry, GeosPoint):
-            return flip_coords(geometry.coords)
+            return flip(geometry.coords)
 
         if isinstance(geometry, GeosLineString):
-            return tuple(flip_coords(point) for point in geometry.coords)
+            return tuple(flip(point) for point in geometry.coords)
 
         if isinstance(geometry, GeosPolygon):
             if len(geometry) == 1:
-                return tuple(flip_coords(point) for point in geometry.shell.coords)
+                return tuple(flip(point) for point in geometry.shell.coords)
 
             return tuple(
-                tuple(flip_coords(point) for point in ring.coords) for ring in geometry
+                tuple(flip(point) for point in ring.coords) for ring in geometry
             )
 
         if isinstance(geometry, GeosMultiPolygon):
             return tuple(
-                tuple(
-                    tuple(flip_coords(point) for point in ring.coords)
-                    for ring in polygon
-                )
+                tuple(tuple(flip(point) for point in ring.coords) for ring in polygon)
                 for polygon in geometry
             )
         raise ValueError(
@@ -144,6 +484,7 @@ class GeosSerializer:
 
 class GeoJsonSerializer:
     supported_shapes = ("Point", "LineString", "Polygon", "MultiPolygon")
+    supported_classes: tuple = (dict,)
 
     @classmethod
     def can_serialize(cls, geometry):
@@ -161,23 +502,25 @@ class GeoJsonSerializer:
 
     @classmethod
     def serialize(cls, geometry):
+        flip = get_flip_coords()
+
         if geometry["type"] == "Point":
-            return flip_coords(geometry["coordinates"])
+            return flip(geometry["coordinates"])
 
         if geometry["type"] == "LineString":
-            return tuple(flip_coords(point) for point in geometry["coordinates"])
+            return tuple(flip(point) for point in geometry["coordinates"])
 
         if geometry["type"] == "Polygon":
             rings = geometry["coordinates"]
             if len(rings) == 1:
                 ring = rings[0]
-                return tuple(flip_coords(point) for point in ring)
+                return tuple(flip(point) for point in ring)
 
-            return tuple(tuple(flip_coords(point) for point in ring) for ring in rings)
+            return tuple(tuple(flip(point) for point in ring) for ring in rings)
 
         if geometry["type"] == "MultiPolygon":
             return tuple(
-                tuple(tuple(flip_coords(point) for point in ring) for ring in polygon)
+                tuple(tuple(flip(point) for point in ring) for ring in polygon)
                 for polygon in geometry["coordinates"]
             )
         raise ValueError(
@@ -219,3 +562,80 @@ class GeoJsonSerializer:
             return ((min_y, min_x), (max_y, max_x))
 
         return None
+
+
+class WkbSerializer:
+    """Serializes raw WKB or EWKB with coordinates in WGS84
+
+    Feature type is read from the header, so it is known without decoding.
+    """
+
+    supported_shapes = {1: "point", 2: "line", 3: "polygon", 6: "multipolygon"}
+    supported_classes: tuple = WKB_TYPES
+
+    @classmethod
+    def get_type_code(cls, geometry) -> Optional[int]:
+        if len(geometry) < 5:
+            return None
+        byte_order = "little" if geometry[0] else "big"
+        # clear EWKB flags, then ISO Z/M offsets
+        code = int.from_bytes(geometry[1:5], byte_order) & 0x0FFFFFFF
+        return code % 1000
+
+    @classmethod
+    def can_serialize(cls, geometry):
+        return (
+            isinstance(geometry, WKB_TYPES)
+            and cls.get_type_code(geometry) in cls.supported_shapes
+        )
+
+    @classmethod
+    def get_feature_type(cls, geometry):
+        return cls.supported_shapes.get(cls.get_type_code(geometry))
+
+    @classmethod
+    def serialize(cls, geometry):
+        return ShapelySerializer.serialize(to_shapely(geometry))
+
+    @classmethod
+    def make_boundary_box(
+        cls,
+        geometry,
+    ) -> Union[Tuple[Tuple[float, float], Tuple[float, float]], Tuple[float, float]]:
+        return ShapelySerializer.make_boundary_box(to_shapely(geometry))
+
+
+GEOMETRY_SERIALIZERS = (
+    GeosSerializer,
+    ShapelySerializer,
+    GeoJsonSerializer,
+    WkbSerializer,
+)
+
+# geometry class -> serializer, resolved on the first geometry of every class
+_serializers_by_class: Dict[type, Optional[type]] = {}
+
+
+def _find_geometry_serializer(geometry_class: type) -> Optional[type]:
+    for serializer in GEOMETRY_SERIALIZERS:
+        if issubclass(geometry_class, serializer.supported_classes):
+            return serializer
+    return None
+
+
+def get_geometry_serializer(geometry) -> Optional[type]:
+    """Returns serializer class of the geometry, None if it is not supported
+
+    Serializer is looked up by class of the geometry instead of trying
+    can_serialize of every serializer, only the chosen one checks the geometry.
+    """
+    geometry_class = geometry.__class__
+    try:
+        serializer = _serializers_by_class[geometry_class]
+    except KeyError:
+        serializer = _find_geometry_serializer(geometry_class)
+        _serializers_by_class[geometry_class] = serializer
+
+    if serializer is None or not serializer.can_serialize(geometry):
+        return None
+    return serializer
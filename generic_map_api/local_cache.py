@@ -0,0 +1,131 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 5  # seconds
+
+# items of bigger containers are measured on a sample and extrapolated
+MEASURE_SAMPLE_SIZE = 8
+
+
+class LocalCache:  # pylint: disable=too-many-instance-attributes
+    """Bounded, per-process LRU cache
+
+    Used as a first tier in front of Django's cache backend. The size of every
+    entry is estimated from a sample of its contents and the cache is bounded by
+    the total of those sizes, not by the number of entries. Entries bigger than
+    `max_entry_bytes` are not stored at all, so a single huge payload cannot
+    evict all the others.
+
+    Values are shared between requests, they must not be modified by callers.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL,
+        max_entry_bytes: Optional[int] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = (
+            max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        )
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: str, value: Any, timeout: Optional[float] = None) -> bool:
+        ttl = self.ttl if timeout is None else min(self.ttl, timeout)
+        size = self._measure(value)
+
+        with self._lock:
+            self._remove(key)
+            if ttl <= 0 or size > self.max_entry_bytes:
+                return False
+
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    @classmethod
+    def _measure(cls, value: Any) -> int:
+        """Estimates memory taken by the value without serializing it
+
+        Bytes and strings are measured exactly, so are rendered bodies. Only a
+        sample of items of big containers is visited, so the cost does not grow
+        with the size of the value.
+        """
+        size = sys.getsizeof(value)
+        if isinstance(value, (str, bytes, bytearray, int, float, bool)):
+            return size
+
+        if isinstance(value, dict):
+            items = list(value.keys()) + list(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            items = value
+        elif hasattr(value, "__dict__"):
+            items = list(vars(value).values())
+        else:
+            return size
+
+        count = len(items)
+        if count <= MEASURE_SAMPLE_SIZE:
+            return size + sum(cls._measure(item) for item in items)
+
+        if not isinstance(items, (list, tuple)):
+            items = list(items)
+        step = count / MEASURE_SAMPLE_SIZE
+        sample = [items[int(i * step)] for i in range(MEASURE_SAMPLE_SIZE)]
+        sample_size = sum(cls._measure(item) for item in sample)
+        return size + sample_size * count // MEASURE_SAMPLE_SIZE
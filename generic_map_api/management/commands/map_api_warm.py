@@ -0,0 +1,257 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from importlib import import_module
+from itertools import product
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.http.request import HttpRequest, QueryDict
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+from shapely.geometry import box
+
+from generic_map_api.spatial_index import count_covering_tiles, covering_tiles
+from generic_map_api.views import MapApiBaseView, MapTilesBaseView
+
+WORLD_BBOX = "-180,-85.0511,180,85.0511"
+
+
+def find_view_class(name):
+    """Finds view class by dotted path or by router basename"""
+    if "." in name:
+        try:
+            view_class = import_string(name)
+        except ImportError as exc:
+            raise CommandError(f"Cannot import map api view {name}") from exc
+
+        if not isinstance(view_class, type) or not issubclass(
+            view_class, MapApiBaseView
+        ):
+            raise CommandError(f"{name} is not a map api view")
+        return view_class
+
+    view_classes = set()
+    for view in _iter_views(get_resolver()):
+        view_class = getattr(view, "cls", None)
+        if not view_class or not issubclass(view_class, MapApiBaseView):
+            continue
+        if getattr(view, "initkwargs", {}).get("basename") == name:
+            view_classes.add(view_class)
+
+    if not view_classes:
+        raise CommandError(f"Cannot find map api view with basename {name}")
+    if len(view_classes) > 1:
+        raise CommandError(
+            f"Several map api views have basename {name}, use dotted path of view"
+        )
+    return view_classes.pop()
+
+
+def _iter_views(resolver):
+    """Yields views of the resolver, including those under namespaced includes"""
+    yield from resolver.reverse_dict.keys()
+    for _, namespace_resolver in resolver.namespace_dict.values():
+        yield from _iter_views(namespace_resolver)
+
+
+class Command(BaseCommand):  # pylint: disable=too-many-instance-attributes
+    help = (
+        "Populates map api cache with tiles (or tile viewports of feature views) "
+        "of given area and zoom levels. Requires generic_map_api in INSTALLED_APPS."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.total = 0
+        self.progress_every = 0
+        self.progress = {"warmed": 0, "skipped": 0, "failed": 0}
+        self.progress_lock = threading.Lock()
+
+    def add_arguments(self, parser):
+        parser.add_argument("view", help="Router basename or dotted path of view")
+        parser.add_argument(
+            "--bbox",
+            default=WORLD_BBOX,
+            help="min_lon,min_lat,max_lon,max_lat (default: whole world)",
+        )
+        parser.add_argument("--min-zoom", type=int, default=0)
+        parser.add_argument("--max-zoom", type=int, required=True)
+        parser.add_argument(
+            "--query",
+            action="append",
+            dest="queries",
+            help=(
+                "Query string of a params combination to warm, "
+                "e.g. 'category=A&viewport.zoom=5'. Can be repeated."
+            ),
+        )
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--rate", type=float, default=None, help="Max tiles per second"
+        )
+        parser.add_argument(
+            "--state-file",
+            default=None,
+            help="File with warmed tiles, allows resuming interrupted warming",
+        )
+        parser.add_argument("--progress-every", type=int, default=100)
+
+    def handle(self, *args, **options):
+        view_class = find_view_class(options["view"])
+        queries = options["queries"] or [""]
+        area = box(*self._parse_bbox(options["bbox"]))
+        zooms = range(options["min_zoom"], options["max_zoom"] + 1)
+
+        tasks = (
+            (tile, query_index, query)
+            for zoom in zooms
+            for tile, (query_index, query) in product(
+                covering_tiles(area, zoom), enumerate(queries)
+            )
+        )
+        self.total = sum(count_covering_tiles(area, zoom) for zoom in zooms) * len(
+            queries
+        )
+        self.progress_every = options["progress_every"]
+
+        done = self._read_state(options["state_file"])
+        state_file_context = (
+            open(  # pylint: disable=consider-using-with
+                options["state_file"], "a", encoding="utf-8"
+            )
+            if options["state_file"]
+            else nullcontext()
+        )
+        with state_file_context as state_file:
+            self._run(
+                view_class,
+                (task for task in tasks if not self._is_done(task, done)),
+                state_file,
+                options["workers"],
+                options["rate"],
+            )
+
+        self.stdout.write(
+            f"Done: {self.progress['warmed']} warmed, "
+            f"{self.progress['skipped']} skipped, "
+            f"{self.progress['failed']} failed of {self.total}"
+        )
+
+    def _run(
+        self, view_class, tasks, state_file, workers, rate
+    ):  # pylint: disable=too-many-arguments
+        # bounded number of pending tasks keeps memory flat on big pyramids
+        slots = threading.BoundedSemaphore(workers * 2)
+        min_interval = 1 / rate if rate else 0
+        next_submit_at = time.monotonic()
+
+        def run(tile, query_index, query):
+            try:
+                self._warm_task(view_class, tile, query_index, query, state_file)
+            finally:
+                # connections are per thread, those of workers are not closed
+                # by anything else
+                connections.close_all()
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for task in tasks:
+                if min_interval:
+                    time.sleep(max(0, next_submit_at - time.monotonic()))
+                    next_submit_at = time.monotonic() + min_interval
+
+                slots.acquire()  # pylint: disable=consider-using-with
+                executor.submit(run, *task)
+
+    def _warm_task(
+        self, view_class, tile, query_index, query, state_file
+    ):  # pylint: disable=too-many-arguments
+        task_id = self._make_task_id(tile, query_index)
+        try:
+            self.warm_tile(view_class, tile, query)
+        except Exception as exc:  # pylint: disable=broad-except
+            status = "failed"
+            self.stderr.write(f"Failed to warm {task_id}: {exc}")
+        else:
+            status = "warmed"
+
+        with self.progress_lock:
+            self.progress[status] += 1
+            if state_file and status == "warmed":
+                state_file.write(f"{task_id}\n")
+                state_file.flush()
+            self._report_progress()
+
+    def _is_done(self, task, done):
+        tile, query_index, _ = task
+        if self._make_task_id(tile, query_index) in done:
+            self.progress["skipped"] += 1
+            return True
+        return False
+
+    def warm_tile(self, view_class, tile, query):
+        zoom, x, y = tile
+        if issubclass(view_class, MapTilesBaseView):
+            view = view_class(action="tile")
+            request = self.make_request(query)
+            view.request = request
+            view.tile(request, str(zoom), str(x), str(y), view.default_image_format)
+        else:
+            view = view_class(action="list")
+            request = self.make_request(query, tile=f"{x}/{y}/{zoom}")
+            view.request = request
+            response = view.list(request)
+            if response.streaming:
+                # streamed items are stored in cache once fully consumed
+                for _ in response.streaming_content:
+                    pass
+
+    def make_request(self, query, **extra_params):
+        query_dict = QueryDict(query, mutable=True)
+        for param, value in extra_params.items():
+            query_dict[param] = value
+
+        django_request = HttpRequest()
+        django_request.method = "GET"
+        django_request.GET = query_dict
+
+        if "django.contrib.sessions" in settings.INSTALLED_APPS:
+            # make the caching keys equal to those of anonymous users
+            engine = import_module(settings.SESSION_ENGINE)
+            django_request.session = engine.SessionStore()
+
+        return Request(django_request)
+
+    def _report_progress(self):
+        processed = self.progress["warmed"] + self.progress["failed"]
+        if self.progress_every and processed % self.progress_every == 0:
+            self.stdout.write(f"{processed + self.progress['skipped']}/{self.total}")
+
+    @staticmethod
+    def _make_task_id(tile, query_index):
+        zoom, x, y = tile
+        return f"{zoom}/{x}/{y}/{query_index}"
+
+    @staticmethod
+    def _read_state(state_file):
+        if not state_file:
+            return set()
+        try:
+            with open(state_file, encoding="utf-8") as f:
+                return {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    @staticmethod
+    def _parse_bbox(bbox):
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+        except ValueError as exc:
+            raise CommandError(
+                "bbox has to be min_lon,min_lat,max_lon,max_lat"
+            ) from exc
+        return min_lon, min_lat, max_lon, max_lat
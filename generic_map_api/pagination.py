@@ -0,0 +1,93 @@
+"""Keyset (cursor) pagination of QuerySet layers
+
+Cursor is an opaque string holding the ordering key and the pk of the last item
+of the previous page, so every page is a cheap index range scan regardless of
+how deep the client is, and every page can be cached under its own key.
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import List, Optional, Tuple
+
+from django.contrib.gis.db.models.functions import GeoHash
+from django.core.exceptions import BadRequest, ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q, QuerySet
+
+CURSOR_QUERY_PARAM = "cursor"
+GEOHASH_ORDERING_ANNOTATION = "pagination_geohash"
+ORDERING_ANNOTATION = "pagination_ordering"
+GEOHASH_PRECISION = 12
+
+
+def encode_cursor(ordering_value, pk) -> str:
+    data = json.dumps([ordering_value, pk], cls=DjangoJSONEncoder)
+    return urlsafe_b64encode(data.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        ordering_value, pk = json.loads(urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError) as exc:
+        raise BadRequest("Invalid cursor") from exc
+    return ordering_value, pk
+
+
+def order_by_geohash(queryset: QuerySet, geometry_field: str) -> QuerySet:
+    """Annotates QuerySet with geohash of the geometry to be used as ordering key
+
+    Items close to each other end up on the same page, so pages can be rendered
+    progressively as compact areas of the map.
+    """
+    return queryset.annotate(
+        **{
+            GEOHASH_ORDERING_ANNOTATION: GeoHash(
+                geometry_field, precision=GEOHASH_PRECISION
+            )
+        }
+    )
+
+
+def paginate_queryset(
+    queryset: QuerySet, ordering: str, page_size: int, cursor: Optional[str] = None
+) -> Tuple[List, Optional[str]]:
+    """Returns items of the page following the cursor and cursor of the next page
+
+    Ordering is a field name, prefixed with "-" for descending order, which may
+    span relations (e.g. "category__name"). Pk orders items of equal ordering
+    value, which must not be NULL.
+    """
+    descending = ordering.startswith("-")
+    field = ordering.removeprefix("-")
+    if not field or field.startswith("-"):
+        raise ImproperlyConfigured(f"Invalid pagination ordering {ordering!r}")
+    lookup = "lt" if descending else "gt"
+
+    if field == "pk":
+        queryset = queryset.order_by(ordering)
+    else:
+        # ordering value is annotated, so it can be read from the last item of
+        # the page even when it comes from a related model
+        queryset = queryset.annotate(**{ORDERING_ANNOTATION: F(field)}).order_by(
+            f"-{ORDERING_ANNOTATION}" if descending else ORDERING_ANNOTATION, "pk"
+        )
+
+    if cursor:
+        ordering_value, pk = decode_cursor(cursor)
+        if field == "pk":
+            queryset = queryset.filter(**{f"pk__{lookup}": pk})
+        else:
+            queryset = queryset.filter(
+                Q(**{f"{ORDERING_ANNOTATION}__{lookup}": ordering_value})
+                | Q(**{ORDERING_ANNOTATION: ordering_value, "pk__gt": pk})
+            )
+
+    items = list(queryset[: page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last_item = items[-1]
+    ordering_value = None if field == "pk" else getattr(last_item, ORDERING_ANNOTATION)
+    return items, encode_cursor(ordering_value, last_item.pk)
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import re
+import uuid
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Union
+
+import numpy as np
+import shapely
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+from .geometry_serializers import to_shapely
+from .values import ClusteringOutput
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    from pyogrio import raw as pyogrio_raw
+except ImportError:  # pragma: no cover
+    pyogrio_raw = None
+
+if TYPE_CHECKING:
+    from .values import BaseViewPort
+    from .views import MapFeaturesBaseView
+
+
+IDENTITY = "identity"
+GZIP = "gzip"
+BROTLI = "br"
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def available_encodings() -> tuple:
+    if brotli is not None:
+        return (BROTLI, GZIP)
+    return (GZIP,)
+
+
+class RawJSON:
+    """JSON fragment (e.g. stored in a DB column) emitted verbatim by JSON renderers
+
+    Fragment is trusted to be valid JSON, it is never decoded when rendered.
+    """
+
+    __slots__ = ("json",)
+
+    def __init__(self, fragment: Union[str, bytes]) -> None:
+        if isinstance(fragment, (bytes, bytearray, memoryview)):
+            fragment = bytes(fragment).decode("utf-8")
+        self.json = fragment
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and self.json == other.json
+
+    def __hash__(self):
+        return hash(self.json)
+
+    def __repr__(self):
+        return f"RawJSON({self.json!r})"
+
+    def loads(self):
+        return json.loads(self.json)
+
+    def tolist(self):
+        # DRF JSONEncoder (used by JSON renderers other than FragmentsJSONRenderer)
+        # encodes output of tolist, so fragments are decoded there
+        return self.loads()
+
+
+# the encoder writes fragments as strings starting with the marker, which are
+# replaced by the fragments afterwards, marker is unique so it cannot be faked
+RAW_JSON_MARKER = f"raw-json-{uuid.uuid4().hex}:"
+_RAW_JSON_STRING = re.compile('"' + re.escape(RAW_JSON_MARKER) + r'((?:[^"\\]|\\.)*)"')
+
+
+class FragmentsJSONEncoder(encoders.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            return RAW_JSON_MARKER + obj.json
+        return super().default(obj)
+
+
+def splice_raw_json(text: str) -> str:
+    """Replaces marked strings written by FragmentsJSONEncoder by their fragments"""
+    if RAW_JSON_MARKER not in text:
+        return text
+    return _RAW_JSON_STRING.sub(lambda match: json.loads(f'"{match.group(1)}"'), text)
+
+
+class FragmentsJSONRenderer(JSONRenderer):
+    """JSON renderer emitting RawJSON fragments verbatim"""
+
+    encoder_class = FragmentsJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rendered = super().render(data, accepted_media_type, renderer_context)
+        if RAW_JSON_MARKER.encode("ascii") not in rendered:
+            return rendered
+        return splice_raw_json(rendered.decode("utf-8")).encode("utf-8")
+
+
+def render_json(data) -> bytes:
+    return FragmentsJSONRenderer().render(data)
+
+
+def stream_json_items(items: Iterable, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Renders {"items": [...]} incrementally, in chunks of about chunk_size bytes"""
+    encoder = FragmentsJSONEncoder(
+        ensure_ascii=JSONRenderer.ensure_ascii,
+        separators=(",", ":"),
+    )
+    chunk = [b'{"items":[']
+    chunk_length = 0
+    separator = b""
+    for item in items:
+        item_bytes = separator + splice_raw_json(encoder.encode(item)).encode("utf-8")
+        separator = b","
+        chunk.append(item_bytes)
+        chunk_length += len(item_bytes)
+        if chunk_length >= chunk_size:
+            yield b"".join(chunk)
+            chunk = []
+            chunk_length = 0
+
+    chunk.append(b"]}")
+    yield b"".join(chunk)
+
+
+def encode_body(body: bytes, encodings: Iterable[str]) -> Dict[str, bytes]:
+    """Returns the body in its plain form and in every requested encoding"""
+    encoded = {IDENTITY: body}
+    for encoding in encodings:
+        if encoding == GZIP:
+            encoded[GZIP] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        elif encoding == BROTLI and brotli is not None:
+            encoded[BROTLI] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return encoded
+
+
+def _parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str], encodings: Iterable[str]) -> str:
+    """Picks the best of the given encodings accepted by the client
+
+    Encodings are expected in order of preference, "identity" is the fallback.
+    """
+    accepted = _parse_accept_encoding(accept_encoding or "")
+    best_encoding = IDENTITY
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding = encoding
+            best_quality = quality
+    return best_encoding
+
+
+def negotiate_body_encoding(
+    bodies: Dict[str, bytes], accept_encoding: Optional[str]
+) -> str:
+    return negotiate_encoding(
+        accept_encoding, [coding for coding in bodies if coding != IDENTITY]
+    )
+
+
+def make_encoded_response(
+    bodies: Dict[str, bytes],
+    encoding: str,
+    content_type: str = "application/json",
+) -> HttpResponse:
+    response = HttpResponse(bodies[encoding], content_type=content_type)
+    if encoding != IDENTITY:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+class BaseItemsRenderer(BaseRenderer):
+    """Renderer able to render feature items of a view straight to bytes
+
+    Items rendered this way are cached in their binary form.
+    """
+
+    charset = None
+    render_style = "binary"
+
+    # renderer cannot render anything else than items (e.g. errors or meta)
+    renders_items_only = False
+
+    def render_items(
+        self, view: MapFeaturesBaseView, items: Iterable, viewport: BaseViewPort
+    ) -> bytes:
+        raise NotImplementedError()
+
+
+class MessagePackRenderer(BaseItemsRenderer):
+    """Renders data as MessagePack, feature lists in packed columnar format"""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=self._default)
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, RawJSON):
+            return obj.loads()
+        return encoders.JSONEncoder().default(obj)
+
+    def render_items(
+        self, view: MapFeaturesBaseView, items: Iterable, viewport: BaseViewPort
+    ) -> bytes:
+        builder = view.build_columnar_items(viewport, items)
+        return self.render(builder.build_packed())
+
+
+class FlatGeobufRenderer(BaseItemsRenderer):
+    """Renders feature items as a FlatGeobuf file with id and type fields"""
+
+    media_type = "application/flatgeobuf"
+    format = "fgb"
+    renders_items_only = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, bytearray)):
+            return bytes(data)
+        raise ValueError("FlatGeobuf renderer can render only feature items")
+
+    @staticmethod
+    def _make_id_field(ids: list) -> np.ndarray:
+        if all(isinstance(item_id, int) for item_id in ids):
+            return np.array(ids, dtype=np.int64)
+        return np.array(
+            [None if item_id is None else str(item_id) for item_id in ids],
+            dtype=object,
+        )
+
+    def render_items(
+        self, view: MapFeaturesBaseView, items: Iterable, viewport: BaseViewPort
+    ) -> bytes:
+        geometries, ids, types = [], [], []
+        for item in items:
+            if isinstance(item, ClusteringOutput):
+                serializer = view.get_serializer(item.item)
+                if item.is_cluster:
+                    geometries.append(serializer.get_cluster_geometry(item.item))
+                    ids.append(None)
+                    types.append(serializer.get_cluster_type(item.item))
+                    continue
+                item = item.item
+            serializer = view.get_serializer(item)
+            geometries.append(serializer.get_geometry(item))
+            ids.append(serializer.get_id(item))
+            types.append(serializer.get_type(item, with_geometry=False))
+
+        output = io.BytesIO()
+        pyogrio_raw.write(
+            output,
+            # items without geometry are written with null geometry
+            shapely.to_wkb(
+                [
+                    None if geometry is None else to_shapely(geometry)
+                    for geometry in geometries
+                ]
+            ),
+            [
+                self._make_id_field(ids),
+                np.array([",".join(item_type) for item_type in types], dtype=object),
+            ],
+            ["id", "type"],
+            driver="FlatGeobuf",
+            layer="items",
+            geometry_type="Unknown",
+            crs="EPSG:4326",
+            SPATIAL_INDEX="NO",
+        )
+        return output.getvalue()
+
+
+def binary_renderer_classes() -> tuple:
+    """Returns binary renderers which dependencies are installed"""
+    renderer_classes = ()
+    if msgpack is not None:
+        renderer_classes += (MessagePackRenderer,)
+    if pyogrio_raw is not None:
+        renderer_classes += (FlatGeobufRenderer,)
+    return renderer_classes
@@ -1,8 +1,42 @@
-from typing import Tuple, Union
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
 from rest_framework.serializers import Serializer
 
 from . import date_line_normalization, geometry_serializers
+from .local_cache import LocalCache
+from .renderers import RawJSON, render_json
+from .simplification import (
+    SIMPLIFICATION_CACHE,
+    SIMPLIFIED_GEOMETRY_ANNOTATION,
+    simplified_geometries,
+)
+from .values import SerializedGeometry
+
+# (object, its source geometry) of the object being serialized, so geometry is
+# fetched once per object instead of once per every serialized field
+current_geometry: ContextVar[Optional[Tuple[Any, Any]]] = ContextVar(
+    "current_geometry", default=None
+)
+
+# id() of objects of the batch being serialized -> their (serialized geometry,
+# source geometry), so geometry is fetched once per object for all steps of
+# batch serialization
+batch_geometries: ContextVar[
+    Optional[Dict[int, Tuple[Optional[SerializedGeometry], Any]]]
+] = ContextVar("batch_geometries", default=None)
+
+
+@contextmanager
+def use_batch_geometries(
+    geometries: Optional[Dict[int, Tuple[Optional[SerializedGeometry], Any]]]
+):
+    token = batch_geometries.set(geometries)
+    try:
+        yield
+    finally:
+        batch_geometries.reset(token)
 
 
 class FeatureSerializerMeta(type):
@@ -33,20 +67,51 @@ class FeatureSerializerMeta(type):
         )
 
 
-class BaseFeatureSerializer(metaclass=FeatureSerializerMeta):
+class BaseFeatureSerializer(
+    metaclass=FeatureSerializerMeta
+):  # pylint: disable=too-many-public-methods
     feature_type = None
     feature_types = ()
 
     cluster_type = "cluster"
     cluster_types = ()
 
+    # encode lines and rings as strings, see geometry_serializers.LINE_ENCODERS
+    geometry_encoding: Optional[str] = None
+    geometry_encoding_precision = geometry_serializers.DEFAULT_ENCODING_PRECISION
+
+    # simplify lines and polygons according to zoom of the viewport
+    simplify_geometry = False
+    simplification_tolerance = 1.0  # pixels
+    simplification_cache: Optional[LocalCache] = SIMPLIFICATION_CACHE
+
     def serialize(self, obj):
-        return {
-            "type": self.get_type(obj),
-            "id": self.get_id(obj),
-            "geom": self.get_frontend_style_geometry(obj),
-            "bbox": self.get_boundary_box(obj),
-        }
+        serialized_geometry = self.lookup_serialized_geometry(obj)
+        if serialized_geometry is not None:
+            return {
+                "type": self.get_type(obj, with_geometry=False)
+                + (serialized_geometry.geometry_type,),
+                "id": self.get_id(obj),
+                "geom": serialized_geometry.geom,
+                "bbox": serialized_geometry.bbox,
+            }
+
+        with self.geometry_context(obj):
+            return {
+                "type": self.get_type(obj),
+                "id": self.get_id(obj),
+                "geom": self.get_frontend_style_geometry(obj),
+                "bbox": self.get_boundary_box(obj),
+            }
+
+    @contextmanager
+    def geometry_context(self, obj):
+        """Fetches source geometry of the object once for everything serialized within"""
+        token = current_geometry.set((obj, self.get_source_geometry(obj)))
+        try:
+            yield
+        finally:
+            current_geometry.reset(token)
 
     def serialize_details(self, obj):
         return {
@@ -65,12 +130,18 @@ class BaseFeatureSerializer(metaclass=FeatureSerializerMeta):
     def get_type(self, obj, with_geometry=True):  # pylint: disable=unused-argument
         if with_geometry:
             geometry_feature_type = self.get_geometry_feature_type(
-                self.get_geometry(obj)
+                self.get_source_geometry(obj)
             )
             if geometry_feature_type:
                 return self.feature_types + (geometry_feature_type,)
         return self.feature_types
 
+    def get_vector_tile_properties(self, obj):
+        feature_types = self.get_type(obj, with_geometry=False)
+        if not feature_types:
+            return {}
+        return {"type": ",".join(feature_types)}
+
     def get_cluster_type(self, obj):  # pylint: disable=unused-argument
         return self.cluster_types + ("multipolygon",)
 
@@ -83,21 +154,166 @@ class BaseFeatureSerializer(metaclass=FeatureSerializerMeta):
     def get_cluster_geometry(self, obj):  # pylint: disable=unused-argument
         return None
 
-    def get_frontend_style_geometry(self, obj):
-        input_geometry = self.get_geometry(obj)  # pylint: disable=assignment-from-none
+    def get_serialized_geometry(  # pylint: disable=unused-argument
+        self, obj
+    ) -> Optional[SerializedGeometry]:
+        """Returns geometry serialized in advance (e.g. stored in a DB column) or None
+
+        Such geometry is put into the output as it is, it is not simplified nor
+        rounded. It has to be serialized the way this serializer outputs geometry,
+        including geometry_encoding, as make_serialized_geometry does.
+        """
+        return None
+
+    def lookup_serialized_geometry(self, obj) -> Optional[SerializedGeometry]:
+        """Returns get_serialized_geometry, called once per object of a batch"""
+        batch = batch_geometries.get()
+        if batch is not None and id(obj) in batch:
+            return batch[id(obj)][0]
+        return self.get_serialized_geometry(obj)
+
+    def make_serialized_geometry(self, obj) -> SerializedGeometry:
+        """Serializes geometry of the object in advance, with RawJSON fragments"""
+        with self.geometry_context(obj):
+            return SerializedGeometry(
+                geometry_type=self.get_geometry_feature_type(
+                    self.get_source_geometry(obj)
+                ),
+                geom=RawJSON(render_json(self.get_frontend_style_geometry(obj))),
+                bbox=RawJSON(render_json(self.get_boundary_box(obj))),
+            )
+
+    def get_source_geometry(self, obj):
+        """Returns get_geometry, fetched once within geometry_context or a batch"""
+        current = current_geometry.get()
+        if current is not None and current[0] is obj:
+            return current[1]
+        batch = batch_geometries.get()
+        fetched = batch.get(id(obj)) if batch is not None else None
+        # source geometry of objects serialized in advance is not fetched
+        if fetched is not None and fetched[0] is None:
+            return fetched[1]
+        return self.get_geometry(obj)
+
+    def fetch_batch_geometries(self, objs: list) -> dict:
+        """Fetches geometries of many objects at once, for use_batch_geometries
+
+        Output maps id() of the object to its (serialized geometry, source
+        geometry), source geometry is not fetched for objects serialized in advance.
+        """
+        # pylint: disable=assignment-from-none
+        fetched = {}
+        for obj in objs:
+            serialized_geometry = self.get_serialized_geometry(obj)
+            source_geometry = None
+            if serialized_geometry is None:
+                source_geometry = self.get_geometry(obj)
+            fetched[id(obj)] = (serialized_geometry, source_geometry)
+        return fetched
+
+    def get_simplified_geometry(self, obj):
+        """Returns geometry simplified for the viewport, by shapely or the database"""
+        simplified = simplified_geometries.get()
+        if simplified is not None and id(obj) in simplified:
+            return simplified[id(obj)]
+        geometry = getattr(obj, SIMPLIFIED_GEOMETRY_ANNOTATION, None)
+        if geometry is not None:
+            return geometry
+        return self.get_source_geometry(obj)
+
+    def get_normalized_geometry(self, obj):
+        prepared = geometry_serializers.prepared_geometries.get()
+        if prepared is not None and id(obj) in prepared:
+            return prepared[id(obj)]
+        input_geometry = self.get_simplified_geometry(obj)
         geometry = self.make_frontend_style_geometry(input_geometry)
         return date_line_normalization.normalize_geometry(geometry)
 
-    def get_frontend_style_cluster_geometry(self, obj):
+    def makes_default_serialization(self) -> bool:
+        return type(self).serialize is BaseFeatureSerializer.serialize
+
+    def makes_default_frontend_style_geometry(self) -> bool:
+        return (
+            type(self).make_frontend_style_geometry
+            is BaseFeatureSerializer.make_frontend_style_geometry
+        )
+
+    def prepare_frontend_geometries(self, objs: list) -> Tuple[dict, dict]:
+        """Makes date line normalized frontend style geometries of many objects at once
+
+        Output maps id() of the object to its geometry, and id() of the object
+        to its boundary box where the source geometry is raw WKB decoded for
+        it. Serializers customizing make_frontend_style_geometry are left to
+        serialize one object at a time.
+        """
+        if not self.makes_default_frontend_style_geometry():
+            return {}, {}
+
+        objs = [obj for obj in objs if self.lookup_serialized_geometry(obj) is None]
+        input_geometries = [self.get_simplified_geometry(obj) for obj in objs]
+        serialized, boundary_boxes = geometry_serializers.prepare_many(
+            input_geometries, normalize_date_line=True
+        )
+        prepared = {
+            id(obj): geometry
+            for obj, geometry in zip(objs, serialized)
+            if geometry is not None
+        }
+        # boundary box is of the source geometry, not of a simplified one
+        prepared_boundary_boxes = {
+            id(obj): boundary_box
+            for obj, input_geometry, boundary_box in zip(
+                objs, input_geometries, boundary_boxes
+            )
+            if boundary_box is not None
+            and input_geometry is self.get_source_geometry(obj)
+        }
+        return prepared, prepared_boundary_boxes
+
+    def serialize_many(self, objs: Iterable) -> list:
+        """Same as serializing objects one by one, with geometries made in a batch"""
+        objs = list(objs)
+        with use_batch_geometries(self.fetch_batch_geometries(objs)):
+            prepared, boundary_boxes = self.prepare_frontend_geometries(objs)
+            with geometry_serializers.use_prepared_geometries(prepared, boundary_boxes):
+                return [self.serialize(obj) for obj in objs]
+
+    def get_normalized_cluster_geometry(self, obj):
         # pylint: disable=assignment-from-none
         input_geometry = self.get_cluster_geometry(obj)
+        if self.makes_default_frontend_style_geometry():
+            (geometry,) = geometry_serializers.serialize_many(
+                [input_geometry], normalize_date_line=True
+            )
+            if geometry is not None:
+                return geometry
         geometry = self.make_frontend_style_geometry(input_geometry)
         return date_line_normalization.normalize_geometry(geometry)
 
+    def get_frontend_style_geometry(self, obj):
+        return self.encode_frontend_style_geometry(self.get_normalized_geometry(obj))
+
+    def get_frontend_style_cluster_geometry(self, obj):
+        return self.encode_frontend_style_geometry(
+            self.get_normalized_cluster_geometry(obj)
+        )
+
+    def encode_frontend_style_geometry(self, geometry):
+        # lines are encoded after date line normalization, to keep unwrapped
+        # longitudes of lines crossing the date line
+        if not self.geometry_encoding:
+            return geometry
+        return geometry_serializers.encode_lines(
+            geometry, self.geometry_encoding, self.geometry_encoding_precision
+        )
+
     def get_boundary_box(
         self, obj
     ) -> Union[Tuple[Tuple[float, float], Tuple[float, float]], Tuple[float, float]]:
-        geometry = self.get_geometry(obj)  # pylint: disable=assignment-from-none
+        boundary_boxes = geometry_serializers.prepared_boundary_boxes.get()
+        if boundary_boxes is not None and id(obj) in boundary_boxes:
+            return boundary_boxes[id(obj)]
+        geometry = self.get_source_geometry(obj)
         return self.make_boundary_box(geometry)
 
     def get_cluster_boundary_box(
@@ -108,40 +324,31 @@ class BaseFeatureSerializer(metaclass=FeatureSerializerMeta):
         return self.make_boundary_box(geometry)
 
     def get_geometry_feature_type(self, geometry):
-        if geometry_serializers.GeosSerializer.can_serialize(geometry):
-            return geometry_serializers.GeosSerializer.get_feature_type(geometry)
-        if geometry_serializers.ShapelySerializer.can_serialize(geometry):
-            return geometry_serializers.ShapelySerializer.get_feature_type(geometry)
-        if geometry_serializers.GeoJsonSerializer.can_serialize(geometry):
-            return geometry_serializers.GeoJsonSerializer.get_feature_type(geometry)
-        raise ValueError(
-            "Cannot determine generic geometry type type of "
-            f"{geometry.__class__} in {self.__class__}"
-        )
+        serializer = geometry_serializers.get_geometry_serializer(geometry)
+        if serializer is None:
+            raise ValueError(
+                "Cannot determine generic geometry type type of "
+                f"{geometry.__class__} in {self.__class__}"
+            )
+        return serializer.get_feature_type(geometry)
 
     def make_frontend_style_geometry(self, geometry):
-        if geometry_serializers.GeosSerializer.can_serialize(geometry):
-            return geometry_serializers.GeosSerializer.serialize(geometry)
-        if geometry_serializers.ShapelySerializer.can_serialize(geometry):
-            return geometry_serializers.ShapelySerializer.serialize(geometry)
-        if geometry_serializers.GeoJsonSerializer.can_serialize(geometry):
-            return geometry_serializers.GeoJsonSerializer.serialize(geometry)
-        raise ValueError(
-            f"Cannot make frontend geometry from {geometry.__class__} in {self.__class__}"
-        )
+        serializer = geometry_serializers.get_geometry_serializer(geometry)
+        if serializer is None:
+            raise ValueError(
+                f"Cannot make frontend geometry from {geometry.__class__} in {self.__class__}"
+            )
+        return serializer.serialize(geometry)
 
     def make_boundary_box(
         self, geometry
     ) -> Union[Tuple[Tuple[float, float], Tuple[float, float]], Tuple[float, float]]:
-        if geometry_serializers.GeosSerializer.can_serialize(geometry):
-            return geometry_serializers.GeosSerializer.make_boundary_box(geometry)
-        if geometry_serializers.ShapelySerializer.can_serialize(geometry):
-            return geometry_serializers.ShapelySerializer.make_boundary_box(geometry)
-        if geometry_serializers.GeoJsonSerializer.can_serialize(geometry):
-            return geometry_serializers.GeoJsonSerializer.make_boundary_box(geometry)
-        raise ValueError(
-            f"Cannot get boundary box of {geometry.__class__} in {self.__class__}"
-        )
+        serializer = geometry_serializers.get_geometry_serializer(geometry)
+        if serializer is None:
+            raise ValueError(
+                f"Cannot get boundary box of {geometry.__class__} in {self.__class__}"
+            )
+        return serializer.make_boundary_box(geometry)
 
 
 # Left for compatibility.
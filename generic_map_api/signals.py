@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Type
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .caching import Cache
+
+if TYPE_CHECKING:
+    from .views import MapApiBaseView
+
+
+def connect_spatial_invalidation(
+    view_class: Type[MapApiBaseView], model, geometry_field: str
+):
+    """Invalidates cached areas of the view when instances of model change
+
+    Both the old and the new geometry of a saved instance are invalidated, so
+    moved features disappear from tiles they have left. The view has to enable
+    `cache_spatial_index`.
+    """
+    if not view_class.cache_spatial_index:
+        raise ImproperlyConfigured(
+            f"Spatial cache index is not enabled in {view_class}, "
+            "set cache_spatial_index to invalidate it on model changes"
+        )
+
+    old_geometry_attr = f"_map_api_old_{geometry_field}"
+    uid = f"map_api_{view_class.__module__}.{view_class.__name__}.{geometry_field}"
+
+    def remember_old_geometry(sender, instance, **kwargs):  # pylint: disable=W0613
+        old_geometry = None
+        if instance.pk is not None:
+            old_geometry = (
+                sender._default_manager.filter(  # pylint: disable=protected-access
+                    pk=instance.pk
+                )
+                .values_list(geometry_field, flat=True)
+                .first()
+            )
+        setattr(instance, old_geometry_attr, old_geometry)
+
+    def invalidate_saved(sender, instance, **kwargs):  # pylint: disable=W0613
+        geometries = (
+            getattr(instance, old_geometry_attr, None),
+            getattr(instance, geometry_field),
+        )
+        for geometry in geometries:
+            if geometry is not None:
+                Cache.invalidate_bbox(view_class, geometry)
+
+    def invalidate_deleted(sender, instance, **kwargs):  # pylint: disable=W0613
+        geometry = getattr(instance, geometry_field)
+        if geometry is not None:
+            Cache.invalidate_bbox(view_class, geometry)
+
+    pre_save.connect(remember_old_geometry, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(invalidate_saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(invalidate_deleted, sender=model, weak=False, dispatch_uid=uid)
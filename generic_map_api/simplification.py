@@ -0,0 +1,172 @@
+"""Zoom-dependent simplification (level of detail) of item geometries
+
+Geometries of a batch of items are simplified at once with vectorized shapely
+simplify. Tolerance is snapped to a power of two, so simplified geometries can be
+cached by (item id, tolerance bucket, hash of source geometry) and reused by
+requests of similar zoom.
+"""
+
+from __future__ import annotations
+
+import math
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import shapely
+from django.contrib.gis.db.models.functions import GeoFunc
+from django.db.models import QuerySet, Value
+from shapely.geometry.base import BaseGeometry
+
+from .constants import WGS84
+from .geometry_serializers import to_shapely
+from .local_cache import LocalCache
+from .values import ClusteringOutput
+
+if TYPE_CHECKING:
+    from .values import BaseViewPort
+    from .views import MapFeaturesBaseView
+
+SIMPLIFICATION_BATCH_SIZE = 500
+
+# shared by serializers, simplified geometries are reused for a few minutes
+SIMPLIFICATION_CACHE = LocalCache(max_bytes=32 * 1024 * 1024, ttl=300)
+
+# name of the QuerySet annotation holding geometry simplified by the database
+SIMPLIFIED_GEOMETRY_ANNOTATION = "simplified_geometry"
+
+# id(item) -> simplified geometry of items being serialized
+simplified_geometries: ContextVar[Optional[Dict[int, BaseGeometry]]] = ContextVar(
+    "simplified_geometries", default=None
+)
+
+
+@contextmanager
+def use_simplified_geometries(geometries: Optional[Dict[int, BaseGeometry]]):
+    token = simplified_geometries.set(geometries)
+    try:
+        yield
+    finally:
+        simplified_geometries.reset(token)
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def tolerance_bucket(tolerance: float) -> int:
+    return math.floor(math.log2(tolerance))
+
+
+def simplify_items(
+    view: MapFeaturesBaseView, items: List, degrees_per_pixel: Optional[float]
+) -> Dict[int, BaseGeometry]:
+    """Returns simplified geometries of items which serializers enable simplification
+
+    Output maps id() of the item to its simplified geometry.
+    """
+    simplified = {}
+    if not degrees_per_pixel:
+        return simplified
+
+    pending = []  # (item, cache, cache key, bucket, geometry)
+    for item in ClusteringOutput.iter_features(items):
+        serializer = view.get_serializer(item)
+        if (
+            not serializer.simplify_geometry
+            or serializer.lookup_serialized_geometry(item) is not None
+            or getattr(item, SIMPLIFIED_GEOMETRY_ANNOTATION, None) is not None
+        ):
+            continue
+
+        geometry = serializer.get_source_geometry(item)
+        if (
+            geometry is None
+            or serializer.get_geometry_feature_type(geometry) == "point"
+        ):
+            continue
+        geometry = to_shapely(geometry)
+
+        bucket = tolerance_bucket(
+            serializer.simplification_tolerance * degrees_per_pixel
+        )
+        cache = serializer.simplification_cache
+        item_id = serializer.get_id(item)
+        key = None
+        if cache is not None and item_id is not None:
+            serializer_class = serializer.__class__
+            key = (serializer_class.__module__, serializer_class.__qualname__)
+            # hash of the source geometry keeps edited geometries from being
+            # served simplified from their previous shape
+            key += (item_id, bucket, hash(geometry))
+            cached = cache.get(key)
+            if cached is not None:
+                simplified[id(item)] = cached
+                continue
+
+        pending.append((item, cache, key, bucket, geometry))
+
+    if not pending:
+        return simplified
+
+    geometries = shapely.simplify(
+        np.array([entry[4] for entry in pending], dtype=object),
+        np.array([2.0 ** entry[3] for entry in pending]),
+        preserve_topology=True,
+    )
+    for (item, cache, key, _, _), geometry in zip(pending, geometries):
+        simplified[id(item)] = geometry
+        if key is not None:
+            cache.set(key, geometry)
+
+    return simplified
+
+
+class SimplifyPreserveTopology(GeoFunc):
+    function = "ST_SimplifyPreserveTopology"
+
+
+class Simplify(GeoFunc):
+    function = "ST_Simplify"
+
+
+def simplify_queryset(  # pylint: disable=too-many-arguments
+    queryset: QuerySet,
+    geometry_field: str,
+    viewport: BaseViewPort,
+    tolerance: float = 1.0,
+    preserve_topology: bool = True,
+    defer_geometry: bool = False,
+) -> QuerySet:
+    """Annotates QuerySet with geometry simplified by the database for viewport
+
+    Tolerance is given in pixels of the viewport. Serializers output the annotation
+    instead of the geometry field, which is still loaded for bounding boxes,
+    binary formats, vector tiles and clustering. Deferring the geometry field
+    makes every such use of it a query of its own.
+    """
+    field = queryset.model._meta.get_field(  # pylint: disable=protected-access
+        geometry_field
+    )
+    if field.srid == WGS84:
+        units_per_pixel = viewport.get_degrees_per_pixel()
+    else:
+        units_per_pixel = viewport.get_meters_per_pixel()
+    if not units_per_pixel:
+        return queryset
+
+    function = SimplifyPreserveTopology if preserve_topology else Simplify
+    queryset = queryset.annotate(
+        **{
+            SIMPLIFIED_GEOMETRY_ANNOTATION: function(
+                geometry_field, Value(tolerance * units_per_pixel)
+            )
+        }
+    )
+    if defer_geometry:
+        queryset = queryset.defer(geometry_field)
+    return queryset
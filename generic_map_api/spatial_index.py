@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import math
+from typing import Iterable, Iterator, Tuple, Union
+
+from shapely.geometry.base import BaseGeometry
+from skytek_utils.spatial import tiles
+
+from .values import BaseViewPort, Tile, ViewPort
+
+MAX_INDEX_ZOOM = 22
+
+# cell of entries which cannot be located (e.g. items of an empty viewport),
+# those are invalidated by every spatial invalidation
+ALL_CELL = "ALL"
+
+Cell = Union[Tuple[int, int, int], str]
+
+
+def _clamp(value: int, min_value: int, max_value: int) -> int:
+    return max(min_value, min(value, max_value))
+
+
+def _tile_ranges(geometry: BaseGeometry, zoom: int) -> Iterator[Tuple[int, ...]]:
+    max_coord = 2**zoom - 1
+    parts = getattr(geometry, "geoms", (geometry,))
+    for part in parts:
+        if part.is_empty:
+            continue
+        min_lon, min_lat, max_lon, max_lat = part.bounds
+        min_x, min_y, _ = tiles.deg2tile(min_lon, max_lat, zoom)
+        max_x, max_y, _ = tiles.deg2tile(max_lon, min_lat, zoom)
+        yield (
+            _clamp(min_x, 0, max_coord),
+            _clamp(min_y, 0, max_coord),
+            _clamp(max_x, 0, max_coord),
+            _clamp(max_y, 0, max_coord),
+        )
+
+
+def count_covering_tiles(geometry: BaseGeometry, zoom: int) -> int:
+    return sum(
+        (max_x - min_x + 1) * (max_y - min_y + 1)
+        for min_x, min_y, max_x, max_y in _tile_ranges(geometry, zoom)
+    )
+
+
+def covering_tiles(geometry: BaseGeometry, zoom: int) -> Iterator[Tuple[int, int, int]]:
+    """Yields (z, x, y) of all tiles intersecting bounds of the geometry parts"""
+    for min_x, min_y, max_x, max_y in _tile_ranges(geometry, zoom):
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                yield zoom, x, y
+
+
+def get_index_zoom(viewport: ViewPort) -> int:
+    """Zoom at which the viewport spans about one tile"""
+    width, _ = viewport.get_dimensions()
+    if not width:
+        return MAX_INDEX_ZOOM
+    return _clamp(int(math.floor(math.log2(360 / width))), 0, MAX_INDEX_ZOOM)
+
+
+def viewport_cells(viewport: BaseViewPort) -> Tuple[Cell, ...]:
+    if isinstance(viewport, Tile):
+        return ((int(viewport.z), int(viewport.x), int(viewport.y)),)
+
+    if isinstance(viewport, ViewPort):
+        zoom = get_index_zoom(viewport)
+        return tuple(covering_tiles(viewport.to_polygon(), zoom))
+
+    return (ALL_CELL,)
+
+
+def tile_cells(z, x, y) -> Tuple[Cell, ...]:
+    return ((int(z), int(x), int(y)),)
+
+
+def cell_zooms(cells: Iterable[Cell]) -> set:
+    return {cell[0] for cell in cells if cell != ALL_CELL}
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
+import math
 import re
 from dataclasses import dataclass
-from typing import Any, Union
+from typing import Any, Iterable, Optional, Union
 
 import geohash2
 from shapely import set_srid
 from shapely.geometry import MultiPolygon, Point, Polygon
 from skytek_utils.spatial import tiles
 
-from .constants import WGS84
+from .constants import METERS_PER_DEGREE, METERS_PER_PIXEL_AT_ZOOM_0, WGS84
 from .date_line_normalization import normalized_viewport
 
 
@@ -26,6 +27,37 @@ class BaseViewPort:
     def get_dimensions(self):
         raise NotImplementedError()
 
+    def get_meters_per_pixel(self) -> Optional[float]:
+        """Returns meters per pixel given or derived from zoom, None if unknown"""
+        try:
+            if self.meters_per_pixel is not None:
+                meters_per_pixel = float(self.meters_per_pixel)
+            elif self.zoom is not None:
+                meters_per_pixel = METERS_PER_PIXEL_AT_ZOOM_0 / 2 ** float(self.zoom)
+            else:
+                return None
+        except (ValueError, OverflowError, ZeroDivisionError):
+            return None
+
+        if not math.isfinite(meters_per_pixel) or meters_per_pixel <= 0:
+            return None
+        return meters_per_pixel
+
+    def get_degrees_per_pixel(self) -> Optional[float]:
+        meters_per_pixel = self.get_meters_per_pixel()
+        if meters_per_pixel is None:
+            return None
+        return meters_per_pixel / METERS_PER_DEGREE
+
+    def get_coordinate_precision(self) -> Optional[int]:
+        """Returns number of decimal places of a degree that are visible on the map"""
+        degrees_per_pixel = self.get_degrees_per_pixel()
+        # full precision when the scale is unknown or out of range
+        if degrees_per_pixel is None or not math.isfinite(degrees_per_pixel):
+            return None
+        # one more digit keeps rounding error well below a pixel
+        return max(0, math.ceil(-math.log10(degrees_per_pixel))) + 1
+
     def to_dict(self) -> dict:
         return {
             "size": self.size,
@@ -46,7 +78,10 @@ class EmptyViewport(BaseViewPort):
         return None
 
     def to_dict(self) -> dict:
-        return {"type": "empty"}
+        scale = {"zoom": self.zoom, "mpp": self.meters_per_pixel}
+        return {"type": "empty"} | {
+            name: value for name, value in scale.items() if value is not None
+        }
 
 
 class ViewPort(BaseViewPort):
@@ -179,6 +214,28 @@ class ClusteringOutput:
     is_cluster: bool
     item: Any
 
+    @staticmethod
+    def iter_features(items: Iterable):
+        """Yields feature items of plain items mixed with clustering outputs"""
+        for item in items:
+            if not isinstance(item, ClusteringOutput):
+                yield item
+            elif not item.is_cluster:
+                yield item.item
+
+
+@dataclass
+class SerializedGeometry:
+    """Geometry serialized in advance, put into serialized items as it is
+
+    `geom` is date line normalized frontend style geometry and `bbox` its
+    boundary box, both can be RawJSON fragments.
+    """
+
+    geometry_type: str
+    geom: Any
+    bbox: Any
+
 
 @dataclass
 class BoundingBox:
@@ -0,0 +1,406 @@
+"""Mapbox Vector Tile (MVT 2.1) encoding
+
+Encoder is self-contained, protobuf messages of the format are simple enough to
+be written by hand.
+"""
+
+from __future__ import annotations
+
+import math
+import struct
+from typing import TYPE_CHECKING, Iterable, List, Tuple
+
+import numpy as np
+import shapely
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import IntegerField, Model, QuerySet
+from shapely.geometry import LinearRing, LineString, Point, Polygon
+from shapely.geometry.base import BaseGeometry
+from shapely.geometry.polygon import orient
+
+from .geometry_serializers import to_shapely
+from .values import Tile
+
+if TYPE_CHECKING:
+    from .views import MapFeaturesBaseView
+
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+
+DEFAULT_EXTENT = 4096
+DEFAULT_BUFFER = 64
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+GEOM_POLYGON = 3
+
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+CMD_CLOSE_PATH = 7
+
+WIRE_VARINT = 0
+WIRE_64BIT = 1
+WIRE_LENGTH_DELIMITED = 2
+
+
+def _varint(value: int) -> bytes:
+    value &= 0xFFFFFFFFFFFFFFFF  # negative ints are encoded as 64-bit two's complement
+    output = bytearray()
+    while value > 0x7F:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+    return bytes(output)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field_key(field_number: int, wire_type: int) -> bytes:
+    return _varint((field_number << 3) | wire_type)
+
+
+def _length_delimited(field_number: int, data: bytes) -> bytes:
+    return _field_key(field_number, WIRE_LENGTH_DELIMITED) + _varint(len(data)) + data
+
+
+def _uint_field(field_number: int, value: int) -> bytes:
+    return _field_key(field_number, WIRE_VARINT) + _varint(value)
+
+
+def _packed_uints(field_number: int, values: Iterable[int]) -> bytes:
+    return _length_delimited(field_number, b"".join(_varint(v) for v in values))
+
+
+def _encode_value(value) -> bytes:
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        if value < 0:
+            return _uint_field(6, _zigzag(value))
+        return _uint_field(5, value)
+    if isinstance(value, float):
+        return _field_key(3, WIRE_64BIT) + struct.pack("<d", value)
+    return _length_delimited(1, str(value).encode("utf-8"))
+
+
+def lon_lat_to_tile_coords(
+    geometry: BaseGeometry, tile: Tile, extent: int = DEFAULT_EXTENT
+) -> BaseGeometry:
+    """Projects geometry to Web Mercator and scales it to the tile extent"""
+    scale = 2**tile.z
+
+    def project(coords):
+        lon = coords[:, 0]
+        lat = np.clip(coords[:, 1], -85.0511287798, 85.0511287798)
+        x = ((lon + 180.0) / 360.0 * scale - tile.x) * extent
+        y = (
+            (1.0 - np.arcsinh(np.tan(np.radians(lat))) / math.pi) / 2.0 * scale - tile.y
+        ) * extent
+        return np.column_stack((x, y))
+
+    return shapely.transform(geometry, project)
+
+
+class GeometryEncoder:
+    """Encodes geometries in tile coordinates into MVT geometry commands"""
+
+    def __init__(self) -> None:
+        self.commands: List[int] = []
+        self.cursor = (0, 0)
+
+    @staticmethod
+    def _command(command_id: int, count: int) -> int:
+        return (command_id & 0x7) | (count << 3)
+
+    @staticmethod
+    def _quantize(coords) -> List[Tuple[int, int]]:
+        points = []
+        for x, y in np.rint(np.asarray(coords)[:, :2]).astype(np.int64).tolist():
+            if not points or points[-1] != (x, y):
+                points.append((x, y))
+        return points
+
+    def _append_points(self, points):
+        for x, y in points:
+            self.commands.append(_zigzag(x - self.cursor[0]))
+            self.commands.append(_zigzag(y - self.cursor[1]))
+            self.cursor = (x, y)
+
+    def add_points(self, coords):
+        points = self._quantize(coords)
+        if not points:
+            return
+        self.commands.append(self._command(CMD_MOVE_TO, len(points)))
+        self._append_points(points)
+
+    def add_line(self, coords):
+        points = self._quantize(coords)
+        if len(points) < 2:
+            return
+        self.commands.append(self._command(CMD_MOVE_TO, 1))
+        self._append_points(points[:1])
+        self.commands.append(self._command(CMD_LINE_TO, len(points) - 1))
+        self._append_points(points[1:])
+
+    def add_ring(self, ring: LinearRing) -> bool:
+        points = self._quantize(ring.coords)
+        if len(points) > 1 and points[0] == points[-1]:
+            points = points[:-1]
+        if len(points) < 3:
+            return False
+        self.commands.append(self._command(CMD_MOVE_TO, 1))
+        self._append_points(points[:1])
+        self.commands.append(self._command(CMD_LINE_TO, len(points) - 1))
+        self._append_points(points[1:])
+        self.commands.append(self._command(CMD_CLOSE_PATH, 1))
+        return True
+
+    def add_polygon(self, polygon: Polygon):
+        # y axis of tile points down, so positive signed area means clockwise
+        # exterior ring as required by the specification
+        polygon = orient(polygon, sign=1.0)
+        if not self.add_ring(polygon.exterior):
+            return
+        for interior in polygon.interiors:
+            self.add_ring(interior)
+
+
+def _parts(geometry: BaseGeometry, part_type) -> List[BaseGeometry]:
+    if isinstance(geometry, part_type):
+        return [geometry]
+    return [
+        part
+        for subgeometry in getattr(geometry, "geoms", ())
+        for part in _parts(subgeometry, part_type)
+    ]
+
+
+def encode_geometry(
+    geometry: BaseGeometry, dimension: int = None
+) -> Tuple[int, List[int]]:
+    """Returns MVT geometry type and commands of geometry in tile coordinates
+
+    Clipping can turn a geometry into a collection of mixed parts, only parts of
+    given dimension (by default the dimension of the geometry) are encoded.
+    """
+    if dimension is None:
+        dimension = shapely.get_dimensions(geometry)
+
+    encoder = GeometryEncoder()
+
+    if dimension == 0:
+        coords = [point.coords[0] for point in _parts(geometry, Point)]
+        if coords:
+            encoder.add_points(coords)
+        return GEOM_POINT, encoder.commands
+
+    if dimension == 1:
+        for line in _parts(geometry, LineString):
+            encoder.add_line(line.coords)
+        return GEOM_LINESTRING, encoder.commands
+
+    if dimension == 2:
+        for polygon in _parts(geometry, Polygon):
+            encoder.add_polygon(polygon)
+        return GEOM_POLYGON, encoder.commands
+
+    raise ValueError(f"Cannot encode {geometry.geom_type} in vector tile")
+
+
+class LayerBuilder:
+    def __init__(self, name: str, extent: int = DEFAULT_EXTENT) -> None:
+        self.name = name
+        self.extent = extent
+        self.features: List[bytes] = []
+        self.keys: dict = {}
+        self.values: dict = {}
+
+    def _key_index(self, key: str) -> int:
+        return self.keys.setdefault(key, len(self.keys))
+
+    def _value_index(self, value) -> int:
+        # type is part of the lookup key, so True and 1 are different values
+        return self.values.setdefault((type(value), value), len(self.values))
+
+    def add_feature(
+        self, geometry: BaseGeometry, properties: dict, feature_id=None, dimension=None
+    ):  # pylint: disable=too-many-arguments
+        geometry_type, commands = encode_geometry(geometry, dimension)
+        if not commands:
+            return
+
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(self._key_index(str(key)))
+            tags.append(self._value_index(value))
+
+        feature = b""
+        if isinstance(feature_id, int) and not isinstance(feature_id, bool):
+            if feature_id >= 0:
+                feature += _uint_field(1, feature_id)
+        if tags:
+            feature += _packed_uints(2, tags)
+        feature += _uint_field(3, geometry_type)
+        feature += _packed_uints(4, commands)
+        self.features.append(feature)
+
+    def encode(self) -> bytes:
+        layer = _uint_field(15, 2)
+        layer += _length_delimited(1, self.name.encode("utf-8"))
+        layer += b"".join(_length_delimited(2, feature) for feature in self.features)
+        layer += b"".join(
+            _length_delimited(3, key.encode("utf-8")) for key in self.keys
+        )
+        layer += b"".join(
+            _length_delimited(4, _encode_value(value)) for _, value in self.values
+        )
+        layer += _uint_field(5, self.extent)
+        return layer
+
+
+def encode_tile(layers: Iterable[LayerBuilder]) -> bytes:
+    return b"".join(
+        _length_delimited(3, layer.encode()) for layer in layers if layer.features
+    )
+
+
+class BaseVectorTileEncoding:
+    def encode_tile(self, view: MapFeaturesBaseView, tile: Tile, items) -> bytes:
+        raise NotImplementedError()
+
+
+class SerializerVectorTileEncoding(BaseVectorTileEncoding):
+    """Encodes geometries returned by view's serializers in Python"""
+
+    def encode_tile(self, view: MapFeaturesBaseView, tile: Tile, items) -> bytes:
+        extent = view.vector_tile_extent
+        buffer = view.vector_tile_buffer
+        layer = LayerBuilder(view.get_vector_tile_layer_name(), extent)
+
+        if isinstance(items, QuerySet):
+            items = items.iterator()
+
+        for item in items:
+            serializer = view.get_serializer(item)
+            geometry = serializer.get_geometry(item)
+            if geometry is None:
+                continue
+
+            geometry = lon_lat_to_tile_coords(to_shapely(geometry), tile, extent)
+            dimension = shapely.get_dimensions(geometry)
+            geometry = shapely.clip_by_rect(
+                geometry, -buffer, -buffer, extent + buffer, extent + buffer
+            )
+            if geometry.is_empty:
+                continue
+
+            layer.add_feature(
+                geometry,
+                self.get_properties(view, serializer, item),
+                serializer.get_id(item),
+                dimension,
+            )
+
+        return encode_tile([layer])
+
+    @staticmethod
+    def get_properties(view: MapFeaturesBaseView, serializer, item) -> dict:
+        """Returns the same properties as DatabaseVectorTileEncoding emits
+
+        Those are fields of vector_tile_db_properties of model instances and
+        vector tile properties of the serializer.
+        """
+        properties = {}
+        if isinstance(item, Model):
+            meta = item._meta  # pylint: disable=protected-access
+            for field in view.vector_tile_db_properties:
+                properties[field] = getattr(item, meta.get_field(field).attname)
+        properties.update(serializer.get_vector_tile_properties(item))
+        return properties
+
+
+class DatabaseVectorTileEncoding(BaseVectorTileEncoding):
+    """Encodes tile in PostGIS with ST_AsMVTGeom / ST_AsMVT in one query"""
+
+    def get_tile_sql_with_params(
+        self, view: MapFeaturesBaseView, tile: Tile, items: QuerySet
+    ) -> Tuple[str, Tuple]:
+        meta = items.model._meta  # pylint: disable=protected-access
+        geometry_column = meta.get_field(view.vector_tile_db_geometry_field).column
+        extent = view.vector_tile_extent
+        buffer = view.vector_tile_buffer
+
+        columns = [
+            f'orm_sq."{meta.get_field(field).column}" AS "{field}"'
+            for field in view.vector_tile_db_properties
+        ]
+        columns_params = ()
+        if view.serializer and view.serializer.feature_types:
+            columns.append('%s AS "type"')
+            columns_params = (",".join(view.serializer.feature_types),)
+
+        feature_id_column = None
+        if isinstance(meta.pk, IntegerField):
+            feature_id_column = "mvt_id"
+            columns.append(f'orm_sq."{meta.pk.column}" AS "{feature_id_column}"')
+
+        sql, sql_params = items.query.sql_with_params()
+        tile_sql = f"""
+            WITH orm_sq AS ({sql}),
+            bounds AS (SELECT ST_TileEnvelope(%s, %s, %s) AS envelope)
+            SELECT ST_AsMVT(mvt_sq.*, %s, %s, 'geom', %s)
+            FROM (
+                SELECT
+                    ST_AsMVTGeom(
+                        ST_Transform(orm_sq."{geometry_column}"::geometry, 3857),
+                        bounds.envelope, %s, %s, true
+                    ) AS geom
+                    {"".join(", " + column for column in columns)}
+                FROM orm_sq, bounds
+                WHERE ST_Intersects(
+                    ST_Transform(orm_sq."{geometry_column}"::geometry, 3857),
+                    ST_TileEnvelope(%s, %s, %s, margin => %s)
+                )
+            ) AS mvt_sq
+            WHERE geom IS NOT NULL;
+        """
+        tile_sql_params = (
+            sql_params
+            + (tile.z, tile.x, tile.y)
+            + (view.get_vector_tile_layer_name(), extent, feature_id_column)
+            + (extent, buffer)
+            + columns_params
+            + (tile.z, tile.x, tile.y, buffer / extent)
+        )
+        return tile_sql, tile_sql_params
+
+    def encode_tile(self, view: MapFeaturesBaseView, tile: Tile, items) -> bytes:
+        if not isinstance(items, QuerySet):
+            raise ValueError("Database vector tile encoding requires QuerySet on input")
+
+        sql, sql_params = self.get_tile_sql_with_params(view, tile, items)
+        connection = connections[items.db or DEFAULT_DB_ALIAS]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, sql_params)
+            row = cursor.fetchone()
+
+        if not row or not row[0]:
+            return b""
+        return bytes(row[0])
+
+
+class AutomaticVectorTileEncoding(BaseVectorTileEncoding):
+    def encode_tile(self, view: MapFeaturesBaseView, tile: Tile, items) -> bytes:
+        if (
+            isinstance(items, QuerySet)
+            and view.vector_tile_db_geometry_field
+            and connections[items.db or DEFAULT_DB_ALIAS].vendor == "postgresql"
+        ):
+            encoding = DatabaseVectorTileEncoding()
+        else:
+            encoding = SerializerVectorTileEncoding()
+
+        return encoding.encode_tile(view, tile, items)
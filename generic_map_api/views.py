@@ -2,22 +2,75 @@ from __future__ import annotations
 
 from abc import ABC, ABCMeta, abstractmethod
 from base64 import b64encode
+from functools import cached_property, partial
 from os import path
 from typing import Callable, Optional, Tuple, Type
 
-from django.core.exceptions import BadRequest
+from django.core.exceptions import BadRequest, ImproperlyConfigured
 from django.db.models import QuerySet
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.cache import patch_vary_headers
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import ViewSet
 
 from .bounding_box import AutomaticBoundingBoxing
-from .caching import DEFAULT_TTL, Cache
+from .caching import (
+    DEFAULT_COALESCING_LOCK_TTL,
+    DEFAULT_COALESCING_POLL_INTERVAL,
+    DEFAULT_COALESCING_TIMEOUT,
+    DEFAULT_TTL,
+    Cache,
+)
 from .clustering import BaseClustering, BasicClustering, ClusteringOutput
+from .columnar import (
+    COLUMNAR,
+    COLUMNAR_CONTENT_TYPE,
+    ColumnarItemsBuilder,
+    ColumnarJSONRenderer,
+    wants_columnar,
+)
 from .constants import ViewportHandling
-from .serializers import BaseFeatureSerializer, BoundingBoxSerializer
+from .geometry_serializers import rounded_coordinates, use_prepared_geometries
+from .local_cache import LocalCache
+from .pagination import (
+    CURSOR_QUERY_PARAM,
+    GEOHASH_ORDERING_ANNOTATION,
+    order_by_geohash,
+    paginate_queryset,
+)
+from .renderers import (
+    IDENTITY,
+    BaseItemsRenderer,
+    FragmentsJSONRenderer,
+    available_encodings,
+    binary_renderer_classes,
+    make_encoded_response,
+    negotiate_body_encoding,
+    render_json,
+    stream_json_items,
+)
+from .serializers import (
+    BaseFeatureSerializer,
+    BoundingBoxSerializer,
+    use_batch_geometries,
+)
+from .simplification import (
+    SIMPLIFICATION_BATCH_SIZE,
+    batched,
+    simplify_items,
+    simplify_queryset,
+    use_simplified_geometries,
+)
 from .utils import to_bool
 from .values import (
     BaseViewPort,
@@ -27,6 +80,12 @@ from .values import (
     TileRedirect,
     ViewPort,
 )
+from .vector_tiles import (
+    DEFAULT_BUFFER,
+    DEFAULT_EXTENT,
+    MVT_CONTENT_TYPE,
+    AutomaticVectorTileEncoding,
+)
 
 
 class MapApiBaseMeta(ABCMeta):
@@ -52,6 +111,12 @@ class MapApiBaseView(ABC, ViewSet, metaclass=MapApiBaseMeta):
 
     cache_name = None
     cache_view_name = None
+    cache_local: Optional[LocalCache] = None
+    # allows Cache.invalidate(), costs one extra cache read per request
+    cache_invalidation: bool = False
+    # allows Cache.invalidate_bbox(), costs extra cache writes on every ITEMS/TILE miss
+    # and, like cache_invalidation, one extra cache read per request
+    cache_spatial_index: bool = False
     cache_ttl = DEFAULT_TTL
 
     cache_ttl_meta = None
@@ -61,6 +126,20 @@ class MapApiBaseView(ABC, ViewSet, metaclass=MapApiBaseMeta):
     cache_ttl_tile = None
     cache_ttl_browser = None
 
+    # stale entries are served for this long while being recomputed in background
+    cache_stale_ttl = None
+    cache_stale_ttl_meta = None
+    cache_stale_ttl_item = None
+    cache_stale_ttl_items = None
+    cache_stale_ttl_bounds = None
+    cache_stale_ttl_tile = None
+
+    # single-flight recomputation of expired ITEMS and TILE entries
+    cache_coalescing: bool = False
+    cache_coalescing_timeout: float = DEFAULT_COALESCING_TIMEOUT
+    cache_coalescing_lock_ttl: int = DEFAULT_COALESCING_LOCK_TTL
+    cache_coalescing_poll_interval: float = DEFAULT_COALESCING_POLL_INTERVAL
+
     def get_caching_key_extra(
         self, fn_name, request, **context
     ):  # pylint: disable=unused-argument
@@ -74,14 +153,22 @@ class MapApiBaseView(ABC, ViewSet, metaclass=MapApiBaseMeta):
     def meta(self, request):  # pylint: disable=unused-argument
         cache = Cache(self, request)
         meta = cache.get_serialized_meta()
-
-        if "urls" not in meta:
-            meta["urls"] = {}
-        meta["urls"] = {
-            **meta["urls"],
-            **self.get_urls(),
+        urls = self.get_urls()
+
+        cache.vary_etag(urls)
+        not_modified_response = cache.get_not_modified_response()
+        if not_modified_response:
+            return not_modified_response
+
+        # cached meta may be shared with other requests, don't modify it in place
+        meta = {
+            **meta,
+            "urls": {
+                **meta.get("urls", {}),
+                **urls,
+            },
         }
-        return Response(meta)
+        return cache.add_etag_header(Response(meta))
 
     def get_serialized_meta(self):
         return self.get_meta()
@@ -99,7 +186,12 @@ class MapApiBaseView(ABC, ViewSet, metaclass=MapApiBaseMeta):
         params = self._parse_params(request)
         cache = Cache(self, request)
         serialized_bounds = cache.get_serialized_bounds(params)
-        return Response(serialized_bounds)
+
+        not_modified_response = cache.get_not_modified_response()
+        if not_modified_response:
+            return not_modified_response
+
+        return cache.add_etag_header(Response(serialized_bounds))
 
     def get_serialized_bounds(self, params):
         bounds = self.get_bounds(params)  # pylint: disable=not-callable
@@ -138,6 +230,12 @@ class MapApiBaseView(ABC, ViewSet, metaclass=MapApiBaseMeta):
     def get_query_params(self):
         return self.query_params
 
+    def make_pattern_url(self, action_name, kwargs):
+        url = self.reverse_action(action_name, kwargs=kwargs)
+        url = url.replace("%7B", "{")
+        url = url.replace("%7D", "}")
+        return url
+
     def render_query_params_meta(self):
         return {
             param.name: param.render_meta(self, self.request)
@@ -164,7 +262,7 @@ class MapApiBaseView(ABC, ViewSet, metaclass=MapApiBaseMeta):
             yield param.name, param.parse_request(request)
 
 
-class MapFeaturesBaseView(MapApiBaseView):
+class MapFeaturesBaseView(MapApiBaseView):  # pylint: disable=too-many-public-methods
     icon = path.join(
         path.dirname(__file__), "resources", "icons", "default-features.png"
     )
@@ -181,6 +279,80 @@ class MapFeaturesBaseView(MapApiBaseView):
     preferred_viewport_handling: str = ViewportHandling.SPLIT
     preferred_viewport_chunks: int = 10
 
+    # round coordinates to what is visible at the zoom of the viewport
+    reduce_coordinate_precision: bool = False
+
+    # keyset pagination of QuerySet items, list returns pages with "next" cursor
+    # (binary formats in Link header), get_items has to return a QuerySet
+    pagination_page_size: Optional[int] = None
+    # field name, "-" prefixed for descending order, may span relations
+    pagination_ordering: str = "pk"
+    # order pages by geohash of this geometry field instead of pagination_ordering
+    pagination_geohash_field = None
+
+    # with a geometry field set, QuerySet geometries are simplified by the database
+    simplification_db_geometry_field = None
+    simplification_db_tolerance: float = 1.0  # pixels
+    simplification_db_preserve_topology: bool = True
+
+    @cached_property
+    def renderer_classes(self) -> tuple:
+        # settings are read for every request (view instance), not at import time,
+        # plain JSONRenderer is replaced by one emitting RawJSON fragments verbatim
+        return (
+            tuple(
+                FragmentsJSONRenderer if renderer is JSONRenderer else renderer
+                for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+            )
+            + (ColumnarJSONRenderer,)
+            + binary_renderer_classes()
+        )
+
+    binary_renderer_actions = ("list", "retrieve")
+
+    # cache final (optionally compressed) response body of the list action
+    cache_rendered_items: bool = False
+    cache_rendered_items_encodings: Optional[Tuple[str]] = None
+
+    # stream list response item by item instead of rendering it at once
+    stream_items: bool = False
+
+    # serve the items as Mapbox Vector Tiles at {z}/{x}/{y}.mvt
+    vector_tiles: bool = False
+    vector_tile_layer_name: Optional[str] = None
+    vector_tile_extent: int = DEFAULT_EXTENT
+    vector_tile_buffer: int = DEFAULT_BUFFER
+    vector_tile_max_zoom: int = 30
+    # with a geometry field set, QuerySet tiles are encoded by PostGIS
+    vector_tile_db_geometry_field = None
+    # model fields added to feature properties, by PostGIS and Python encoding alike
+    vector_tile_db_properties: Tuple[str, ...] = ()
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        action_name = getattr(self, "action", None)
+        if action_name != "list":
+            renderers = [
+                renderer
+                for renderer in renderers
+                if not isinstance(renderer, ColumnarJSONRenderer)
+            ]
+        if action_name in self.binary_renderer_actions:
+            return renderers
+        return [
+            renderer
+            for renderer in renderers
+            if not isinstance(renderer, BaseItemsRenderer)
+        ]
+
+    def handle_exception(self, exc):
+        # errors cannot be rendered by renderers of feature items only
+        renderer = getattr(self.request, "accepted_renderer", None)
+        if getattr(renderer, "renders_items_only", False):
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
     def get_bounds(self, params):
         viewport = EmptyViewport()
         items = self.get_items(viewport, params)
@@ -194,6 +366,11 @@ class MapFeaturesBaseView(MapApiBaseView):
                 "detail": self.reverse_action("detail", kwargs={"pk": "ID"}),
             }
         )
+        if self.vector_tiles:
+            urls["vector_tile"] = self.make_pattern_url(
+                "vector-tile",
+                kwargs={param: "{" + param + "}" for param in ("x", "y", "z")},
+            )
         return urls
 
     def get_meta(self):
@@ -210,9 +387,18 @@ class MapFeaturesBaseView(MapApiBaseView):
             "preferred_viewport_chunks": self.preferred_viewport_chunks,
             "query_params": self.render_query_params_meta(),
             "requirements": self.render_requirements(),
+            "geometry_encoding": self.render_geometry_encoding(),
             "browser_cache_salt": Cache(self, self.request).get_browser_caching_salt(),
         }
 
+    def render_geometry_encoding(self):
+        if not self.serializer or not self.serializer.geometry_encoding:
+            return None
+        return {
+            "type": self.serializer.geometry_encoding,
+            "precision": self.serializer.geometry_encoding_precision,
+        }
+
     def list(self, request):
         viewport = EmptyViewport()
 
@@ -238,29 +424,339 @@ class MapFeaturesBaseView(MapApiBaseView):
         params = self._parse_params(request)
 
         cache = Cache(self, request)
+
+        http_response = self._make_list_response(request, cache, viewport, params)
+        # columnar format can be negotiated by Accept header
+        patch_vary_headers(http_response, ("Accept",))
+        return http_response
+
+    def _make_list_response(
+        self, request, cache: Cache, viewport: BaseViewPort, params: dict
+    ):  # pylint: disable=too-many-arguments, too-many-return-statements
+        if self.paginates(viewport):
+            return self._make_page_response(request, cache, viewport, params)
+
+        renderer = getattr(request, "accepted_renderer", None)
+        if isinstance(renderer, BaseItemsRenderer):
+            body = cache.get_binary_items(viewport, params, renderer)
+            cache.vary_etag(renderer.format)
+            http_response = cache.get_not_modified_response() or HttpResponse(
+                body, content_type=renderer.media_type
+            )
+            return cache.add_browser_cache_headers(http_response)
+
+        if wants_columnar(request):
+            columnar_items = cache.get_columnar_items(viewport, params)
+            cache.vary_etag(COLUMNAR)
+            http_response = cache.get_not_modified_response() or HttpResponse(
+                render_json(columnar_items), content_type=COLUMNAR_CONTENT_TYPE
+            )
+            return cache.add_browser_cache_headers(http_response)
+
+        if self.cache_rendered_items:
+            bodies = cache.get_rendered_items(
+                viewport, params, self.get_rendered_items_encodings()
+            )
+            encoding = negotiate_body_encoding(
+                bodies, request.META.get("HTTP_ACCEPT_ENCODING")
+            )
+            if encoding != IDENTITY:
+                # strong ETag has to differ between encodings of the body
+                cache.vary_etag(encoding)
+
+            http_response = cache.get_not_modified_response() or make_encoded_response(
+                bodies, encoding
+            )
+            return cache.add_browser_cache_headers(http_response)
+
+        if self.stream_items:
+            serialized_items = cache.iter_serialized_items(viewport, params)
+            http_response = cache.get_not_modified_response() or StreamingHttpResponse(
+                stream_json_items(serialized_items), content_type="application/json"
+            )
+            return cache.add_browser_cache_headers(http_response)
+
         serialized_items = cache.get_serialized_items(viewport, params)
 
+        not_modified_response = cache.get_not_modified_response()
+        if not_modified_response:
+            return cache.add_browser_cache_headers(not_modified_response)
+
         response = {
             "items": list(serialized_items),
         }
         http_response = Response(response)
         return cache.add_browser_cache_headers(http_response)
 
-    def get_serialized_items(self, viewport: BaseViewPort, params: dict):
+    def _make_page_response(
+        self, request, cache: Cache, viewport: BaseViewPort, params: dict
+    ):  # pylint: disable=too-many-arguments
+        cursor = request.GET.get(CURSOR_QUERY_PARAM)
+
+        renderer = getattr(request, "accepted_renderer", None)
+        if isinstance(renderer, BaseItemsRenderer):
+            body, next_cursor = cache.get_binary_page(
+                viewport, params, cursor, renderer
+            )
+            cache.vary_etag(renderer.format)
+            http_response = cache.get_not_modified_response() or HttpResponse(
+                body, content_type=renderer.media_type
+            )
+            # binary bodies cannot carry the cursor of the next page
+            if next_cursor:
+                next_url = replace_query_param(
+                    request.build_absolute_uri(), CURSOR_QUERY_PARAM, next_cursor
+                )
+                http_response["Link"] = f'<{next_url}>; rel="next"'
+            return cache.add_browser_cache_headers(http_response)
+
+        if wants_columnar(request):
+            columnar_page = cache.get_columnar_page(viewport, params, cursor)
+            cache.vary_etag(COLUMNAR)
+            http_response = cache.get_not_modified_response() or HttpResponse(
+                render_json(columnar_page), content_type=COLUMNAR_CONTENT_TYPE
+            )
+            return cache.add_browser_cache_headers(http_response)
+
+        if self.cache_rendered_items:
+            bodies = cache.get_rendered_page(
+                viewport, params, cursor, self.get_rendered_items_encodings()
+            )
+            encoding = negotiate_body_encoding(
+                bodies, request.META.get("HTTP_ACCEPT_ENCODING")
+            )
+            if encoding != IDENTITY:
+                cache.vary_etag(encoding)
+            http_response = cache.get_not_modified_response() or make_encoded_response(
+                bodies, encoding
+            )
+            return cache.add_browser_cache_headers(http_response)
+
+        page = cache.get_serialized_page(viewport, params, cursor)
+        http_response = cache.get_not_modified_response() or Response(page)
+        return cache.add_browser_cache_headers(http_response)
+
+    def paginates(self, viewport: BaseViewPort) -> bool:
+        """Tells whether the list is split into pages, clusters are never paginated"""
+        return bool(self.pagination_page_size) and not (
+            self.clustering and viewport.clustering
+        )
+
+    def get_rendered_items_encodings(self):
+        if self.cache_rendered_items_encodings is not None:
+            return self.cache_rendered_items_encodings
+        return available_encodings()
+
+    def simplify_queryset(self, queryset: QuerySet, viewport: BaseViewPort):
+        """Lets the database simplify geometries of the QuerySet for the viewport"""
+        return simplify_queryset(
+            queryset,
+            self.simplification_db_geometry_field,
+            viewport,
+            tolerance=self.simplification_db_tolerance,
+            preserve_topology=self.simplification_db_preserve_topology,
+        )
+
+    def _get_viewport_items(self, viewport: BaseViewPort, params: dict):
         items = self.get_items(viewport, params)
+        if (
+            isinstance(items, QuerySet)
+            and self.simplification_db_geometry_field
+            and not (self.clustering and viewport.clustering)
+        ):
+            items = self.simplify_queryset(items, viewport)
+        return items
+
+    def get_serialized_items(self, viewport: BaseViewPort, params: dict):
+        items = self._get_viewport_items(viewport, params)
 
         if self.clustering and viewport.clustering:
             clusters = self.get_clustering_algorithm().find_clusters(
                 self, viewport, items
             )
-            serialized_items = (self.render_cluster_item(item) for item in clusters)
+            serialized_items = self._render_items(
+                viewport, self.render_cluster_item, clusters
+            )
         else:
             if isinstance(items, QuerySet):
                 items = items.iterator()
-            serialized_items = (self.render_item(item) for item in items)
+            serialized_items = self._render_items(viewport, self.render_item, items)
 
         return serialized_items
 
+    def _get_page_items(
+        self, viewport: BaseViewPort, params: dict, cursor: Optional[str]
+    ) -> Tuple[list, Optional[str]]:
+        items = self._get_viewport_items(viewport, params)
+        if not isinstance(items, QuerySet):
+            raise ImproperlyConfigured(
+                f"{self.__class__.__name__} sets pagination_page_size, "
+                "so get_items has to return a QuerySet"
+            )
+
+        ordering = self.pagination_ordering
+        if self.pagination_geohash_field:
+            items = order_by_geohash(items, self.pagination_geohash_field)
+            ordering = GEOHASH_ORDERING_ANNOTATION
+        return paginate_queryset(items, ordering, self.pagination_page_size, cursor)
+
+    def get_serialized_page(
+        self, viewport: BaseViewPort, params: dict, cursor: Optional[str]
+    ):
+        items, next_cursor = self._get_page_items(viewport, params, cursor)
+        return {
+            "items": list(self._render_items(viewport, self.render_item, items)),
+            "next": next_cursor,
+        }
+
+    def get_columnar_page(
+        self, viewport: BaseViewPort, params: dict, cursor: Optional[str]
+    ):
+        items, next_cursor = self._get_page_items(viewport, params, cursor)
+        columnar_page = self.build_columnar_items(viewport, items).build()
+        columnar_page["next"] = next_cursor
+        return columnar_page
+
+    def get_binary_page(
+        self,
+        viewport: BaseViewPort,
+        params: dict,
+        cursor: Optional[str],
+        renderer: BaseItemsRenderer,
+    ) -> Tuple[bytes, Optional[str]]:
+        items, next_cursor = self._get_page_items(viewport, params, cursor)
+        return renderer.render_items(self, items, viewport), next_cursor
+
+    def get_coordinate_precision(self, viewport: BaseViewPort) -> Optional[int]:
+        if not self.reduce_coordinate_precision:
+            return None
+        return viewport.get_coordinate_precision()
+
+    def _iter_batches_rendering(self, viewport: BaseViewPort, items, render: Callable):
+        """Renders items in batches, with geometries simplified and rounded for viewport
+
+        Output is a generator of lists of rendered items, the rendering context is
+        active only while a batch is being rendered.
+        """
+        precision = self.get_coordinate_precision(viewport)
+        degrees_per_pixel = None
+        if self.simplifies_geometry():
+            degrees_per_pixel = viewport.get_degrees_per_pixel()
+        for batch in batched(items, SIMPLIFICATION_BATCH_SIZE):
+            with use_batch_geometries(self._fetch_batch_geometries(batch)):
+                simplified = simplify_items(self, batch, degrees_per_pixel)
+                with rounded_coordinates(precision), use_simplified_geometries(
+                    simplified
+                ):
+                    prepared, boundary_boxes = self._prepare_frontend_geometries(batch)
+                    with use_prepared_geometries(prepared, boundary_boxes):
+                        yield [render(item) for item in batch]
+
+    def simplifies_geometry(self) -> bool:
+        """Tells whether geometries are simplified for the viewport
+
+        Views with other serializers than the one set in serializer override it.
+        """
+        return bool(self.serializer and self.serializer.simplify_geometry)
+
+    def _group_by_serializer(self, items: list):
+        serializers = {}
+        for item in ClusteringOutput.iter_features(items):
+            serializer = self.get_serializer(item)
+            serializers.setdefault(id(serializer), (serializer, []))[1].append(item)
+        return serializers.values()
+
+    def _fetch_batch_geometries(self, items: list) -> dict:
+        fetched = {}
+        for serializer, serializer_items in self._group_by_serializer(items):
+            fetched.update(serializer.fetch_batch_geometries(serializer_items))
+        return fetched
+
+    def _prepare_frontend_geometries(self, items: list) -> Tuple[dict, dict]:
+        prepared, boundary_boxes = {}, {}
+        for serializer, serializer_items in self._group_by_serializer(items):
+            (
+                serializer_prepared,
+                serializer_boundary_boxes,
+            ) = serializer.prepare_frontend_geometries(serializer_items)
+            prepared.update(serializer_prepared)
+            boundary_boxes.update(serializer_boundary_boxes)
+        return prepared, boundary_boxes
+
+    def _render_items(self, viewport: BaseViewPort, render: Callable, items):
+        for rendered_batch in self._iter_batches_rendering(viewport, items, render):
+            yield from rendered_batch
+
+    def _get_items_or_clusters(self, viewport: BaseViewPort, params: dict):
+        items = self._get_viewport_items(viewport, params)
+
+        if self.clustering and viewport.clustering:
+            return self.get_clustering_algorithm().find_clusters(self, viewport, items)
+        if isinstance(items, QuerySet):
+            return items.iterator()
+        return items
+
+    def get_columnar_items(self, viewport: BaseViewPort, params: dict):
+        items = self._get_items_or_clusters(viewport, params)
+        return self.build_columnar_items(viewport, items).build()
+
+    def build_columnar_items(self, viewport: BaseViewPort, items):
+        builder = ColumnarItemsBuilder()
+        # builder collects rendered items itself, batches are just consumed
+        for _ in self._iter_batches_rendering(
+            viewport, items, partial(builder.add, self)
+        ):
+            pass
+        return builder
+
+    def get_binary_items(
+        self, viewport: BaseViewPort, params: dict, renderer: BaseItemsRenderer
+    ):
+        items = self._get_items_or_clusters(viewport, params)
+        return renderer.render_items(self, items, viewport)
+
+    @action(
+        detail=False,
+        url_path=r"(?P<z>[^/.]+)/(?P<x>[^/.]+)/(?P<y>[^/.]+)\.mvt",
+        trailing_slash=False,
+    )
+    def vector_tile(self, request, z, x, y):
+        if not self.vector_tiles:
+            raise Http404()
+
+        z, x, y = self._parse_tile_coords(z, x, y)
+        params = self._parse_params(request)
+        cache = Cache(self, request)
+        tile_bytes = cache.get_tile_bytes(z, x, y, params)
+
+        not_modified_response = cache.get_not_modified_response()
+        if not_modified_response:
+            return cache.add_browser_cache_headers(not_modified_response)
+
+        response = HttpResponse(tile_bytes, content_type=MVT_CONTENT_TYPE)
+        return cache.add_browser_cache_headers(response)
+
+    def _parse_tile_coords(self, z, x, y) -> Tuple[int, int, int]:
+        try:
+            z, x, y = int(z), int(x), int(y)
+        except ValueError as exc:
+            raise BadRequest("Invalid tile coordinates") from exc
+        # zoom is bounded first, so 2**z stays cheap
+        if not 0 <= z <= self.vector_tile_max_zoom:
+            raise BadRequest("Tile zoom out of range")
+        if not (0 <= x < 2**z and 0 <= y < 2**z):
+            raise BadRequest("Tile coordinates out of range")
+        return z, x, y
+
+    def get_tile_bytes(self, z: int, x: int, y: int, params: dict):
+        viewport = Tile(x, y, z)
+        viewport.zoom = z
+        items = self.get_items(viewport, params)
+        return AutomaticVectorTileEncoding().encode_tile(self, viewport, items)
+
+    def get_vector_tile_layer_name(self):
+        return self.vector_tile_layer_name or self.api_id or self.__class__.__name__
+
     def render_requirements(self):  # pylint: disable=unused-argument
         requirements = []
         if self.require_viewport_size:
@@ -273,10 +769,31 @@ class MapFeaturesBaseView(MapApiBaseView):
 
     def retrieve(self, request, pk):  # pylint: disable=unused-argument
         cache = Cache(self, request)
+
+        http_response = self._make_item_response(request, cache, pk)
+        # binary formats can be negotiated by Accept header
+        patch_vary_headers(http_response, ("Accept",))
+        return http_response
+
+    def _make_item_response(self, request, cache: Cache, pk):
+        renderer = getattr(request, "accepted_renderer", None)
+        if getattr(renderer, "renders_items_only", False):
+            body = cache.get_binary_item(pk, renderer)
+            cache.vary_etag(renderer.format)
+            return cache.get_not_modified_response() or cache.add_etag_header(
+                HttpResponse(body, content_type=renderer.media_type)
+            )
+
         serialized_item = cache.get_serialized_item(pk)
+        if isinstance(renderer, BaseItemsRenderer):
+            cache.vary_etag(renderer.format)
+
+        not_modified_response = cache.get_not_modified_response()
+        if not_modified_response:
+            return not_modified_response
 
         response = {"item": serialized_item}
-        return Response(response)
+        return cache.add_etag_header(Response(response))
 
     def get_serialized_item(self, item_id):
         item = self.get_item(item_id=item_id)  # pylint: disable=assignment-from-none
@@ -285,6 +802,13 @@ class MapFeaturesBaseView(MapApiBaseView):
 
         return self.render_detailed_item(item)
 
+    def get_binary_item(self, item_id, renderer: BaseItemsRenderer):
+        item = self.get_item(item_id=item_id)  # pylint: disable=assignment-from-none
+        if not item:
+            raise Http404()
+
+        return renderer.render_items(self, [item], EmptyViewport())
+
     @abstractmethod
     def get_items(self, viewport: BaseViewPort, params: dict):
         pass
@@ -341,12 +865,6 @@ class MapTilesBaseView(MapApiBaseView):
             "browser_cache_salt": Cache(self, self.request).get_browser_caching_salt(),
         }
 
-    def make_pattern_url(self, action_name, kwargs):
-        url = self.reverse_action(action_name, kwargs=kwargs)
-        url = url.replace("%7B", "{")
-        url = url.replace("%7D", "}")
-        return url
-
     def get_url_params(self):
         return ("x", "y", "z")
 
@@ -360,6 +878,13 @@ class MapTilesBaseView(MapApiBaseView):
         params = self._parse_params(request)
         cache = Cache(self, request)
         tile_bytes = cache.get_tile_bytes(z, x, y, params)
+
+        # empty tile response depends on requested extension
+        cache.vary_etag(ext.lower())
+        not_modified_response = cache.get_not_modified_response()
+        if not_modified_response:
+            return cache.add_browser_cache_headers(not_modified_response)
+
         if not tile_bytes:
             response = self.render_empty_response(request, z, x, y, ext)
         elif isinstance(tile_bytes, TileRedirect):
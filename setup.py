@@ -64,6 +64,12 @@ setup(
     packages=find_packages(exclude=["tests*",]),
     zip_safe=False,
     install_requires=reqs("base.txt"),
+    extras_require={
+        "msgpack": reqs("msgpack.txt"),
+        "flatgeobuf": reqs("flatgeobuf.txt"),
+        "brotli": reqs("brotli.txt"),
+        "xxhash": reqs("xxhash.txt"),
+    },
     tests_require=reqs("tests.txt"),
     classifiers=[
         "Programming Language :: Python :: 3.10",
@@ -1,6 +1,11 @@
 from django.contrib.gis.db import models
 
 
+class Tag(models.Model):
+    name = models.CharField(max_length=10)
+
+
 class Feature(models.Model):
     position = models.PointField()
     category = models.CharField(max_length=10, default="A")
+    tag = models.ForeignKey(Tag, null=True, on_delete=models.SET_NULL)
@@ -0,0 +1,50 @@
+import pytest
+
+from generic_map_api.renderers import FlatGeobufRenderer
+from generic_map_api.simplification import SIMPLIFIED_GEOMETRY_ANNOTATION
+from generic_map_api.values import EmptyViewport
+
+from .factories import request_factory
+from .fixtures import create_feature_data
+from .views import FeatureView
+
+
+class SimplifiedFeatureView(FeatureView):
+    simplification_db_geometry_field = "position"
+
+
+@pytest.mark.django_db
+def test_queryset_is_simplified_by_database(create_feature_data):
+    viewport = EmptyViewport()
+    viewport.zoom = 10
+
+    items = SimplifiedFeatureView()._get_viewport_items(viewport, {})
+
+    assert SIMPLIFIED_GEOMETRY_ANNOTATION in items.query.annotations
+    assert "position" not in items.query.deferred_loading[0]
+
+
+@pytest.mark.django_db
+def test_simplified_items_are_serialized(create_feature_data):
+    request = request_factory({"viewport.zoom": "10"})
+
+    simplified = SimplifiedFeatureView().list(request).data
+    full = FeatureView().list(request_factory()).data
+
+    assert [item["geom"] for item in simplified["items"]] == [
+        item["geom"] for item in full["items"]
+    ]
+
+
+@pytest.mark.django_db
+def test_simplified_items_are_rendered_without_extra_queries(
+    create_feature_data, django_assert_num_queries
+):
+    viewport = EmptyViewport()
+    viewport.zoom = 10
+    view = SimplifiedFeatureView()
+
+    with django_assert_num_queries(1):
+        list(view.get_serialized_items(viewport, {}))
+    with django_assert_num_queries(1):
+        view.get_binary_items(viewport, {}, FlatGeobufRenderer())
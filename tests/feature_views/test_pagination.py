@@ -0,0 +1,149 @@
+import io
+import json
+
+import pytest
+from django.core.exceptions import BadRequest, ImproperlyConfigured
+from rest_framework.test import APIRequestFactory
+
+from generic_map_api.pagination import decode_cursor, encode_cursor, paginate_queryset
+from generic_map_api.values import BaseViewPort, EmptyViewport
+from tests.app.models import Feature, Tag
+
+from .factories import request_factory
+from .fixtures import create_feature_data
+from .views import FeatureView
+
+
+class PaginatedFeatureView(FeatureView):
+    pagination_page_size = 3
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("u3qcnhzh", 7)) == ("u3qcnhzh", 7)
+
+
+def test_invalid_cursor():
+    with pytest.raises(BadRequest):
+        decode_cursor("invalid")
+
+
+@pytest.mark.django_db
+def test_pages(create_feature_data):
+    view = PaginatedFeatureView()
+
+    first_page = view.list(request_factory()).data
+    second_page = view.list(request_factory({"cursor": first_page["next"]})).data
+    third_page = view.list(request_factory({"cursor": second_page["next"]})).data
+
+    assert [item["id"] for item in first_page["items"]] == [1, 2, 3]
+    assert [item["id"] for item in second_page["items"]] == [4, 5, 6]
+    assert [item["id"] for item in third_page["items"]] == [7]
+    assert third_page["next"] is None
+
+
+@pytest.mark.django_db
+def test_pages_with_params(create_feature_data):
+    view = PaginatedFeatureView()
+
+    page = view.list(request_factory({"category": "B"})).data
+
+    assert [item["id"] for item in page["items"]] == [2, 6, 7]
+    assert page["next"] is None
+
+
+def test_invalid_ordering():
+    with pytest.raises(ImproperlyConfigured):
+        paginate_queryset(Feature.objects.all(), "--pk", 3)
+
+
+def test_pagination_requires_queryset():
+    class PaginatedListView(PaginatedFeatureView):
+        def get_items(self, viewport: BaseViewPort, params: dict):
+            return []
+
+    with pytest.raises(ImproperlyConfigured):
+        PaginatedListView().get_serialized_page(EmptyViewport(), {}, None)
+
+
+def iter_pages(view, query_params=None):
+    query_params = query_params or {}
+    page = view.list(request_factory(query_params)).data
+    yield page
+    while page["next"]:
+        page = view.list(request_factory({**query_params, "cursor": page["next"]}))
+        page = page.data
+        yield page
+
+
+@pytest.mark.django_db
+def test_pages_in_descending_order(create_feature_data):
+    class DescendingFeatureView(PaginatedFeatureView):
+        pagination_ordering = "-category"
+
+    pages = list(iter_pages(DescendingFeatureView()))
+
+    assert [[item["id"] for item in page["items"]] for page in pages] == [
+        [2, 6, 7],
+        [1, 3, 4],
+        [5],
+    ]
+
+
+@pytest.mark.django_db
+def test_pages_ordered_by_related_field(create_feature_data):
+    class TagFeatureView(PaginatedFeatureView):
+        pagination_ordering = "tag__name"
+
+    for name, ids in (("b", [1, 2, 3, 4]), ("a", [5, 6, 7])):
+        Feature.objects.filter(id__in=ids).update(tag=Tag.objects.create(name=name))
+
+    pages = list(iter_pages(TagFeatureView()))
+
+    assert [[item["id"] for item in page["items"]] for page in pages] == [
+        [5, 6, 7],
+        [1, 2, 3],
+        [4],
+    ]
+
+
+@pytest.mark.django_db
+def test_columnar_pages(create_feature_data):
+    view = PaginatedFeatureView()
+
+    first_page = json.loads(
+        view.list(request_factory({"items_format": "columnar"})).content
+    )
+    second_page = json.loads(
+        view.list(
+            request_factory({"items_format": "columnar", "cursor": first_page["next"]})
+        ).content
+    )
+
+    assert first_page["id"] == [1, 2, 3]
+    assert first_page["properties"]["category"] == ["A", "B", "A"]
+    assert second_page["id"] == [4, 5, 6]
+
+
+@pytest.mark.django_db
+def test_rendered_pages_are_cached(create_feature_data):
+    class RenderedFeatureView(PaginatedFeatureView):
+        cache_rendered_items = True
+
+    response = RenderedFeatureView().list(request_factory())
+
+    page = json.loads(response.content)
+    assert [item["id"] for item in page["items"]] == [1, 2, 3]
+    assert page["next"]
+
+
+@pytest.mark.django_db
+def test_binary_pages_link_next_page(create_feature_data):
+    raw = pytest.importorskip("pyogrio.raw")
+    view = PaginatedFeatureView.as_view({"get": "list"})
+
+    response = view(APIRequestFactory().get("/?format=fgb"))
+
+    _, _, _, fields = raw.read(io.BytesIO(response.content))
+    assert list(fields[0]) == [1, 2, 3]
+    assert 'rel="next"' in response["Link"]
+    assert "cursor=" in response["Link"]
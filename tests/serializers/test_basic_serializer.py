@@ -2,6 +2,7 @@ import pytest
 from django.contrib.gis.geos import Point as GeosPoint
 from shapely.geometry import Point as ShapelyPoint
 
+from generic_map_api.geometry_serializers import rounded_coordinates
 from generic_map_api.serializers import BaseFeatureSerializer
 
 
@@ -32,3 +33,54 @@ def test_serializer(point_class):
     serialized = serializer.serialize(obj)
 
     assert expected_output == serialized
+
+
+@pytest.mark.parametrize("point_class", (GeosPoint, ShapelyPoint, geo_json_factory))
+def test_serializer_rounds_coordinates(point_class):
+    obj = {"geometry": point_class(1.23456789, 2.98765432)}
+
+    with rounded_coordinates(2):
+        serialized = TestSerializer().serialize(obj)
+
+    assert serialized["geom"] == (2.99, 1.23)
+    assert TestSerializer().serialize(obj)["geom"] == (2.98765432, 1.23456789)
+
+
+@pytest.mark.parametrize("point_class", (GeosPoint, ShapelyPoint, geo_json_factory))
+def test_serializer_fetches_geometry_once(point_class):
+    class CountingSerializer(TestSerializer):
+        calls = 0
+
+        def get_geometry(self, obj):
+            self.calls += 1
+            return super().get_geometry(obj)
+
+    serializer = CountingSerializer()
+    serialized = serializer.serialize({"geometry": point_class(1.0, 2.0)})
+
+    assert serialized["geom"] == (2.0, 1.0)
+    assert serializer.calls == 1
+
+
+def test_serializer_rejects_unsupported_geometry():
+    with pytest.raises(ValueError):
+        TestSerializer().serialize({"geometry": {"type": "Unknown"}})
+    with pytest.raises(ValueError):
+        TestSerializer().serialize({"geometry": "POINT (1 2)"})
+
+
+def test_serialize_many_fetches_geometry_once():
+    class CountingSerializer(TestSerializer):
+        calls = 0
+
+        def get_geometry(self, obj):
+            self.calls += 1
+            return super().get_geometry(obj)
+
+    serializer = CountingSerializer()
+    serialized = serializer.serialize_many(
+        [{"geometry": ShapelyPoint(1.0, 2.0)}, {"geometry": ShapelyPoint(3.0, 4.0)}]
+    )
+
+    assert [item["geom"] for item in serialized] == [(2.0, 1.0), (4.0, 3.0)]
+    assert serializer.calls == 2
@@ -2,6 +2,11 @@ import pytest
 from django.contrib.gis.geos import LineString as GeosLineString
 from shapely.geometry import LineString as ShapelyLineString
 
+from generic_map_api.geometry_serializers import (
+    encode_delta_varint,
+    encode_lines,
+    encode_polyline,
+)
 from generic_map_api.serializers import BaseFeatureSerializer
 
 
@@ -39,3 +44,39 @@ def test_simple_line_serializer(geometry_class):
     serialized = serializer.serialize(obj)
 
     assert expected_output == serialized
+
+
+class TestEncodedLineSerializer(TestLineSerializer):
+    geometry_encoding = "polyline"
+
+
+def test_encode_polyline():
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert encode_polyline(points) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_encode_delta_varint():
+    # deltas 1, -1, 64, 0 are zigzagged to 2, 1, 128, 0 -> bytes 02 01 80 01 00
+    assert encode_delta_varint([(0.01, -0.01), (0.65, -0.01)], precision=2) == (
+        "AgGAAQA"
+    )
+
+
+def test_encoded_line_keeps_date_line_normalization():
+    obj = {"geometry": ShapelyLineString([(179.0, 0.0), (-179.0, 1.0)])}
+
+    serialized = TestEncodedLineSerializer().serialize(obj)
+
+    assert serialized["geom"] == encode_polyline([(0.0, 179.0), (1.0, 181.0)])
+
+
+@pytest.mark.parametrize(
+    "geometry, expected",
+    (
+        ((), ()),
+        (((), ((0.0, 0.0), (1.0, 1.0))), ("", "??_ibE_ibE")),
+        ((((0.0, 0.0), (1.0, 1.0)), []), ("??_ibE_ibE", "")),
+    ),
+)
+def test_encode_lines_with_empty_lines(geometry, expected):
+    assert encode_lines(geometry, "polyline") == expected
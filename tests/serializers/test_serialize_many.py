@@ -0,0 +1,116 @@
+import pytest
+import shapely
+from django.contrib.gis.geos import GEOSGeometry
+from shapely import wkt
+
+from generic_map_api.geometry_serializers import WkbSerializer, rounded_coordinates
+from generic_map_api.serializers import BaseFeatureSerializer
+
+GEOMETRIES = [
+    "POINT (1.123456 2.654321)",
+    "POINT Z (1 2 3)",
+    "LINESTRING (0 0, 1 1, 2 0.5)",
+    "LINEARRING (0 0, 1 0, 1 1, 0 0)",
+    "POLYGON ((0 0, 4 0, 4 4, 0 0))",
+    "POLYGON ((0 0, 4 0, 4 4, 0 0), (1 1, 2 1, 2 2, 1 1))",
+    "MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), ((5 5, 6 5, 6 6, 5 5), (5.1 5.1, 5.2 5.1, 5.2 5.2, 5.1 5.1)))",
+    "LINESTRING (179 0, -179 1)",
+    "LINESTRING (-179 0, 179 1, -179 2, 170 3, -170 4)",
+    "POLYGON ((170 0, -170 0, -170 5, 170 5, 170 0), (175 1, -175 1, -175 2, 175 1))",
+    "MULTIPOLYGON (((179 0, -179 0, 179 1, 179 0)), ((-179 0, 179 0, -179 1, -179 0)))",
+]
+
+
+class TestSerializer(BaseFeatureSerializer):
+    feature_type = "test"
+
+    def get_geometry(self, obj):
+        return obj["geometry"]
+
+    def get_id(self, obj):
+        return obj["id"]
+
+
+def make_objects():
+    objects = []
+    for geometry in GEOMETRIES:
+        objects.append({"id": len(objects), "geometry": wkt.loads(geometry)})
+        if not geometry.startswith("LINEARRING"):
+            objects.append({"id": len(objects), "geometry": GEOSGeometry(geometry)})
+            objects.append(
+                {"id": len(objects), "geometry": shapely.to_wkb(wkt.loads(geometry))}
+            )
+    objects.append(
+        {"id": len(objects), "geometry": {"type": "Point", "coordinates": [1, 2]}}
+    )
+    return objects
+
+
+@pytest.mark.parametrize("precision", (None, 2))
+def test_serialize_many_is_identical(precision):
+    serializer = TestSerializer()
+    objects = make_objects()
+
+    with rounded_coordinates(precision):
+        expected = [serializer.serialize(obj) for obj in objects]
+        serialized = serializer.serialize_many(objects)
+
+    assert serialized == expected
+
+
+def test_custom_frontend_geometry_is_kept():
+    class CustomSerializer(TestSerializer):
+        def make_frontend_style_geometry(self, geometry):
+            return (0.0, 0.0)
+
+    serialized = CustomSerializer().serialize_many(make_objects())
+
+    assert {item["geom"] for item in serialized} == {(0.0, 0.0)}
+
+
+def test_wkb_is_serialized_like_shapely():
+    serializer = TestSerializer()
+    shape = shapely.set_srid(wkt.loads(GEOMETRIES[5]), 4326)
+    raw_geometries = [
+        shapely.to_wkb(shape),
+        shapely.to_wkb(shape, byte_order=0),
+        memoryview(shapely.to_wkb(shape, include_srid=True, flavor="extended")),
+    ]
+    expected = serializer.serialize({"id": 1, "geometry": shape})
+
+    objects = [{"id": 1, "geometry": geometry} for geometry in raw_geometries]
+
+    assert serializer.serialize_many(objects) == [expected] * len(objects)
+    assert [serializer.serialize(obj) for obj in objects] == [expected] * len(objects)
+
+
+def test_wkb_boundary_box_is_not_decoded_again(monkeypatch):
+    serializer = TestSerializer()
+    objects = [
+        {"id": 1, "geometry": shapely.to_wkb(wkt.loads(geometry))}
+        for geometry in GEOMETRIES
+        if not geometry.startswith("LINEARRING")
+    ]
+    expected = [serializer.serialize(obj) for obj in objects]
+
+    def make_boundary_box(geometry):
+        raise AssertionError("WKB decoded again for boundary box")
+
+    monkeypatch.setattr(WkbSerializer, "make_boundary_box", make_boundary_box)
+
+    assert serializer.serialize_many(objects) == expected
+
+
+def test_cluster_geometry_is_normalized():
+    class ClusterSerializer(TestSerializer):
+        def get_cluster_geometry(self, obj):
+            return obj
+
+    cluster = wkt.loads(GEOMETRIES[-2])
+
+    serialized = ClusterSerializer().serialize_cluster(cluster)
+
+    assert serialized["geom"] == (
+        ((0.0, 170.0), (0.0, 190.0), (5.0, 190.0), (5.0, 170.0), (0.0, 170.0)),
+        ((1.0, 175.0), (1.0, 185.0), (2.0, 185.0), (1.0, 175.0)),
+    )
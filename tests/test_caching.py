@@ -0,0 +1,501 @@
+import gzip
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from shapely.geometry import box
+
+from generic_map_api.caching import (
+    KEY_VERSION,
+    LOCK_SUFFIX,
+    Cache,
+    CacheEntry,
+    make_etag,
+)
+from generic_map_api.local_cache import LocalCache
+from generic_map_api.params import Date, Text
+from generic_map_api.serializers import BaseFeatureSerializer
+from generic_map_api.signals import connect_spatial_invalidation
+from generic_map_api.values import BaseViewPort, Tile
+from generic_map_api.views import MapFeaturesBaseView, MapTilesBaseView
+from tests.app.models import Feature
+from tests.feature_views.factories import request_factory
+
+
+class ItemSerializer(BaseFeatureSerializer):
+    def get_geometry(self, obj):
+        return obj["geometry"]
+
+    def get_id(self, obj):
+        return obj["id"]
+
+
+class CountingFeatureView(MapFeaturesBaseView):
+    serializer = ItemSerializer()
+    cache_name = "locmem"
+
+    query_params = {
+        "category": Text("Category", many=True),
+        "date": Date("Date"),
+    }
+
+    def __init__(self, *args, delay=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def get_items(self, viewport: BaseViewPort, params: dict):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return [
+            {
+                "id": self.calls,
+                "geometry": {"type": "Point", "coordinates": [20.0, 50.0]},
+            },
+        ]
+
+
+class CountingTilesView(MapTilesBaseView):
+    cache_name = "locmem"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def get_tile(self, z: int, x: int, y: int, params: dict) -> bytes:
+        self.calls += 1
+        return b"tile"
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    caches["locmem"].clear()
+    yield
+    caches["locmem"].clear()
+
+
+def test_items_are_cached():
+    view = CountingFeatureView()
+    cache = Cache(view, request_factory())
+
+    first = cache.get_serialized_items(Tile(1, 1, 1), {})
+    second = cache.get_serialized_items(Tile(1, 1, 1), {})
+
+    assert first == second
+    assert first[0]["id"] == 1
+    assert view.calls == 1
+
+
+def test_tiles_are_cached():
+    view = CountingTilesView()
+    cache = Cache(view, request_factory())
+
+    assert cache.get_tile_bytes(1, 1, 1, {}) == b"tile"
+    assert cache.get_tile_bytes(1, 1, 1, {}) == b"tile"
+    assert view.calls == 1
+
+
+def test_coalescing_computes_once_for_concurrent_misses():
+    view = CountingFeatureView(delay=0.2)
+    view.cache_coalescing = True
+    results = []
+
+    def worker():
+        cache = Cache(view, request_factory())
+        results.append(cache.get_serialized_items(Tile(1, 1, 1), {}))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert view.calls == 1
+    assert len(results) == 5
+    assert all(result == results[0] for result in results)
+
+
+def test_coalescing_falls_back_to_computing_after_timeout():
+    view = CountingFeatureView()
+    view.cache_coalescing = True
+    view.cache_coalescing_timeout = 0.1
+    cache = Cache(view, request_factory())
+
+    key = _items_key(cache, Tile(1, 1, 1))
+    caches["locmem"].add(f"{key}__{LOCK_SUFFIX}", True, 60)
+
+    result = cache.get_serialized_items(Tile(1, 1, 1), {})
+
+    assert result[0]["id"] == 1
+    assert view.calls == 1
+
+
+def test_coalescing_lock_holder_rereads_cache(monkeypatch):
+    view = CountingFeatureView()
+    view.cache_coalescing = True
+    Cache(view, request_factory()).get_serialized_items(Tile(1, 1, 1), {})
+
+    cache = Cache(view, request_factory())
+    read_entry = cache._read_entry  # pylint: disable=protected-access
+    misses = iter([True])
+
+    def read_entry_missing_once(key):
+        # the value is stored right after the first read
+        if next(misses, False):
+            return read_entry(f"{key}__missing")
+        return read_entry(key)
+
+    monkeypatch.setattr(cache, "_read_entry", read_entry_missing_once)
+    result = cache.get_serialized_items(Tile(1, 1, 1), {})
+
+    assert result[0]["id"] == 1
+    assert view.calls == 1
+
+
+def _items_key(cache, viewport):
+    return cache._make_caching_key(  # pylint: disable=protected-access
+        "ITEMS",
+        cache.request,
+        viewport=viewport.to_dict(),
+        params={},
+    )
+
+
+def test_stale_items_are_served_and_refreshed_in_background():
+    view = CountingFeatureView()
+    view.cache_ttl = 60
+    view.cache_stale_ttl_items = 60
+    cache = Cache(view, request_factory())
+
+    assert cache.get_serialized_items(Tile(1, 1, 1), {})[0]["id"] == 1
+
+    key = _items_key(cache, Tile(1, 1, 1))
+    entry = caches["locmem"].get(key)
+    caches["locmem"].set(key, CacheEntry(entry.value, fresh_until=0), 60)
+
+    assert cache.get_serialized_items(Tile(1, 1, 1), {})[0]["id"] == 1
+
+    deadline = time.monotonic() + 5
+    while caches["locmem"].get(key).is_stale() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert view.calls == 2
+    assert cache.get_serialized_items(Tile(1, 1, 1), {})[0]["id"] == 2
+
+
+def test_local_cache_is_read_before_backend():
+    view = CountingFeatureView()
+    view.cache_local = LocalCache()
+    cache = Cache(view, request_factory())
+
+    cache.get_serialized_items(Tile(1, 1, 1), {})
+    caches["locmem"].clear()
+    result = cache.get_serialized_items(Tile(1, 1, 1), {})
+
+    assert result[0]["id"] == 1
+    assert view.calls == 1
+    assert view.cache_local.stats()["hits"] == 1
+
+
+def test_rendered_items_are_cached_compressed():
+    view = CountingFeatureView()
+    view.cache_rendered_items = True
+    view.cache_rendered_items_encodings = ("gzip",)
+
+    for _ in range(2):
+        request = request_factory()
+        request.META["HTTP_ACCEPT_ENCODING"] = "gzip, deflate"
+        response = view.list(request)
+
+    assert view.calls == 1
+    assert response["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.content)) == {
+        "items": [
+            {"type": ["point"], "id": 1, "geom": [50.0, 20.0], "bbox": [50.0, 20.0]}
+        ]
+    }
+
+
+def test_caching_key_is_versioned():
+    cache = Cache(CountingFeatureView(), request_factory())
+
+    key = cache._make_caching_key(
+        "META", cache.request
+    )  # pylint: disable=protected-access
+
+    view_name = f"{CountingFeatureView.__module__}.CountingFeatureView"
+    assert key.startswith(f"MAP_API__v{KEY_VERSION}__{view_name}__META__")
+
+
+def test_caching_key_is_canonical():
+    cache = Cache(CountingFeatureView(), request_factory())
+
+    def make_key(params):
+        return cache._make_caching_key(  # pylint: disable=protected-access
+            "ITEMS",
+            cache.request,
+            viewport={"zoom": 3, "mpp": 1.5},
+            params=params,
+        )
+
+    key = make_key(
+        {"category": ["A", "B"], "date": datetime(2024, 1, 1, 12, tzinfo=timezone.utc)}
+    )
+    equivalent_key = make_key(
+        {
+            "date": datetime(2024, 1, 1, 13, tzinfo=timezone(timedelta(hours=1))),
+            "category": ["B", "A"],
+        }
+    )
+    different_key = make_key({"category": ["A"]})
+
+    assert key == equivalent_key
+    assert key != different_key
+
+
+class InvalidatedFeatureView(CountingFeatureView):
+    cache_invalidation = True
+
+
+def test_invalidation_bumps_generation():
+    view = InvalidatedFeatureView()
+    cache = Cache(view, request_factory())
+
+    cache.get_serialized_items(Tile(1, 1, 1), {})
+    cache.get_serialized_items(Tile(1, 1, 1), {})
+    assert view.calls == 1
+
+    Cache.invalidate(InvalidatedFeatureView)
+
+    assert cache.get_serialized_items(Tile(1, 1, 1), {})[0]["id"] == 2
+    assert view.calls == 2
+
+
+def test_invalidation_by_another_process_is_seen_despite_local_cache():
+    view = InvalidatedFeatureView()
+    view.cache_local = LocalCache()
+    cache = Cache(view, request_factory())
+
+    cache.get_serialized_items(Tile(1, 1, 1), {})
+    # another process bumps the generation in the shared backend
+    caches["locmem"].clear()
+
+    assert cache.get_serialized_items(Tile(1, 1, 1), {})[0]["id"] == 2
+
+
+def test_invalidation_requires_it_to_be_enabled():
+    with pytest.raises(ValueError):
+        Cache.invalidate(CountingFeatureView)
+
+
+class IndexedTilesView(CountingTilesView):
+    cache_spatial_index = True
+
+
+def test_invalidate_bbox_deletes_intersecting_tiles():
+    view = IndexedTilesView()
+    cache = Cache(view, request_factory())
+
+    cache.get_tile_bytes(3, 4, 2, {})  # contains (20, 50)
+    cache.get_tile_bytes(3, 0, 0, {})
+    assert view.calls == 2
+
+    deleted = Cache.invalidate_bbox(IndexedTilesView, box(19, 49, 21, 51))
+
+    assert deleted == 1
+    cache.get_tile_bytes(3, 4, 2, {})
+    cache.get_tile_bytes(3, 0, 0, {})
+    assert view.calls == 3
+
+
+def test_spatial_invalidation_requires_spatial_index():
+    with pytest.raises(ImproperlyConfigured):
+        connect_spatial_invalidation(CountingTilesView, Feature, "position")
+
+
+def test_spatial_index_keeps_entries_of_concurrent_writers():
+    cache = Cache(IndexedTilesView(), request_factory())
+
+    def worker(number):
+        # pylint: disable=protected-access
+        cache._add_to_spatial_index(f"key{number}", [(3, 4, 2)], 60)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert Cache.invalidate_bbox(IndexedTilesView, box(19, 49, 21, 51)) == 20
+
+
+def test_too_big_geometry_falls_back_to_generation_bump():
+    view = IndexedTilesView()
+    cache = Cache(view, request_factory())
+
+    cache.get_tile_bytes(0, 0, 0, {})
+    cache.get_tile_bytes(14, 9000, 5000, {})
+    Cache.invalidate_bbox(IndexedTilesView, box(-180, -85, 180, 85))
+    cache.get_tile_bytes(14, 9000, 5000, {})
+
+    assert view.calls == 3
+
+
+def test_list_returns_not_modified_for_matching_etag():
+    view = CountingFeatureView()
+
+    response = view.list(request_factory())
+    etag = response["ETag"]
+
+    request = request_factory()
+    request.META["HTTP_IF_NONE_MATCH"] = etag
+    not_modified_response = view.list(request)
+
+    request = request_factory()
+    request.META["HTTP_IF_NONE_MATCH"] = '"other"'
+    modified_response = view.list(request)
+
+    assert response.status_code == 200
+    assert not_modified_response.status_code == 304
+    assert not_modified_response["ETag"] == etag
+    assert modified_response.status_code == 200
+    assert view.calls == 1
+
+
+def test_values_not_stored_get_no_etag(monkeypatch):
+    view = CountingFeatureView()
+    view.cache_name = None  # dummy backend
+
+    monkeypatch.setattr(
+        "generic_map_api.caching.make_etag",
+        lambda value, key: pytest.fail("ETag made for a value which is not stored"),
+    )
+    response = view.list(request_factory())
+
+    assert response.status_code == 200
+    assert not response.has_header("ETag")
+
+
+def test_etag_of_rendered_body_is_hashed_directly():
+    etag = make_etag({"identity": b"body", "gzip": b"zipped"}, "key")
+
+    assert make_etag({"gzip": b"zipped", "identity": b"body"}, "key") == etag
+    assert make_etag({"identity": b"other", "gzip": b"zipped"}, "key") != etag
+    assert make_etag(b"tile", "key") != make_etag(b"other tile", "key")
+
+
+def test_etag_of_other_values_changes_with_every_computation():
+    # values are not serialized to be hashed, even unpicklable ones get ETag
+    items = [{"id": 1, "geom": lambda: None}]
+
+    assert make_etag(items, "key") != make_etag(items, "key")
+
+
+def test_etag_is_kept_while_value_is_cached():
+    view = CountingFeatureView()
+
+    first = view.list(request_factory())
+    second = view.list(request_factory())
+
+    assert first["ETag"] == second["ETag"]
+    assert view.calls == 1
+
+
+def test_tile_returns_not_modified_for_matching_etag():
+    view = CountingTilesView()
+
+    response = view.tile(request_factory(), 1, 1, 1, "png")
+
+    request = request_factory()
+    request.META["HTTP_IF_NONE_MATCH"] = f'W/{response["ETag"]}'
+    not_modified_response = view.tile(request, 1, 1, 1, "png")
+
+    assert response.status_code == 200
+    assert not_modified_response.status_code == 304
+
+
+def test_tiles_are_read_and_written_in_bulk():
+    view = CountingTilesView()
+    cache = Cache(view, request_factory())
+
+    cache.get_tile_bytes(1, 0, 0, {})
+    tiles = cache.get_tile_bytes_many([(1, 0, 0), (1, 0, 1), (1, 1, 0)], {})
+
+    assert tiles == [b"tile", b"tile", b"tile"]
+    assert view.calls == 3
+    assert cache.get_tile_bytes(1, 1, 0, {}) == b"tile"
+    assert view.calls == 3
+
+
+def test_items_are_read_and_written_in_bulk():
+    view = CountingFeatureView()
+    cache = Cache(view, request_factory())
+
+    first = cache.get_serialized_items(Tile(0, 0, 1), {})
+    many = cache.get_serialized_items_many([Tile(0, 0, 1), Tile(1, 0, 1)], {})
+
+    assert many[0] == first
+    assert many[1][0]["id"] == 2
+    assert view.calls == 2
+
+
+def test_repeated_inputs_are_computed_once_and_returned_for_every_input():
+    tiles_view = CountingTilesView()
+    tiles = Cache(tiles_view, request_factory()).get_tile_bytes_many(
+        [(1, 0, 0), (1, 0, 0), (1, 1, 1)], {}
+    )
+    items_view = CountingFeatureView()
+    items = Cache(items_view, request_factory()).get_serialized_items_many(
+        [Tile(0, 0, 1), Tile(0, 0, 1)], {}
+    )
+
+    assert tiles == [b"tile", b"tile", b"tile"]
+    assert tiles_view.calls == 2
+    assert len(items) == 2
+    assert items[0] == items[1]
+    assert items_view.calls == 1
+
+
+def test_streamed_items_are_cached():
+    view = CountingFeatureView()
+    view.stream_items = True
+
+    first_response = view.list(request_factory())
+    first_body = b"".join(first_response.streaming_content)
+    second_response = view.list(request_factory())
+    second_body = b"".join(second_response.streaming_content)
+
+    assert first_body == second_body
+    assert json.loads(first_body) == {
+        "items": [
+            {"type": ["point"], "id": 1, "geom": [50.0, 20.0], "bbox": [50.0, 20.0]}
+        ]
+    }
+    assert view.calls == 1
+
+
+def test_streamed_items_are_coalesced():
+    view = CountingFeatureView(delay=0.2)
+    view.stream_items = True
+    view.cache_coalescing = True
+    bodies = []
+
+    def worker():
+        response = view.list(request_factory())
+        bodies.append(b"".join(response.streaming_content))
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert view.calls == 1
+    assert len(bodies) == 3
+    assert all(body == bodies[0] for body in bodies)
@@ -0,0 +1,42 @@
+import shapely
+from shapely.geometry import Point
+
+from generic_map_api.caching import NO_CACHE
+from generic_map_api.clustering import BasicClustering
+from generic_map_api.serializers import BaseFeatureSerializer
+from generic_map_api.values import BaseViewPort, EmptyViewport
+from generic_map_api.views import MapFeaturesBaseView
+
+ITEMS = [
+    {"id": i, "geometry": shapely.to_wkb(Point(20 + i / 10, 50 + i % 2 / 10))}
+    for i in range(5)
+] + [
+    {"id": 5, "geometry": {"type": "Point", "coordinates": [20.0, 50.0]}},
+    {"id": 6, "geometry": None},
+]
+
+
+class ItemSerializer(BaseFeatureSerializer):
+    def get_geometry(self, obj):
+        return obj["geometry"]
+
+    def get_id(self, obj):
+        return obj["id"]
+
+
+class PlacesView(MapFeaturesBaseView):
+    serializer = ItemSerializer()
+    cache_ttl = NO_CACHE
+
+    def get_items(self, viewport: BaseViewPort, params: dict):
+        return ITEMS
+
+
+def test_items_of_any_geometry_format_are_clustered():
+    outputs = list(
+        BasicClustering().find_clusters(PlacesView(), EmptyViewport(), ITEMS)
+    )
+
+    assert len(outputs) == 1
+    assert outputs[0].is_cluster
+    assert [item["id"] for item in outputs[0].item.items] == [0, 1, 2, 3, 4, 5]
@@ -0,0 +1,112 @@
+import json
+
+from rest_framework.test import APIRequestFactory
+
+from generic_map_api.caching import NO_CACHE
+from generic_map_api.columnar import COLUMNAR_CONTENT_TYPE, ColumnarItemsBuilder
+from generic_map_api.serializers import BaseFeatureSerializer
+from generic_map_api.values import BaseViewPort
+from generic_map_api.views import MapFeaturesBaseView
+
+ITEMS = [
+    {"id": 1, "geometry": {"type": "Point", "coordinates": [20.0, 50.0]}},
+    {
+        "id": 2,
+        "geometry": {"type": "LineString", "coordinates": [[20.0, 50.0], [21, 51]]},
+    },
+    {
+        "id": 3,
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [
+                [[0, 0], [4, 0], [4, 4], [0, 0]],
+                [[1, 1], [2, 1], [2, 2], [1, 1]],
+            ],
+        },
+    },
+]
+
+
+class ItemSerializer(BaseFeatureSerializer):
+    feature_type = "place"
+
+    def get_geometry(self, obj):
+        return obj["geometry"]
+
+    def get_id(self, obj):
+        return obj["id"]
+
+
+class PlacesView(MapFeaturesBaseView):
+    serializer = ItemSerializer()
+    cache_ttl = NO_CACHE
+
+    def get_items(self, viewport: BaseViewPort, params: dict):
+        return ITEMS
+
+
+def test_columnar_items():
+    builder = ColumnarItemsBuilder()
+    builder.add_items(PlacesView(), ITEMS)
+
+    assert builder.build() == {
+        "format": "columnar",
+        "types": [["place", "point"], ["place", "line"], ["place", "polygon"]],
+        "type": [0, 1, 2],
+        "id": [1, 2, 3],
+        "coords": [50.0, 20.0, 50.0, 20.0, 51, 21]
+        + [0, 0, 0, 4, 4, 4, 0, 0]
+        + [1, 1, 1, 2, 2, 2, 1, 1],
+        "item_offsets": [0, 1, 2, 3],
+        "polygon_offsets": [0, 1, 2, 4],
+        "ring_offsets": [0, 1, 3, 7, 11],
+        "bbox": [50.0, 20.0, 50.0, 20.0] + [50.0, 20.0, 51, 21] + [0, 0, 4, 4],
+        "properties": {},
+    }
+
+
+class ExtraFieldsSerializer(ItemSerializer):
+    def serialize(self, obj):
+        serialized = super().serialize(obj)
+        if obj["id"] > 1:
+            serialized["name"] = f"place {obj['id']}"
+        return serialized
+
+
+class ExtraFieldsView(PlacesView):
+    serializer = ExtraFieldsSerializer()
+
+
+def test_fields_added_by_serializer_are_extra_columns():
+    builder = ColumnarItemsBuilder()
+    builder.add_items(ExtraFieldsView(), ITEMS)
+
+    columns = builder.build()
+
+    assert columns["id"] == [1, 2, 3]
+    assert columns["properties"] == {"name": [None, "place 2", "place 3"]}
+
+
+def test_columnar_format_is_negotiated():
+    view = PlacesView.as_view({"get": "list"})
+
+    by_param = view(APIRequestFactory().get("/", {"items_format": "columnar"}))
+    by_header = view(APIRequestFactory().get("/", HTTP_ACCEPT=COLUMNAR_CONTENT_TYPE))
+    default = view(APIRequestFactory().get("/"))
+    default.render()
+
+    assert by_param["Content-Type"] == COLUMNAR_CONTENT_TYPE
+    assert by_header["Content-Type"] == COLUMNAR_CONTENT_TYPE
+    assert json.loads(by_param.content) == json.loads(by_header.content)
+    assert json.loads(by_param.content)["id"] == [1, 2, 3]
+    assert "items" in json.loads(default.content)
+    assert "Accept" in default["Vary"]
+    assert "Accept" in by_param["Vary"]
+
+
+def test_columnar_media_type_is_not_acceptable_for_other_actions():
+    view = PlacesView.as_view({"get": "meta"})
+
+    response = view(APIRequestFactory().get("/", HTTP_ACCEPT=COLUMNAR_CONTENT_TYPE))
+
+    assert response.status_code == 406
@@ -1,7 +1,12 @@
+import numpy as np
 import pytest
 from shapely.geometry import MultiPolygon, box
 
-from generic_map_api.date_line_normalization import normalized_viewport
+from generic_map_api.date_line_normalization import (
+    normalize_line,
+    normalized_viewport,
+    world_offsets,
+)
 
 
 @pytest.mark.parametrize(
@@ -22,3 +27,27 @@ from generic_map_api.date_line_normalization import normalized_viewport
 def test_normalize_viewport(input_args, expected_geometry):
     result = normalized_viewport(*input_args)
     assert expected_geometry.wkt == result.wkt
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        [(0, 10), (1, 20)],
+        [(0, 179), (1, -179), (2, -170)],
+        [(0, -179), (1, 179), (2, -179), (3, 170), (4, -170)],
+        [(0, 90), (1, -100)],
+    ],
+)
+def test_world_offsets_are_like_normalize_line(line):
+    longitudes = np.array([lon for _, lon in line])
+
+    assert (longitudes + world_offsets(longitudes)).tolist() == [
+        lon for _, lon in normalize_line(line)
+    ]
+
+
+def test_world_offsets_restart_on_every_line():
+    longitudes = np.array([179, -179, -178, 179, -179])
+    line_index = np.array([0, 0, 0, 1, 1])
+
+    assert world_offsets(longitudes, line_index).tolist() == [0, 360, 360, 0, 360]
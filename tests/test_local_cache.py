@@ -0,0 +1,59 @@
+import time
+
+from generic_map_api.local_cache import LocalCache
+
+
+def test_hits_and_misses_are_counted():
+    cache = LocalCache()
+
+    assert cache.get("key") is None
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    cache = LocalCache(max_bytes=3000, max_entry_bytes=3000)
+
+    cache.set("a", b"a" * 1000)
+    cache.set("b", b"b" * 1000)
+    cache.get("a")
+    cache.set("c", b"c" * 1000)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.size <= 3000
+
+
+def test_oversized_entries_are_not_stored():
+    cache = LocalCache(max_bytes=10000, max_entry_bytes=1000)
+
+    cache.set("small", b"s" * 100)
+    assert not cache.set("huge", b"h" * 5000)
+
+    assert cache.get("small") is not None
+    assert cache.get("huge") is None
+
+
+def test_entries_expire():
+    cache = LocalCache(ttl=0.05)
+
+    cache.set("key", "value")
+    time.sleep(0.1)
+
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_size_of_big_values_is_estimated():
+    cache = LocalCache()
+    items = [{"id": i, "geom": ((1.0, 2.0), (3.0, 4.0))} for i in range(10000)]
+
+    cache.set("items", items)
+
+    assert 1000000 < cache.size < 10000000
@@ -0,0 +1,162 @@
+import threading
+from io import StringIO
+
+import pytest
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.urls import include, path
+from rest_framework.routers import SimpleRouter
+
+from generic_map_api.management.commands.map_api_warm import Command, find_view_class
+from generic_map_api.serializers import BaseFeatureSerializer
+from generic_map_api.values import BaseViewPort
+from generic_map_api.views import MapFeaturesBaseView, MapTilesBaseView
+
+
+class WarmedTilesView(MapTilesBaseView):
+    cache_name = "locmem"
+    cache_ttl = 60
+
+    rendered = []
+    rendered_lock = threading.Lock()
+
+    def get_tile(self, z: int, x: int, y: int, params: dict) -> bytes:
+        with self.rendered_lock:
+            self.rendered.append((z, x, y))
+        return b"tile"
+
+
+class PointSerializer(BaseFeatureSerializer):
+    def get_geometry(self, obj):
+        return obj
+
+
+class StreamedFeaturesView(MapFeaturesBaseView):
+    serializer = PointSerializer()
+    cache_name = "locmem"
+    cache_ttl = 60
+    stream_items = True
+
+    calls = 0
+
+    def get_items(self, viewport: BaseViewPort, params: dict):
+        StreamedFeaturesView.calls += 1
+        return [{"type": "Point", "coordinates": [20.0, 50.0]}]
+
+
+class OtherTilesView(WarmedTilesView):
+    pass
+
+
+router = SimpleRouter()
+router.register("warmed", WarmedTilesView, basename="warmed")
+router.register("streamed", StreamedFeaturesView, basename="streamed")
+
+other_router = SimpleRouter()
+other_router.register("other", OtherTilesView, basename="warmed")
+
+urlpatterns = [
+    path("map/", include((router.urls, "map"), namespace="map")),
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    caches["locmem"].clear()
+    WarmedTilesView.rendered.clear()
+    yield
+    caches["locmem"].clear()
+
+
+def test_warms_tile_pyramid(tmp_path):
+    view_path = f"{WarmedTilesView.__module__}.WarmedTilesView"
+    state_file = tmp_path / "state.txt"
+
+    stdout = StringIO()
+    call_command(
+        Command(),
+        view_path,
+        "--max-zoom=1",
+        f"--state-file={state_file}",
+        stdout=stdout,
+    )
+
+    assert sorted(WarmedTilesView.rendered) == [
+        ("0", "0", "0"),
+        ("1", "0", "0"),
+        ("1", "0", "1"),
+        ("1", "1", "0"),
+        ("1", "1", "1"),
+    ]
+    assert "5 warmed" in stdout.getvalue()
+
+    stdout = StringIO()
+    call_command(
+        Command(),
+        view_path,
+        "--max-zoom=1",
+        f"--state-file={state_file}",
+        stdout=stdout,
+    )
+
+    assert len(WarmedTilesView.rendered) == 5
+    assert "5 skipped" in stdout.getvalue()
+
+
+def test_warms_streamed_items():
+    StreamedFeaturesView.calls = 0
+    command = Command()
+    command.warm_tile(StreamedFeaturesView, (1, 1, 0), "")
+    assert StreamedFeaturesView.calls == 1
+
+    view = StreamedFeaturesView(action="list")
+    request = command.make_request("", tile="1/0/1")
+    view.request = request
+    response = view.list(request)
+
+    assert b"".join(response.streaming_content).startswith(b'{"items":[{')
+    assert StreamedFeaturesView.calls == 1
+
+
+def test_finds_view_under_namespace(settings):
+    settings.ROOT_URLCONF = __name__
+
+    assert find_view_class("warmed") is WarmedTilesView
+    assert find_view_class("streamed") is StreamedFeaturesView
+
+    with pytest.raises(CommandError):
+        find_view_class("missing")
+
+
+def test_ambiguous_basename_fails(settings, monkeypatch):
+    settings.ROOT_URLCONF = __name__
+    monkeypatch.setitem(
+        globals(),
+        "urlpatterns",
+        urlpatterns + [path("other/", include((other_router.urls, "other")))],
+    )
+
+    with pytest.raises(CommandError, match="Several map api views"):
+        find_view_class("warmed")
+
+
+def test_worker_connections_are_closed(monkeypatch):
+    closed_in = []
+    monkeypatch.setattr(
+        connections,
+        "close_all",
+        lambda: closed_in.append(threading.current_thread()),
+    )
+
+    call_command(
+        Command(),
+        f"{WarmedTilesView.__module__}.WarmedTilesView",
+        "--max-zoom=1",
+        "--workers=2",
+        stdout=StringIO(),
+    )
+
+    assert len(closed_in) == 5
+    assert threading.main_thread() not in closed_in
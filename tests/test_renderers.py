@@ -0,0 +1,270 @@
+import gzip
+import io
+import json
+
+import numpy as np
+import pytest
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
+from rest_framework.test import APIRequestFactory
+
+from generic_map_api.caching import NO_CACHE
+from generic_map_api.renderers import (
+    FragmentsJSONRenderer,
+    RawJSON,
+    encode_body,
+    negotiate_encoding,
+    render_json,
+    stream_json_items,
+)
+from generic_map_api.serializers import BaseFeatureSerializer
+from generic_map_api.values import BaseViewPort
+from generic_map_api.views import MapFeaturesBaseView
+
+TEMPLATE_HTML_RENDERER = "rest_framework.renderers.TemplateHTMLRenderer"
+JSON_RENDERER = "rest_framework.renderers.JSONRenderer"
+
+ITEMS = {
+    1: {"id": 1, "geometry": {"type": "Point", "coordinates": [20.0, 50.0]}},
+    2: {
+        "id": 2,
+        "geometry": {"type": "LineString", "coordinates": [[20.0, 50.0], [21, 51]]},
+    },
+}
+
+
+class ItemSerializer(BaseFeatureSerializer):
+    feature_type = "place"
+
+    def get_geometry(self, obj):
+        return obj["geometry"]
+
+    def get_id(self, obj):
+        return obj["id"]
+
+
+class PlacesView(MapFeaturesBaseView):
+    serializer = ItemSerializer()
+    cache_ttl = NO_CACHE
+
+    def get_items(self, viewport: BaseViewPort, params: dict):
+        return list(ITEMS.values())
+
+    def get_item(self, item_id):
+        return ITEMS.get(int(item_id))
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected_encoding",
+    [
+        (None, "identity"),
+        ("", "identity"),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("gzip;q=0", "identity"),
+        ("*", "br"),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, expected_encoding):
+    assert negotiate_encoding(accept_encoding, ("br", "gzip")) == expected_encoding
+
+
+def test_encode_body():
+    encoded = encode_body(b'{"items":[]}', ("gzip",))
+
+    assert encoded["identity"] == b'{"items":[]}'
+    assert gzip.decompress(encoded["gzip"]) == b'{"items":[]}'
+
+
+def test_stream_json_items():
+    items = [{"id": 1, "geom": (1.0, 2.0)}, {"id": 2, "geom": (3.0, 4.0)}]
+
+    chunks = list(stream_json_items(iter(items), chunk_size=10))
+
+    assert len(chunks) > 1
+    assert json.loads(b"".join(chunks)) == {
+        "items": [{"id": 1, "geom": [1.0, 2.0]}, {"id": 2, "geom": [3.0, 4.0]}]
+    }
+    assert b"".join(stream_json_items(iter([]))) == b'{"items":[]}'
+
+
+def test_raw_json_is_emitted_verbatim():
+    fragment = RawJSON('[1.50, "a\\"b", "\u00e9"]')
+    data = {"geom": fragment, "name": "raw-json-marker:[1]"}
+
+    assert render_json(data) == (
+        '{"geom":[1.50, "a\\"b", "\u00e9"],"name":"raw-json-marker:[1]"}'
+    ).encode("utf-8")
+    assert (
+        b"".join(stream_json_items([data])) == b'{"items":[' + render_json(data) + b"]}"
+    )
+
+
+class PreSerializedItemSerializer(ItemSerializer):
+    def __init__(self):
+        self.calls = 0
+
+    def get_serialized_geometry(self, obj):
+        self.calls += 1
+        return obj.get("serialized_geometry")
+
+
+class PreSerializedPlacesView(PlacesView):
+    serializer = PreSerializedItemSerializer()
+
+    def get_items(self, viewport: BaseViewPort, params: dict):
+        return [
+            {
+                **item,
+                "geometry": None,
+                "serialized_geometry": self.serializer.make_serialized_geometry(item),
+            }
+            for item in ITEMS.values()
+        ]
+
+
+def test_list_with_serialized_geometries():
+    request = APIRequestFactory().get("/")
+    PreSerializedPlacesView.serializer.calls = 0
+    response = PreSerializedPlacesView.as_view({"get": "list"})(request)
+    response.render()
+    expected = PlacesView.as_view({"get": "list"})(request)
+    expected.render()
+
+    assert response.content == expected.content
+    assert PreSerializedPlacesView.serializer.calls == len(ITEMS)
+
+
+@pytest.mark.parametrize(
+    "query_params", ({"items_format": "columnar"}, {"format": "msgpack"})
+)
+def test_columnar_list_with_serialized_geometries(query_params):
+    msgpack = pytest.importorskip("msgpack")
+    request = APIRequestFactory().get("/", query_params)
+
+    response = PreSerializedPlacesView.as_view({"get": "list"})(request)
+    expected = PlacesView.as_view({"get": "list"})(request)
+
+    if "format" in query_params:
+        assert msgpack.unpackb(response.content) == msgpack.unpackb(expected.content)
+    else:
+        assert json.loads(response.content) == json.loads(expected.content)
+
+
+def test_list_as_message_pack():
+    msgpack = pytest.importorskip("msgpack")
+    view = PlacesView.as_view({"get": "list"})
+
+    response = view(APIRequestFactory().get("/", HTTP_ACCEPT="application/msgpack"))
+
+    data = msgpack.unpackb(response.content)
+    assert response["Content-Type"] == "application/msgpack"
+    assert data["id"] == [1, 2]
+    assert data["types"] == [["place", "point"], ["place", "line"]]
+    assert np.frombuffer(data["coords"], dtype="<f8").tolist() == [
+        50.0,
+        20.0,
+        50.0,
+        20.0,
+        51.0,
+        21.0,
+    ]
+    assert np.frombuffer(data["ring_offsets"], dtype="<u4").tolist() == [0, 1, 3]
+
+
+def test_retrieve_as_message_pack():
+    msgpack = pytest.importorskip("msgpack")
+    view = PlacesView.as_view({"get": "retrieve"})
+
+    response = view(APIRequestFactory().get("/?format=msgpack"), pk="1")
+    response.render()
+
+    assert msgpack.unpackb(response.content) == {"item": {"type": ["place"], "id": 1}}
+
+
+def test_list_as_flatgeobuf():
+    raw = pytest.importorskip("pyogrio.raw")
+    view = PlacesView.as_view({"get": "list"})
+
+    response = view(APIRequestFactory().get("/?format=fgb"))
+
+    meta, _, geometries, fields = raw.read(io.BytesIO(response.content))
+    assert response["Content-Type"] == "application/flatgeobuf"
+    assert list(meta["fields"]) == ["id", "type"]
+    assert list(fields[0]) == [1, 2]
+    assert len(geometries) == 2
+
+
+def test_flatgeobuf_errors_are_rendered_as_json():
+    pytest.importorskip("pyogrio.raw")
+    view = PlacesView.as_view({"get": "retrieve"})
+
+    response = view(APIRequestFactory().get("/?format=fgb"), pk="3")
+    response.render()
+
+    assert response.status_code == 404
+    assert response["Content-Type"] == "application/json"
+
+
+def test_list_as_flatgeobuf_with_items_without_geometry():
+    raw = pytest.importorskip("pyogrio.raw")
+
+    class NoGeometryPlacesView(PlacesView):
+        def get_items(self, viewport: BaseViewPort, params: dict):
+            return list(ITEMS.values()) + [{"id": 3, "geometry": None}]
+
+    view = NoGeometryPlacesView.as_view({"get": "list"})
+
+    response = view(APIRequestFactory().get("/?format=fgb"))
+
+    _, _, geometries, fields = raw.read(io.BytesIO(response.content))
+    assert list(fields[0]) == [1, 2, 3]
+    assert geometries[2] is None
+
+
+def test_retrieve_etag_varies_by_negotiated_format():
+    pytest.importorskip("msgpack")
+
+    class CachedPlacesView(PlacesView):
+        cache_name = "locmem"
+        cache_ttl = 60
+
+    caches["locmem"].clear()
+    view = CachedPlacesView.as_view({"get": "retrieve"})
+
+    as_json = view(APIRequestFactory().get("/"), pk="1")
+    as_msgpack = view(
+        APIRequestFactory().get("/", HTTP_ACCEPT="application/msgpack"), pk="1"
+    )
+    caches["locmem"].clear()
+
+    assert as_json["ETag"] != as_msgpack["ETag"]
+    assert "Accept" in as_json["Vary"]
+    assert "Accept" in as_msgpack["Vary"]
+
+
+def test_renderers_follow_settings():
+    view = PlacesView(action="list")
+
+    with override_settings(
+        REST_FRAMEWORK={
+            "DEFAULT_RENDERER_CLASSES": [TEMPLATE_HTML_RENDERER, JSON_RENDERER]
+        }
+    ):
+        renderers = view.get_renderers()
+
+    assert [type(renderer) for renderer in renderers][:2] == [
+        TemplateHTMLRenderer,
+        FragmentsJSONRenderer,
+    ]
+
+
+def test_custom_json_renderer_decodes_raw_json():
+    class CustomJSONRenderer(JSONRenderer):
+        pass
+
+    data = {"geom": RawJSON("[1,2]")}
+
+    assert json.loads(CustomJSONRenderer().render(data)) == {"geom": [1, 2]}
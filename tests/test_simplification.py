@@ -0,0 +1,115 @@
+import math
+
+import pytest
+from shapely.geometry import LineString, Point
+
+from generic_map_api.caching import NO_CACHE
+from generic_map_api.local_cache import LocalCache
+from generic_map_api.serializers import BaseFeatureSerializer
+from generic_map_api.simplification import simplify_items, tolerance_bucket
+from generic_map_api.values import BaseViewPort, EmptyViewport
+from generic_map_api.views import MapFeaturesBaseView
+from tests.feature_views.factories import request_factory
+
+LINE = LineString(
+    [(i / 1000, math.sin(i / 100) / 1000) for i in range(1000)],
+)
+
+
+class ItemSerializer(BaseFeatureSerializer):
+    simplify_geometry = True
+
+    def __init__(self):
+        self.simplification_cache = LocalCache()
+
+    def get_geometry(self, obj):
+        return obj["geometry"]
+
+    def get_id(self, obj):
+        return obj["id"]
+
+
+class LinesView(MapFeaturesBaseView):
+    serializer = ItemSerializer()
+    cache_ttl = NO_CACHE
+
+    def get_items(self, viewport: BaseViewPort, params: dict):
+        return [{"id": 1, "geometry": LINE}, {"id": 2, "geometry": Point(1, 2)}]
+
+
+def viewport_with_zoom(zoom):
+    viewport = EmptyViewport()
+    viewport.zoom = zoom
+    return viewport
+
+
+def test_tolerance_bucket():
+    assert tolerance_bucket(1.0) == 0
+    assert tolerance_bucket(0.3) == -2
+    assert tolerance_bucket(0.25) == -2
+
+
+def test_geometries_are_simplified_by_zoom():
+    view = LinesView()
+
+    full = list(view.get_serialized_items(EmptyViewport(), {}))
+    low_zoom = list(view.get_serialized_items(viewport_with_zoom(5), {}))
+    high_zoom = list(view.get_serialized_items(viewport_with_zoom(20), {}))
+
+    assert len(full[0]["geom"]) == 1000
+    assert len(low_zoom[0]["geom"]) == 2
+    assert 2 < len(high_zoom[0]["geom"]) < 1000
+    assert low_zoom[0]["bbox"] == full[0]["bbox"]
+    assert low_zoom[1] == full[1]
+
+
+def test_simplified_geometries_are_cached():
+    view = LinesView()
+    items = view.get_items(EmptyViewport(), {})
+    degrees_per_pixel = viewport_with_zoom(10).get_degrees_per_pixel()
+
+    first = simplify_items(view, items, degrees_per_pixel)
+    second = simplify_items(view, items, degrees_per_pixel)
+
+    assert list(first) == [id(items[0])]
+    assert first[id(items[0])] is second[id(items[0])]
+    assert view.serializer.simplification_cache.stats()["hits"] == 1
+
+
+def test_edited_geometry_is_not_served_from_cache():
+    view = LinesView()
+    degrees_per_pixel = viewport_with_zoom(5).get_degrees_per_pixel()
+
+    simplify_items(view, [{"id": 1, "geometry": LINE}], degrees_per_pixel)
+    edited = {"id": 1, "geometry": LineString([(2, 2), (3, 3)])}
+    simplified = simplify_items(view, [edited], degrees_per_pixel)
+
+    assert simplified[id(edited)].equals(edited["geometry"])
+
+
+def test_list_fetches_geometry_once_per_item():
+    class CountingSerializer(ItemSerializer):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+
+        def get_geometry(self, obj):
+            self.calls += 1
+            return super().get_geometry(obj)
+
+    class CountingLinesView(LinesView):
+        serializer = CountingSerializer()
+
+    view = CountingLinesView()
+    list(view.get_serialized_items(viewport_with_zoom(10), {}))
+
+    assert view.serializer.calls == 2
+
+
+@pytest.mark.parametrize("zoom", ("2000", "nan", "inf"))
+def test_list_with_invalid_zoom(zoom):
+    view = LinesView()
+
+    response = view.list(request_factory({"viewport.zoom": zoom}))
+
+    assert len(response.data["items"]) == 2
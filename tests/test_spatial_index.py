@@ -0,0 +1,30 @@
+from shapely.geometry import Point, box
+
+from generic_map_api.spatial_index import (
+    ALL_CELL,
+    count_covering_tiles,
+    covering_tiles,
+    viewport_cells,
+)
+from generic_map_api.values import EmptyViewport, Tile, ViewPort
+
+
+def test_covering_tiles():
+    assert set(covering_tiles(box(-10, -10, 10, 10), 1)) == {
+        (1, 0, 0),
+        (1, 1, 0),
+        (1, 0, 1),
+        (1, 1, 1),
+    }
+    assert list(covering_tiles(Point(20, 50), 3)) == [(3, 4, 2)]
+    assert count_covering_tiles(box(-10, -10, 10, 10), 1) == 4
+
+
+def test_viewport_cells():
+    assert viewport_cells(Tile(1, 2, 3)) == ((3, 1, 2),)
+    assert viewport_cells(EmptyViewport()) == (ALL_CELL,)
+
+    viewport = ViewPort(Point(10, 60), Point(30, 40))
+    cells = viewport_cells(viewport)
+    assert {cell[0] for cell in cells} == {4}
+    assert (4, 9, 5) in cells
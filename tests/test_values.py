@@ -1,6 +1,16 @@
+import pytest
 from shapely.geometry import Point
 
-from generic_map_api.values import ViewPort
+from generic_map_api.caching import NO_CACHE
+from generic_map_api.serializers import BaseFeatureSerializer
+from generic_map_api.values import BaseViewPort, EmptyViewport, ViewPort
+from generic_map_api.views import MapFeaturesBaseView
+from tests.feature_views.factories import request_factory
+
+
+class PointSerializer(BaseFeatureSerializer):
+    def get_geometry(self, obj):
+        return obj["geometry"]
 
 
 def test_viewport_from_geohashes():
@@ -8,3 +18,58 @@ def test_viewport_from_geohashes():
     viewport = ViewPort.from_geohashes_query_param(geohashes)
     assert viewport.upper_left == Point(-21.961669921875, 46.60400390625)
     assert viewport.lower_right == Point(23.3349609375, 33.980712890625)
+
+
+@pytest.mark.parametrize(
+    "zoom,meters_per_pixel,expected_precision",
+    [
+        (None, None, None),
+        ("3", None, 2),
+        (18, None, 7),
+        (3, 0.5, 7),
+        ("invalid", None, None),
+        ("nan", None, None),
+        ("2000", None, None),
+        (None, "inf", None),
+        (None, "1e-300", 307),
+    ],
+)
+def test_viewport_coordinate_precision(zoom, meters_per_pixel, expected_precision):
+    viewport = EmptyViewport()
+    viewport.zoom = zoom
+    viewport.meters_per_pixel = meters_per_pixel
+    assert viewport.get_coordinate_precision() == expected_precision
+
+
+@pytest.mark.parametrize(
+    "zoom,meters_per_pixel",
+    [
+        ("2000", None),
+        ("-2000", None),
+        ("nan", None),
+        ("inf", None),
+        (None, "nan"),
+        (None, "inf"),
+    ],
+)
+def test_viewport_with_invalid_scale_has_unknown_resolution(zoom, meters_per_pixel):
+    viewport = EmptyViewport()
+    viewport.zoom = zoom
+    viewport.meters_per_pixel = meters_per_pixel
+    assert viewport.get_meters_per_pixel() is None
+    assert viewport.get_degrees_per_pixel() is None
+
+
+@pytest.mark.parametrize("zoom", ("nan", "inf", "2000"))
+def test_list_with_invalid_zoom_keeps_full_precision(zoom):
+    class PreciseView(MapFeaturesBaseView):
+        serializer = PointSerializer()
+        cache_ttl = NO_CACHE
+        reduce_coordinate_precision = True
+
+        def get_items(self, viewport: BaseViewPort, params: dict):
+            return [{"geometry": Point(1.123456789, 2.987654321)}]
+
+    response = PreciseView().list(request_factory({"viewport.zoom": zoom}))
+
+    assert response.data["items"][0]["geom"] == (2.987654321, 1.123456789)
@@ -0,0 +1,155 @@
+import pytest
+import shapely
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.exceptions import BadRequest
+from django.http import Http404
+from shapely.geometry import LineString, Point
+
+from generic_map_api.serializers import BaseFeatureSerializer
+from generic_map_api.values import BaseViewPort, Tile
+from generic_map_api.vector_tiles import (
+    GEOM_LINESTRING,
+    GEOM_POINT,
+    GEOM_POLYGON,
+    LayerBuilder,
+    encode_geometry,
+    encode_tile,
+    lon_lat_to_tile_coords,
+)
+from generic_map_api.views import MapFeaturesBaseView
+from tests.app.models import Feature
+from tests.feature_views.factories import request_factory
+
+TILE = Tile(17, 10, 5)
+
+
+class ItemSerializer(BaseFeatureSerializer):
+    feature_type = "place"
+
+    def get_geometry(self, obj):
+        return obj["geometry"]
+
+    def get_id(self, obj):
+        return obj["id"]
+
+
+class PlacesView(MapFeaturesBaseView):
+    serializer = ItemSerializer()
+    vector_tiles = True
+    vector_tile_layer_name = "places"
+
+    def get_items(self, viewport: BaseViewPort, params: dict):
+        center = viewport.to_polygon().centroid
+        return [
+            {"id": 1, "geometry": center},
+            {"id": 2, "geometry": Point(-100.0, -40.0)},
+        ]
+
+
+def read_tile(tmp_path, data, tile):
+    raw = pytest.importorskip("pyogrio.raw")
+    path = tmp_path / str(tile.z) / str(tile.x) / f"{tile.y}.pbf"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(data)
+    return raw.read(str(path), return_fids=True)
+
+
+def test_encode_geometry_commands():
+    assert encode_geometry(Point(1, 2)) == (GEOM_POINT, [9, 2, 4])
+    assert encode_geometry(LineString([(0, 0), (2, 0), (2, 3)])) == (
+        GEOM_LINESTRING,
+        [9, 0, 0, 18, 4, 0, 0, 6],
+    )
+    geometry_type, commands = encode_geometry(shapely.box(0, 0, 2, 2), dimension=2)
+    assert geometry_type == GEOM_POLYGON
+    assert commands[-1] == 15
+
+
+def test_encoded_tile_is_readable(tmp_path):
+    center = TILE.to_polygon().centroid
+    layer = LayerBuilder("items")
+    layer.add_feature(
+        lon_lat_to_tile_coords(center, TILE, 4096),
+        {"name": "center", "count": 3, "ratio": 1.5},
+        7,
+    )
+
+    meta, _, geometries, fields = read_tile(tmp_path, encode_tile([layer]), TILE)
+
+    assert list(fields[0]) == [7]
+    assert list(meta["fields"]) == ["mvt_id", "name", "count", "ratio"]
+    assert fields[1][0] == "center"
+    assert fields[2][0] == 3
+    assert fields[3][0] == 1.5
+    point = shapely.from_wkb(geometries[0])
+    assert point.x == pytest.approx(1878516.4, abs=100)
+
+
+def test_vector_tile_view(tmp_path):
+    view = PlacesView()
+
+    response = view.vector_tile(request_factory(), "5", "17", "10")
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/vnd.mapbox-vector-tile"
+    _, _, _, fields = read_tile(tmp_path, response.content, TILE)
+    assert list(fields[0]) == [1]
+    assert list(fields[1]) == ["place"]
+
+
+def test_database_encoding_falls_back_without_queryset(tmp_path):
+    class DatabasePlacesView(PlacesView):
+        vector_tile_db_geometry_field = "position"
+
+    response = DatabasePlacesView().vector_tile(request_factory(), "5", "17", "10")
+
+    _, _, _, fields = read_tile(tmp_path, response.content, TILE)
+    assert list(fields[0]) == [1]
+
+
+@pytest.mark.parametrize(
+    "coords",
+    [
+        ("a", "1", "1"),
+        ("1", "2", "0"),
+        ("-1", "0", "0"),
+        ("31", "0", "0"),
+        ("1000000000", "0", "0"),
+    ],
+)
+def test_invalid_tile_coords_are_bad_request(coords):
+    with pytest.raises(BadRequest):
+        PlacesView().vector_tile(request_factory(), *coords)
+
+
+def test_vector_tiles_are_opt_in():
+    class NoTilesView(PlacesView):
+        vector_tiles = False
+
+    with pytest.raises(Http404):
+        NoTilesView().vector_tile(request_factory(), "5", "17", "10")
+
+
+def test_model_fields_are_properties_without_database(tmp_path):
+    class FeatureSerializer(ItemSerializer):
+        def get_geometry(self, obj):
+            return obj.position
+
+        def get_id(self, obj):
+            return obj.id
+
+    class FeaturesView(PlacesView):
+        serializer = FeatureSerializer()
+        vector_tile_db_geometry_field = "position"
+        vector_tile_db_properties = ("category",)
+
+        def get_items(self, viewport: BaseViewPort, params: dict):
+            center = viewport.to_polygon().centroid
+            return [Feature(id=1, position=GEOSGeometry(center.wkt), category="B")]
+
+    response = FeaturesView().vector_tile(request_factory(), "5", "17", "10")
+
+    meta, _, _, fields = read_tile(tmp_path, response.content, TILE)
+    properties = dict(zip(meta["fields"], fields))
+    assert list(properties["category"]) == ["B"]
+    assert list(properties["type"]) == ["place"]